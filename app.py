@@ -1,15 +1,23 @@
 import datetime
+import io
+import os
+import tempfile
+import uuid
 import streamlit as st
 from streamlit_dimensions import st_dimensions
 from streamlit_cookies_manager import EncryptedCookieManager
 from database_service import (
     create_user, authenticate_user, get_user_by_id, insert_workout,
     get_all_workouts, update_workout, delete_workout, workout_exists,
-    start_session, delete_session,
-    log_exercises_bulk,
+    delete_session, log_full_session,
     get_dashboard_stats, get_recent_sessions_with_logs, get_personal_records,
+    get_preferred_unit, save_profile, get_session_history, get_session_days,
 )
 from exercise_library import EXERCISE_NAMES, get_category
+from export import FORMATS, export_filename, export_to_file
+from importer import ImportFileError, import_csv
+from instrumentation import serve_metrics
+from password_hashing import HashingUnavailable
 from scheduler import scheduler_page
 from plan import create_plan_page
 
@@ -17,6 +25,10 @@ from plan import create_plan_page
 
 st.title("SkibFit")
 
+# Database metrics for Prometheus — started once per server process
+if os.environ.get("DB_METRICS_PORT"):
+    serve_metrics(int(os.environ["DB_METRICS_PORT"]), os.environ.get("DB_METRICS_HOST", "127.0.0.1"))
+
 # ─────────────────────────── cookie manager ─────────────────────────
 
 _cookies = EncryptedCookieManager(
@@ -87,7 +99,11 @@ def login_page():
         elif not password:
             st.warning("Please enter a password.")
         else:
-            user = authenticate_user(username.strip(), password)
+            try:
+                user = authenticate_user(username.strip(), password)
+            except HashingUnavailable as exc:
+                st.error(str(exc))
+                return
             if user:
                 st.session_state.user = user
                 _cookies["user_id"] = str(user.id)
@@ -115,7 +131,11 @@ def signup_page():
         elif new_password != confirm_password:
             st.warning("Passwords do not match.")
         else:
-            user = create_user(new_username.strip(), new_email.strip(), new_password)
+            try:
+                user = create_user(new_username.strip(), new_email.strip(), new_password)
+            except HashingUnavailable as exc:
+                st.error(str(exc))
+                return
             if user:
                 st.session_state.user = user
                 _cookies["user_id"] = str(user.id)
@@ -129,6 +149,7 @@ def logout():
     st.session_state.user = None
     st.session_state.pop("google_token", None)
     st.session_state.pop("workout_plan", None)
+    _discard_export()
     _cookies["user_id"] = ""
     _cookies.save()
     st.rerun()
@@ -147,7 +168,7 @@ st.sidebar.write(f"Logged in as: **{st.session_state.user.username}**")
 if st.sidebar.button("Logout"):
     logout()
 
-menu = ["Dashboard", "Log Workout", "My Programme", "Create Plan", "Schedule Workouts"]
+menu = ["Dashboard", "Log Workout", "History", "My Programme", "Create Plan", "Schedule Workouts"]
 choice = st.sidebar.selectbox("Menu", menu)
 
 user_id = st.session_state.user.id
@@ -366,13 +387,19 @@ def dashboard_page():
     # ── Personal records ──────────────────────────────────────────────
     prs = get_personal_records(user_id)
     if prs:
-        st.markdown("#### Personal records")
+        col_title, col_unit = st.columns([5, 1])
+        col_title.markdown("#### Personal records")
+        preferred = get_preferred_unit(user_id)
+        unit = col_unit.selectbox("Unit", ["lbs", "kg"], index=0 if preferred == "lbs" else 1,
+                                  key="pr_unit", label_visibility="collapsed")
+        if unit != preferred:
+            save_profile(user_id, {"weight_unit": unit})
         pr_cols = st.columns(min(len(prs), 3))
         for i, pr in enumerate(prs):
             col = pr_cols[i % 3]
             col.metric(
                 label=pr.exercise,
-                value=f"{pr.weight:.1f} {pr.weight_unit}",
+                value=f"{pr.weight_in(unit):.1f} {unit}",
                 help=f"{pr.reps} reps — {pr.date.strftime('%b %d, %Y')}",
             )
         st.markdown("---")
@@ -382,21 +409,136 @@ def dashboard_page():
     if recent:
         st.markdown("#### Recent sessions")
         for sess, logs in recent:
-            day_label = f" · {sess.ppl_day}" if sess.ppl_day else ""
-            header    = f"{sess.date.strftime('%A, %b %d')}{day_label}"
-            with st.expander(header, expanded=False):
-                if logs:
-                    for log in logs:
-                        weight_str = f" @ {log.weight:.1f} {log.weight_unit}" if log.weight else ""
-                        st.write(f"• {log.exercise} — {log.sets}×{log.reps}{weight_str}")
-                else:
-                    st.caption("No exercises recorded for this session.")
-                if st.button("Delete session", key=f"del_sess_{sess.id}", type="secondary"):
-                    delete_session(user_id, sess.id)
-                    st.rerun()
+            _session_expander(sess, logs)
     else:
         st.info("No sessions logged yet. Head to **Log Workout** to record your first session.")
 
+
+def _session_expander(sess, logs) -> None:
+    """Collapsible summary of one logged session, with a delete button."""
+    day_label = f" · {sess.ppl_day}" if sess.ppl_day else ""
+    header    = f"{sess.date.strftime('%A, %b %d, %Y')}{day_label}"
+    with st.expander(header, expanded=False):
+        if logs:
+            for log in logs:
+                weight_str = f" @ {log.weight:.1f} {log.weight_unit}" if log.weight else ""
+                st.write(f"• {log.exercise} — {log.sets}×{log.reps}{weight_str}")
+        else:
+            st.caption("No exercises recorded for this session.")
+        if sess.notes:
+            st.caption(sess.notes)
+        if st.button("Delete session", key=f"del_sess_{sess.id}", type="secondary"):
+            delete_session(user_id, sess.id)
+            st.rerun()
+
+# ─────────────────────────── history ────────────────────────────────
+
+HISTORY_PAGE_SIZE = 20
+
+
+def _discard_export() -> None:
+    """Delete the export file prepared earlier in this session, if any."""
+    prepared = st.session_state.pop("export_file", None)
+    if prepared and os.path.exists(prepared[1]):
+        os.remove(prepared[1])
+
+
+def history_page():
+    st.subheader("Workout history")
+
+    col_day, col_ex, col_dates = st.columns(3)
+    ppl_day  = col_day.selectbox("Day", ["All"] + get_session_days(user_id), key="hist_day")
+    exercise = col_ex.selectbox("Exercise", ["All"] + EXERCISE_NAMES, key="hist_ex")
+    dates    = col_dates.date_input("Date range", value=(), key="hist_dates")
+    date_from = dates[0] if len(dates) > 0 else None
+    date_to   = dates[1] if len(dates) > 1 else date_from
+
+    filters = {
+        "ppl_day":   None if ppl_day == "All" else ppl_day,
+        "exercise":  None if exercise == "All" else exercise,
+        "date_from": date_from,
+        "date_to":   date_to,
+    }
+    # Each "Load more" appends a cursor; a filter change starts over
+    if st.session_state.get("hist_filters") != filters:
+        st.session_state["hist_filters"] = filters
+        st.session_state["hist_cursors"] = [None]
+
+    page  = None
+    shown = 0
+    for cursor in st.session_state["hist_cursors"]:
+        page = get_session_history(user_id, cursor, HISTORY_PAGE_SIZE, **filters)
+        for sess, logs in page.sessions:
+            _session_expander(sess, logs)
+        shown += len(page.sessions)
+
+    if shown == 0:
+        st.info("No sessions match these filters.")
+    elif page.next_cursor is not None:
+        if st.button("Load more", use_container_width=True):
+            st.session_state["hist_cursors"].append(page.next_cursor)
+            st.rerun()
+    else:
+        st.caption(f"{shown} session{'s' if shown != 1 else ''} — that's everything.")
+
+    # ── Export ────────────────────────────────────────────────────────
+    st.markdown("---")
+    st.markdown("#### Export your data")
+    col_fmt, col_go = st.columns([2, 3])
+    fmt = col_fmt.selectbox("Format", list(FORMATS), key="export_fmt",
+                            format_func={"csv": "CSV", "jsonl": "JSON Lines", "parquet": "Parquet"}.get)
+    # Streamed to a temp file on request; only its path is kept in the session
+    if col_go.button("Prepare export", use_container_width=True):
+        _discard_export()
+        fd, path = tempfile.mkstemp(prefix="skibfit_export_", suffix=FORMATS[fmt][1])
+        os.close(fd)
+        try:
+            export_to_file(user_id, fmt, path)
+            st.session_state["export_file"] = (fmt, path)
+        except RuntimeError as e:
+            os.remove(path)
+            st.error(str(e))
+    prepared = st.session_state.get("export_file")
+    if prepared and prepared[0] == fmt and os.path.exists(prepared[1]):
+        with open(prepared[1], "rb") as f:
+            st.download_button(
+                "Download",
+                data=f,
+                file_name=export_filename(st.session_state.user.username, fmt),
+                mime=FORMATS[fmt][0],
+                use_container_width=True,
+            )
+
+    # ── Import ────────────────────────────────────────────────────────
+    st.markdown("#### Import from another app")
+    st.caption("A CSV export from Strong, Hevy or a similar tracker. "
+               "Sessions you've already imported are skipped.")
+    upload = st.file_uploader("CSV file", type=["csv"], key="import_file")
+    if upload is not None:
+        col_check, col_import = st.columns(2)
+        dry_run = col_check.button("Check file", use_container_width=True)
+        if dry_run or col_import.button("Import", type="primary", use_container_width=True):
+            upload.seek(0)
+            try:
+                with st.spinner("Reading your history…"):
+                    report = import_csv(user_id, io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""),
+                                        dry_run=dry_run)
+            except (ImportFileError, UnicodeDecodeError) as e:
+                st.error(f"Couldn't read that file: {e}")
+            else:
+                r = report.result
+                verb = "Ready to import" if dry_run else "Imported"
+                st.success(f"{verb} {r.sessions} session(s) and {r.logs} exercise log(s)"
+                           + (f", {report.first_date} to {report.last_date}." if report.first_date else "."))
+                if r.duplicates:
+                    st.info(f"{r.duplicates} session(s) were already imported and are skipped.")
+                if r.new_exercises:
+                    st.info("Not in the exercise library, added as custom exercises: "
+                            + ", ".join(r.new_exercises))
+                if report.rows_skipped:
+                    st.warning(f"{report.rows_skipped} row(s) skipped — first few: "
+                               + "; ".join(f"line {i.line}: {i.message}" for i in report.issues[:5]))
+
 # ─────────────────────────── log workout ────────────────────────────
 
 def log_workout_page():
@@ -416,6 +558,13 @@ def log_workout_page():
     # ── Build exercise rows from the user's programme as a starting point
     template = get_all_workouts(user_id)
 
+    # Idempotency key for this save — survives reruns, so a double-submit or
+    # a rerun that interrupts a save can't log the session twice. Rotated
+    # only once a save has gone through.
+    key_idem = f"log_idempotency_{user_id}"
+    if key_idem not in st.session_state:
+        st.session_state[key_idem] = uuid.uuid4().hex
+
     # Determine how many rows to show — persisted in session state
     key_rows = f"log_row_count_{user_id}"
     if key_rows not in st.session_state:
@@ -492,13 +641,13 @@ def log_workout_page():
         if not valid_rows:
             st.warning("Add at least one exercise before saving.")
         else:
-            ws = start_session(
-                user_id=user_id,
-                ppl_day=ppl_day or None,
-                notes=notes.strip() or None,
-                date=session_date,
+            log_full_session(
+                user_id,
+                {"date": session_date, "ppl_day": ppl_day or None, "notes": notes.strip() or None},
+                valid_rows,
+                idempotency_key=st.session_state[key_idem],
             )
-            log_exercises_bulk(ws.id, user_id, valid_rows)
+            st.session_state.pop(key_idem, None)
             st.session_state[key_rows] = max(len(template), 1)  # reset row count
             st.success(f"Session saved — {len(valid_rows)} exercise(s) logged!")
             st.rerun()
@@ -509,6 +658,8 @@ if choice == "Dashboard":
     dashboard_page()
 elif choice == "Log Workout":
     log_workout_page()
+elif choice == "History":
+    history_page()
 elif choice == "My Programme":
     st.subheader("My Programme")
     tab_view, tab_add = st.tabs(["View / Edit", "Add Exercise"])
@@ -0,0 +1,407 @@
+"""
+benchmark.py — synthetic data and latency benchmarks for database_service.
+
+    python benchmark.py seed    --url sqlite:///bench.db --users 10000 --years 3
+    python benchmark.py run     --url sqlite:///bench.db --out results.json
+    python benchmark.py compare baseline.json results.json
+
+`seed` fills an empty database with users whose histories look like real
+ones: a personal repertoire drawn from exercise_library.EXERCISES, a
+Push / Pull / Legs rotation, a training frequency and history length that
+vary per user, and weights that progress over time. Rows go in with bulk
+INSERTs a batch of users at a time, then the derived tables are backfilled.
+
+`run` times the public database_service functions against a random sample
+of users and reports p50 / p95 / p99 latency and SQL statements per call.
+The read cache is cleared before every read, so the numbers are for the
+database path. Write cases really write — benchmark a throwaway copy.
+
+`compare` diffs two result files and exits non-zero when a function got
+slower than --threshold allows or issues more statements than before.
+
+Any database_service URL works: sqlite for local runs, a local Postgres
+container as the production stand-in.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import sqlalchemy
+from sqlalchemy import event, insert
+
+import database_service as ds
+from exercise_library import EXERCISES
+from password_hashing import hash_password
+
+PPL_DAYS     = ("Push", "Pull", "Legs")
+SEED_BATCH   = 200      # users per seeding transaction
+RESULTS_VERSION = 1
+
+# ─────────────────────────── synthetic data ──────────────────────────
+
+_BY_CATEGORY: dict[str, list[str]] = {}
+for _e in EXERCISES:
+    _BY_CATEGORY.setdefault(_e.category, []).append(_e.name)
+
+# Day → exercise categories trained that day
+_DAY_CATEGORIES = {"Push": ("push", "core"), "Pull": ("pull", "core"), "Legs": ("legs", "core")}
+
+
+def _repertoire(rng: random.Random) -> dict[str, list[str]]:
+    """A user's exercises per PPL day: a handful of main lifts plus some core work."""
+    return {
+        day: rng.sample(_BY_CATEGORY[main], rng.randint(4, 7)) + rng.sample(_BY_CATEGORY[extra], 2)
+        for day, (main, extra) in _DAY_CATEGORIES.items()
+    }
+
+
+def _user_history(rng: random.Random, user_id: int, years: float, today: datetime.date):
+    """
+    Yield (session_row, log_rows) for one user, oldest first. Frequency and
+    history length vary per user, so the data has a long tail of light and
+    churned accounts as well as multi-year regulars.
+    """
+    per_week    = rng.choice((0.5, 1, 2, 3, 3, 4, 5))
+    history     = int(365 * years * rng.random() ** 0.5)
+    last_active = today - datetime.timedelta(days=int(rng.expovariate(1 / 30)) if rng.random() < 0.4 else 0)
+    unit        = "lbs" if rng.random() < 0.25 else "kg"
+    repertoire  = _repertoire(rng)
+    base        = {ex: rng.uniform(10, 100) for day in repertoire.values() for ex in day}
+
+    day  = last_active - datetime.timedelta(days=history)
+    turn = 0
+    while day <= last_active:
+        ppl_day  = PPL_DAYS[turn % 3]
+        progress = 1 + 0.3 * (1 - (last_active - day).days / max(history, 1))
+        chosen   = rng.sample(repertoire[ppl_day], rng.randint(3, 6))
+        session  = {"user_id": user_id, "date": day, "ppl_day": ppl_day, "notes": None}
+        logs = []
+        for ex in chosen:
+            weight = None if rng.random() < 0.05 else round(base[ex] * progress / 2.5) * 2.5
+            logs.append({
+                "user_id":     user_id,
+                "exercise":    ex,
+                "sets":        rng.randint(2, 5),
+                "reps":        rng.randint(5, 12),
+                "weight":      weight,
+                "weight_unit": unit,
+                "weight_kg":   ds.to_kg(weight, unit),
+            })
+        yield session, logs
+        turn += 1
+        day  += datetime.timedelta(days=max(1, round(rng.expovariate(per_week / 7))))
+
+
+def _plan_rows(repertoire: dict[str, list[str]]) -> list[dict]:
+    """save_plan() input for a repertoire."""
+    return [
+        {"exercise": ex, "sets": 3, "reps": 10, "plan_day": day, "sort_order": i}
+        for day, exercises in repertoire.items()
+        for i, ex in enumerate(exercises)
+    ]
+
+
+def seed(users: int, years: float, rng_seed: int = 0, progress: bool = True) -> dict:
+    """Insert `users` synthetic users with their histories and plans. Returns row counts."""
+    rng    = random.Random(rng_seed)
+    today  = datetime.date.today()
+    hashed = hash_password("benchmark")      # one real hash, shared by every user
+    counts = {"users": 0, "sessions": 0, "logs": 0, "plan_rows": 0}
+
+    ds._ensure_tables()
+    engine = ds.get_engine()
+    with engine.connect() as conn:
+        library = dict(conn.execute(
+            sqlalchemy.select(ds.ExerciseDefinition.name, ds.ExerciseDefinition.id)
+            .where(ds.ExerciseDefinition.user_id.is_(None))
+        ).all())
+    for start in range(0, users, SEED_BATCH):
+        batch = range(start, min(start + SEED_BATCH, users))
+        with engine.begin() as conn:
+            user_ids = conn.execute(
+                insert(ds.User).returning(ds.User.id, sort_by_parameter_order=True),
+                [
+                    {"username": f"bench{i}_{rng_seed}", "email": f"bench{i}_{rng_seed}@example.com",
+                     "hashed_password": hashed}
+                    for i in batch
+                ],
+            ).scalars().all()
+
+            sessions, session_logs, plans, profiles = [], [], [], []
+            for user_id in user_ids:
+                for session, logs in _user_history(rng, user_id, years, today):
+                    sessions.append(session)
+                    session_logs.append(logs)
+                if rng.random() < 0.7:
+                    plans.extend(
+                        {"user_id": user_id, "exercise_id": library[row["exercise"]], **row}
+                        for row in _plan_rows(_repertoire(rng))
+                    )
+                    profiles.append({"user_id": user_id, "has_plan": True})
+
+            if sessions:
+                session_ids = conn.execute(
+                    insert(ds.WorkoutSession).returning(ds.WorkoutSession.id, sort_by_parameter_order=True),
+                    sessions,
+                ).scalars().all()
+                logs = [
+                    {"session_id": session_id, "exercise_id": library[log["exercise"]], **log}
+                    for session_id, session_log in zip(session_ids, session_logs)
+                    for log in session_log
+                ]
+                if logs:
+                    conn.execute(insert(ds.WorkoutLog), logs)
+                counts["sessions"] += len(sessions)
+                counts["logs"]     += len(logs)
+            if plans:
+                conn.execute(insert(ds.Workout), plans)
+                conn.execute(insert(ds.UserProfile), profiles)
+                counts["plan_rows"] += len(plans)
+            counts["users"] += len(user_ids)
+        if progress:
+            print(f"  seeded {counts['users']}/{users} users, {counts['logs']} logs", file=sys.stderr)
+
+    ds.backfill_personal_records()
+    ds.backfill_volume_rollups()
+    ds.backfill_user_stats()
+    return counts
+
+# ─────────────────────────── measurement ─────────────────────────────
+
+class _StatementCounter:
+    """Counts SQL statements sent to the engine (executemany counts once)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+
+    def pick(q: float) -> float:
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "p50_ms":  round(pick(0.50), 3),
+        "p95_ms":  round(pick(0.95), 3),
+        "p99_ms":  round(pick(0.99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+    }
+
+
+@dataclass
+class Case:
+    name:  str
+    call:  Callable[..., object]                       # (user_id, rng, *setup result), timed
+    setup: Callable[[int, random.Random], tuple] | None = None   # untimed
+    write: bool = False
+
+
+def _user_exercise(user_id: int, rng: random.Random) -> tuple:
+    records = ds.get_personal_records(user_id)
+    exercise = rng.choice(records).exercise if records else EXERCISES[0].name
+    return (exercise,)
+
+
+def _plan_for(user_id: int, rng: random.Random) -> tuple:
+    return (_plan_rows(_repertoire(rng)),)
+
+
+def _new_session(user_id: int, rng: random.Random) -> tuple:
+    session = ds.start_session(user_id, ppl_day=rng.choice(PPL_DAYS))
+    return (session.id, _entries(rng))
+
+
+def _entries(rng: random.Random) -> list[dict]:
+    day = rng.choice(PPL_DAYS)
+    return [
+        {"exercise": ex, "sets": 3, "reps": 8, "weight": rng.uniform(20, 120), "weight_unit": "kg"}
+        for ex in rng.sample(_BY_CATEGORY[_DAY_CATEGORIES[day][0]], 5)
+    ]
+
+
+CASES: list[Case] = [
+    Case("get_dashboard_stats",           lambda uid, rng: ds.get_dashboard_stats(uid)),
+    Case("get_personal_records",          lambda uid, rng: ds.get_personal_records(uid)),
+    Case("get_volume_over_time",          lambda uid, rng, exercise: ds.get_volume_over_time(uid, exercise, 365, "week"),
+         setup=_user_exercise),
+    Case("get_category_volume_over_time", lambda uid, rng: ds.get_category_volume_over_time(uid, 365, "week")),
+    Case("get_recent_sessions_with_logs", lambda uid, rng: ds.get_recent_sessions_with_logs(uid)),
+    Case("get_sessions",                  lambda uid, rng: ds.get_sessions(uid)),
+    Case("get_plan_by_day",               lambda uid, rng: ds.get_plan_by_day(uid)),
+    Case("get_next_plan_day",             lambda uid, rng: ds.get_next_plan_day(uid)),
+    Case("save_plan",                     lambda uid, rng, plan: ds.save_plan(uid, plan),
+         setup=_plan_for, write=True),
+    Case("log_exercises_bulk",            lambda uid, rng, sid, entries: ds.log_exercises_bulk(sid, uid, entries),
+         setup=_new_session, write=True),
+    Case("log_full_session",              lambda uid, rng: ds.log_full_session(
+                                              uid, {"ppl_day": "Push"}, _entries(rng)),
+         write=True),
+]
+
+
+def run(iterations: int, sample_users: int, rng_seed: int = 0,
+        only: list[str] | None = None, skip_writes: bool = False) -> dict:
+    """Time every case `iterations` times over a random sample of users."""
+    rng    = random.Random(rng_seed)
+    engine = ds.get_engine()
+    ds._ensure_tables()
+    with engine.connect() as conn:
+        all_ids = conn.execute(sqlalchemy.select(ds.User.id)).scalars().all()
+    if not all_ids:
+        raise SystemExit("No users in the database — run `benchmark.py seed` first.")
+    users   = rng.sample(all_ids, min(sample_users, len(all_ids)))
+    counter = _StatementCounter(engine)
+
+    results: dict[str, dict] = {}
+    for case in CASES:
+        if (only and case.name not in only) or (skip_writes and case.write):
+            continue
+        timings, statements = [], []
+        for i in range(iterations):
+            user_id = users[i % len(users)]
+            extra   = case.setup(user_id, rng) if case.setup else ()
+            ds.clear_read_cache()
+            before  = counter.count
+            start   = time.perf_counter()
+            case.call(user_id, rng, *extra)
+            timings.append((time.perf_counter() - start) * 1000)
+            statements.append(counter.count - before)
+        results[case.name] = {
+            "iterations":          iterations,
+            **_percentiles(timings),
+            "statements_per_call": round(sum(statements) / len(statements), 2),
+            "statements_max":      max(statements),
+        }
+        print(f"  {case.name:<32} p50 {results[case.name]['p50_ms']:>8.2f} ms   "
+              f"p95 {results[case.name]['p95_ms']:>8.2f} ms   "
+              f"{results[case.name]['statements_per_call']:>5} stmt", file=sys.stderr)
+    return results
+
+
+def _environment(engine, args) -> dict:
+    with engine.connect() as conn:
+        counts = {
+            table: conn.execute(sqlalchemy.select(sqlalchemy.func.count()).select_from(model)).scalar()
+            for table, model in (("users", ds.User), ("sessions", ds.WorkoutSession), ("logs", ds.WorkoutLog))
+        }
+    return {
+        "results_version": RESULTS_VERSION,
+        "timestamp":       datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "dialect":         engine.dialect.name,
+        "server_version":  ".".join(map(str, engine.dialect.server_version_info or ())),
+        "sqlalchemy":      sqlalchemy.__version__,
+        "python":          platform.python_version(),
+        "iterations":      args.iterations,
+        "sample_users":    args.sample_users,
+        "seed":            args.seed,
+        "rows":            counts,
+    }
+
+# ─────────────────────────── comparison ──────────────────────────────
+
+def compare(baseline: dict, current: dict, threshold: float,
+            metric: str = "p95_ms", min_delta_ms: float = 1.0) -> list[str]:
+    """
+    Return a line per function in `current`, flagging REGRESSION when
+    `metric` grew by more than `threshold` (a fraction) and by at least
+    `min_delta_ms` — sub-millisecond timings are mostly noise — or when
+    the statement count went up.
+    """
+    lines = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            lines.append(f"new        {name:<32} {new[metric]:>9.2f} ms")
+            continue
+        change    = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+        slower    = change > threshold and new[metric] - old[metric] >= min_delta_ms
+        more_sql  = new["statements_per_call"] > old["statements_per_call"]
+        regressed = slower or more_sql
+        status    = "REGRESSION" if regressed else ("faster    " if change < -threshold else "ok        ")
+        lines.append(
+            f"{status} {name:<32} {old[metric]:>9.2f} -> {new[metric]:>9.2f} ms ({change:+.0%})   "
+            f"stmt {old['statements_per_call']} -> {new['statements_per_call']}"
+        )
+    return lines
+
+# ─────────────────────────── entry point ─────────────────────────────
+
+def cmd_seed(args) -> int:
+    ds.configure(args.url)
+    counts = seed(args.users, args.years, args.seed)
+    print(json.dumps(counts, indent=2))
+    return 0
+
+
+def cmd_run(args) -> int:
+    ds.configure(args.url)
+    results = run(args.iterations, args.sample_users, args.seed,
+                  only=args.only, skip_writes=args.skip_writes)
+    report  = {"environment": _environment(ds.get_engine(), args), "results": results}
+    text    = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    lines = compare(baseline, current, args.threshold, args.metric, args.min_delta_ms)
+    print("\n".join(lines))
+    return 1 if any(line.startswith("REGRESSION") for line in lines) else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmark.py", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="fill an empty database with synthetic users")
+    p_seed.add_argument("--url", default=None, help="database URL (default: DATABASE_URL etc.)")
+    p_seed.add_argument("--users", type=int, default=10_000)
+    p_seed.add_argument("--years", type=float, default=3.0, help="longest history length")
+    p_seed.add_argument("--seed", type=int, default=0, help="random seed")
+    p_seed.set_defaults(func=cmd_seed)
+
+    p_run = sub.add_parser("run", help="time database_service functions")
+    p_run.add_argument("--url", default=None, help="database URL (default: DATABASE_URL etc.)")
+    p_run.add_argument("--iterations", type=int, default=200, help="timed calls per function")
+    p_run.add_argument("--sample-users", type=int, default=500, help="users the calls rotate over")
+    p_run.add_argument("--seed", type=int, default=0, help="random seed")
+    p_run.add_argument("--only", nargs="+", metavar="FUNCTION", help="only these functions")
+    p_run.add_argument("--skip-writes", action="store_true", help="leave out the write cases")
+    p_run.add_argument("--out", help="write JSON results here instead of stdout")
+    p_run.set_defaults(func=cmd_run)
+
+    p_compare = sub.add_parser("compare", help="diff two result files")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("current")
+    p_compare.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown (fraction)")
+    p_compare.add_argument("--min-delta-ms", type=float, default=1.0,
+                           help="ignore slowdowns smaller than this in absolute terms")
+    p_compare.add_argument("--metric", default="p95_ms", choices=("p50_ms", "p95_ms", "p99_ms", "mean_ms"))
+    p_compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+busy_time.py — busy intervals for the scheduler, from the freeBusy API.
+
+The scheduler only needs when the user is busy, not what the events are.
+freeBusy.query answers exactly that for up to FREEBUSY_MAX_CALENDARS
+calendars (work, personal, shared) in one request: a list of start/end
+pairs per calendar, with no descriptions, attendees or recurrence data.
+Google has already applied "show me as free", declined invitations and
+recurring-event expansion.
+
+A calendar freeBusy can't answer comes back with per-calendar errors
+(not shared with free/busy access, say). So does the whole request if
+it fails. Those calendars fall back to the event-list path:
+calendar_sync's cache when a user_id is known, a direct paginated fetch
+otherwise. BusyTimeProvider.sources records which path each calendar
+took.
+
+Both paths speak calendar_sync's time basis: windows and intervals are
+naive wall-clock times in the provider's time_zone (calendar_sync.TIME_ZONE
+by default). freeBusy is asked for that zone and each interval is still
+converted from its own offset, so the two paths agree to the minute.
+
+    provider = BusyTimeProvider(token, ["primary", "work@example.com"], user_id=7)
+    plan, rest_days = scheduler.generate_workout_plan(None, 3, workouts, split, busy_provider=provider)
+"""
+
+import datetime
+from collections.abc import Iterable
+
+import requests
+
+import calendar_sync
+import database_service as ds
+from calendar_client import shared_session
+from calendar_sync import TIME_ZONE, rfc3339, wall_clock
+
+FREEBUSY_MAX_CALENDARS = 50   # items per freeBusy.query
+FREEBUSY_MAX_DAYS      = 60   # window per freeBusy.query; longer windows are split
+
+Interval = tuple[datetime.datetime, datetime.datetime]
+
+
+def list_calendars(access_token: str, *, api_base: str | None = None, http=None) -> list[dict]:
+    """The user's calendars as {"id", "summary", "primary"} dicts, primary first."""
+    base   = (api_base or calendar_sync.CALENDAR_API_BASE).rstrip("/")
+    http   = http or shared_session()
+    params = {"fields": "items(id,summary,primary),nextPageToken", "minAccessRole": "freeBusyReader"}
+    calendars: list[dict] = []
+    while True:
+        resp = http.get(
+            f"{base}/users/me/calendarList",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params=params,
+            timeout=calendar_sync.REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        calendars += [
+            {"id": c["id"], "summary": c.get("summary", c["id"]), "primary": bool(c.get("primary"))}
+            for c in body.get("items", [])
+        ]
+        if not body.get("nextPageToken"):
+            break
+        params = {**params, "pageToken": body["nextPageToken"]}
+    return sorted(calendars, key=lambda c: not c["primary"])
+
+
+class BusyTimeProvider:
+    def __init__(
+        self,
+        access_token: str,
+        calendar_ids: Iterable[str] = ("primary",),
+        *,
+        user_id: int | None = None,
+        api_base: str | None = None,
+        http=None,
+        time_zone: str = TIME_ZONE,
+    ):
+        self.access_token = access_token
+        self.calendar_ids = list(dict.fromkeys(calendar_ids)) or ["primary"]
+        self.user_id      = user_id
+        self.api_base     = api_base
+        self.time_zone    = time_zone
+        self._http        = http or shared_session()
+        self.sources: dict[str, str] = {}   # calendar id → "freeBusy" | "events", from the last call
+
+    def busy_between(self, time_min: datetime.datetime, time_max: datetime.datetime) -> list[Interval]:
+        """Busy (start, end) pairs across every calendar overlapping [time_min, time_max), in wall clock."""
+        busy: list[Interval] = []
+        failed: set[str] = set()
+        for i in range(0, len(self.calendar_ids), FREEBUSY_MAX_CALENDARS):
+            calendars = self.calendar_ids[i:i + FREEBUSY_MAX_CALENDARS]
+            start = time_min
+            while start < time_max:
+                end = min(start + datetime.timedelta(days=FREEBUSY_MAX_DAYS), time_max)
+                try:
+                    intervals, errors = self._free_busy(calendars, start, end)
+                except (requests.RequestException, ValueError, KeyError):
+                    intervals, errors = [], set(calendars)
+                busy   += intervals
+                failed |= errors
+                start = end
+
+        for calendar_id in self.calendar_ids:
+            self.sources[calendar_id] = "events" if calendar_id in failed else "freeBusy"
+            if calendar_id in failed:
+                busy += self._from_events(calendar_id, time_min, time_max)
+        return busy
+
+    def _free_busy(
+        self,
+        calendars: list[str],
+        time_min: datetime.datetime,
+        time_max: datetime.datetime,
+    ) -> tuple[list[Interval], set[str]]:
+        resp = self._http.post(
+            f"{(self.api_base or calendar_sync.CALENDAR_API_BASE).rstrip('/')}/freeBusy",
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            json={
+                "timeMin":  rfc3339(time_min, self.time_zone),
+                "timeMax":  rfc3339(time_max, self.time_zone),
+                "timeZone": self.time_zone,
+                "items":    [{"id": c} for c in calendars],
+            },
+            timeout=calendar_sync.REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        answers = resp.json()["calendars"]
+        busy: list[Interval] = []
+        errors: set[str] = set()
+        for calendar_id in calendars:
+            answer = answers.get(calendar_id)
+            if answer is None or answer.get("errors"):
+                errors.add(calendar_id)
+                continue
+            busy += [(self._wall_clock(b["start"]), self._wall_clock(b["end"])) for b in answer.get("busy", [])]
+        return busy, errors
+
+    def _wall_clock(self, raw: str) -> datetime.datetime:
+        return wall_clock(raw, self.time_zone)
+
+    def _from_events(self, calendar_id: str, time_min: datetime.datetime, time_max: datetime.datetime) -> list[Interval]:
+        """Timed events of one calendar — the pre-freeBusy path. All-day events don't block slots."""
+        if self.user_id is not None:
+            calendar_sync.sync_calendar(
+                self.user_id, self.access_token, calendar_id, api_base=self.api_base, http=self._http,
+            )
+            # The cache is in TIME_ZONE; rfc3339() round-trips it into ours
+            rows = ds.get_calendar_events_between(
+                self.user_id, calendar_id,
+                self._cache_clock(time_min), self._cache_clock(time_max),
+            )
+            return [
+                (self._wall_clock(rfc3339(r.start_at)), self._wall_clock(rfc3339(r.end_at)))
+                for r in rows if not r.all_day
+            ]
+        events = calendar_sync.list_events(
+            self.access_token,
+            self._cache_clock(time_min), self._cache_clock(time_max),
+            calendar_id, api_base=self.api_base, http=self._http,
+        )
+        return [
+            (self._wall_clock(e["start"]["dateTime"]), self._wall_clock(e["end"]["dateTime"]))
+            for e in events
+            if e.get("start", {}).get("dateTime") and e.get("end", {}).get("dateTime")
+        ]
+
+    def _cache_clock(self, moment: datetime.datetime) -> datetime.datetime:
+        """One of our wall-clock times as calendar_sync's (TIME_ZONE) wall clock."""
+        return wall_clock(rfc3339(moment, self.time_zone))
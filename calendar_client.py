@@ -0,0 +1,156 @@
+"""
+calendar_client.py — pooled, retrying writes to Google Calendar.
+
+One requests.Session is shared by every call, so connections (and their
+TLS handshakes) are reused across events, threads and button clicks.
+insert_events() pushes a whole plan through a bounded thread pool and
+reports a result per event instead of stopping at the first failure.
+
+Each insert is retried with exponential backoff (honouring Retry-After) on
+429, 5xx, Google's rate-limit 403s and connection errors. Every event
+carries a client-generated id, so a retry of an insert that actually
+reached Google gets 409 Conflict, which counts as success — retries never
+create duplicates.
+"""
+
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    RetryError, Retrying, retry_if_exception, stop_after_attempt,
+)
+
+from calendar_sync import REQUEST_TIMEOUT, events_url
+
+MAX_WORKERS   = 8     # concurrent inserts; also the connection pool size
+MAX_ATTEMPTS  = 5
+BACKOFF_BASE  = 0.5   # seconds; doubled per attempt, with jitter
+BACKOFF_MAX   = 8.0
+
+_RETRY_STATUSES    = {429, 500, 502, 503, 504}
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    """The process-wide keep-alive session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def new_event_id() -> str:
+    """An id Google accepts for events.insert (base32hex, 5–1024 chars)."""
+    return uuid.uuid4().hex
+
+
+class CalendarAPIError(Exception):
+    def __init__(self, status: int, message: str, retry_after: float | None = None):
+        super().__init__(f"{status}: {message}")
+        self.status      = status
+        self.retry_after = retry_after
+
+
+@dataclass
+class EventResult:
+    index:    int           # position in the list passed to insert_events()
+    ok:       bool
+    event:    dict | None   # the created event, as returned by Google
+    error:    str | None
+    attempts: int
+
+
+def _error_from(resp: requests.Response) -> CalendarAPIError:
+    try:
+        error = resp.json().get("error", {})
+    except ValueError:
+        error = {}
+    message = error.get("message") or resp.reason or "request failed"
+    reasons = {e.get("reason") for e in error.get("errors", [])}
+    status  = resp.status_code
+    if status == 403 and reasons & _RATE_LIMIT_REASONS:
+        status = 429   # Google reports some rate limits as 403
+    retry_after = resp.headers.get("Retry-After")
+    return CalendarAPIError(
+        status, message, float(retry_after) if retry_after and retry_after.isdigit() else None,
+    )
+
+
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, CalendarAPIError):
+        return exc.status in _RETRY_STATUSES
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def _backoff(retry_state) -> float:
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, CalendarAPIError) and exc.retry_after is not None:
+        return min(exc.retry_after, BACKOFF_MAX)
+    delay = min(BACKOFF_BASE * 2 ** (retry_state.attempt_number - 1), BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CalendarClient:
+    def __init__(
+        self,
+        access_token: str,
+        calendar_id: str = "primary",
+        *,
+        api_base: str | None = None,
+        http: requests.Session | None = None,
+        max_workers: int = MAX_WORKERS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self._headers     = {"Authorization": f"Bearer {access_token}"}
+        self._url         = events_url(calendar_id, api_base)
+        self._http        = http or shared_session()
+        self.max_workers  = max_workers
+        self.max_attempts = max_attempts
+
+    def _post(self, body: dict) -> dict:
+        resp = self._http.post(self._url, headers=self._headers, json=body, timeout=REQUEST_TIMEOUT)
+        if resp.status_code == 409 and body.get("id"):
+            return {**body, "status": "confirmed"}   # an earlier attempt already created it
+        if not resp.ok:
+            raise _error_from(resp)
+        return resp.json()
+
+    def insert_event(self, body: dict) -> EventResult:
+        """Insert one event, retrying transient failures. Adds an id to `body` if it has none."""
+        body.setdefault("id", new_event_id())
+        retrying = Retrying(
+            retry=retry_if_exception(_retryable),
+            wait=_backoff,
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=False,
+        )
+        try:
+            event = retrying(self._post, body)
+        except RetryError as exc:
+            error = exc.last_attempt.exception()
+            return EventResult(0, False, None, str(error), retrying.statistics["attempt_number"])
+        except (CalendarAPIError, requests.RequestException) as exc:
+            return EventResult(0, False, None, str(exc), retrying.statistics["attempt_number"])
+        return EventResult(0, True, event, None, retrying.statistics["attempt_number"])
+
+    def insert_events(self, bodies: list[dict]) -> list[EventResult]:
+        """Insert every event across the thread pool; one result per body, in input order."""
+        if not bodies:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(bodies))) as pool:
+            results = list(pool.map(self.insert_event, bodies))
+        for index, result in enumerate(results):
+            result.index = index
+        return results
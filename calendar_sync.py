@@ -0,0 +1,220 @@
+"""
+calendar_sync.py — Google Calendar events, paginated and cached locally.
+
+events.list returns at most one page per request; busy calendars need the
+nextPageToken chain followed to the end. sync_calendar() does that and
+keeps a per-user copy of the events in the calendar_events table:
+
+  * the first sync (and any sync after the token expires) is a full sync
+    from SYNC_LOOKBACK_DAYS ago onwards, which ends with a nextSyncToken
+  * later syncs send that syncToken and get back only what changed since —
+    new, edited and cancelled events — usually a single short page
+  * 410 Gone means Google dropped the token; the cache is rebuilt with a
+    full sync
+
+get_events() syncs and then answers a time window from the cache, in the
+shape events.list returns, so the scheduler treats both the same.
+
+All times here — the cache, query windows, timeMin / timeMax — are naive
+wall-clock times in TIME_ZONE, the zone the scheduler plans and pushes
+events in. Event times are converted into it from their own offsets, and
+naive window bounds go to Google with TIME_ZONE's real offset attached.
+
+Nothing here touches Streamlit. The API root comes from
+GOOGLE_CALENDAR_API_BASE (or the api_base argument) and the HTTP session
+can be passed in, so the module runs against a local stand-in for the
+Calendar API.
+"""
+
+import datetime
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+
+import requests
+
+import database_service as ds
+
+CALENDAR_API_BASE  = os.environ.get("GOOGLE_CALENDAR_API_BASE", "https://www.googleapis.com/calendar/v3")
+PAGE_SIZE          = 2500   # events.list maximum
+SYNC_LOOKBACK_DAYS = 1      # a full sync starts this far back; older events are pruned
+REQUEST_TIMEOUT    = 10
+TIME_ZONE          = "America/New_York"   # the wall clock the scheduler plans and pushes events in
+
+# Partial response: only what the cache stores, not descriptions, attendees, ...
+_EVENT_FIELDS = "items(id,status,summary,start,end),nextPageToken,nextSyncToken"
+
+
+class SyncTokenExpired(Exception):
+    """The Calendar API answered 410 Gone: the sync token is no longer valid."""
+
+
+@dataclass
+class SyncResult:
+    full:     bool    # a full sync (first run, or after an expired token)
+    pages:    int
+    upserted: int
+    deleted:  int
+
+
+def events_url(calendar_id: str = "primary", api_base: str | None = None) -> str:
+    return f"{(api_base or CALENDAR_API_BASE).rstrip('/')}/calendars/{quote(calendar_id, safe='')}/events"
+
+
+def rfc3339(moment: datetime.datetime, time_zone: str = TIME_ZONE) -> str:
+    """RFC 3339 with a real offset; a naive `moment` is wall clock in time_zone."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=ZoneInfo(time_zone))
+    return moment.replace(microsecond=0).isoformat()
+
+
+def wall_clock(raw: str, time_zone: str = TIME_ZONE) -> datetime.datetime:
+    """An RFC 3339 timestamp as naive wall-clock time in time_zone (naive input is taken as-is)."""
+    moment = datetime.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(ZoneInfo(time_zone)).replace(tzinfo=None)
+
+
+def wall_clock_now(time_zone: str = TIME_ZONE) -> datetime.datetime:
+    return datetime.datetime.now(ZoneInfo(time_zone)).replace(tzinfo=None)
+
+
+def _iter_pages(http, url: str, access_token: str, params: dict) -> Iterator[dict]:
+    """Every page of an events.list call, following nextPageToken."""
+    params = {**params, "maxResults": PAGE_SIZE, "fields": _EVENT_FIELDS}
+    while True:
+        resp = http.get(
+            url,
+            headers={"Authorization": f"Bearer {access_token}"},
+            params=params,
+            timeout=REQUEST_TIMEOUT,
+        )
+        if resp.status_code == 410:
+            raise SyncTokenExpired(resp.text)
+        resp.raise_for_status()
+        body = resp.json()
+        yield body
+        if not body.get("nextPageToken"):
+            return
+        params = {**params, "pageToken": body["nextPageToken"]}
+
+
+def list_events(
+    access_token: str,
+    time_min: datetime.datetime,
+    time_max: datetime.datetime,
+    calendar_id: str = "primary",
+    *,
+    api_base: str | None = None,
+    http=None,
+) -> list[dict]:
+    """Every event in [time_min, time_max) (wall clock in TIME_ZONE), across all pages, uncached."""
+    params = {
+        "timeMin":      rfc3339(time_min),
+        "timeMax":      rfc3339(time_max),
+        "singleEvents": True,
+        "orderBy":      "startTime",
+    }
+    pages = _iter_pages(http or requests, events_url(calendar_id, api_base), access_token, params)
+    return [item for page in pages for item in page.get("items", [])]
+
+# ─────────────────────────── sync ────────────────────────────────────
+
+def _parse_time(raw: dict) -> tuple[datetime.datetime, bool] | None:
+    """(wall-clock datetime in TIME_ZONE, all_day) from an event's start / end object."""
+    if raw.get("dateTime"):
+        return wall_clock(raw["dateTime"]), False
+    if raw.get("date"):
+        return datetime.datetime.fromisoformat(raw["date"]), True
+    return None
+
+
+def _event_row(item: dict) -> dict | None:
+    start = _parse_time(item.get("start", {}))
+    end   = _parse_time(item.get("end", {}))
+    if start is None or end is None:
+        return None
+    return {
+        "event_id": item["id"],
+        "summary":  item.get("summary"),
+        "start_at": start[0],
+        "end_at":   end[0],
+        "all_day":  start[1],
+    }
+
+
+def _sync(http, user_id: int, access_token: str, calendar_id: str, api_base, params: dict, full: bool) -> SyncResult:
+    changed: dict[str, dict] = {}
+    deleted: set[str] = set()
+    pages, body = 0, {}
+    for body in _iter_pages(http, events_url(calendar_id, api_base), access_token, params):
+        pages += 1
+        for item in body.get("items", []):
+            row = None if item.get("status") == "cancelled" else _event_row(item)
+            if row is None:
+                changed.pop(item["id"], None)
+                deleted.add(item["id"])
+            else:
+                deleted.discard(item["id"])
+                changed[item["id"]] = row
+
+    ds.apply_calendar_sync(
+        user_id, calendar_id, list(changed.values()), deleted, body.get("nextSyncToken"),
+        full=full,
+        prune_before=wall_clock_now() - datetime.timedelta(days=SYNC_LOOKBACK_DAYS),
+    )
+    return SyncResult(full=full, pages=pages, upserted=len(changed), deleted=len(deleted))
+
+
+def sync_calendar(
+    user_id: int,
+    access_token: str,
+    calendar_id: str = "primary",
+    *,
+    api_base: str | None = None,
+    http=None,
+) -> SyncResult:
+    """
+    Bring the user's cached copy of `calendar_id` up to date: incremental
+    with the stored sync token, or a full sync when there is none or it
+    has expired. Nothing is stored unless every page was fetched.
+    """
+    http  = http or requests
+    token = ds.get_calendar_sync_token(user_id, calendar_id)
+    if token is not None:
+        try:
+            return _sync(http, user_id, access_token, calendar_id, api_base,
+                         {"syncToken": token, "singleEvents": True}, full=False)
+        except SyncTokenExpired:
+            pass   # fall through to a full sync, which replaces the cache
+    since = wall_clock_now() - datetime.timedelta(days=SYNC_LOOKBACK_DAYS)
+    return _sync(http, user_id, access_token, calendar_id, api_base,
+                 {"timeMin": rfc3339(since), "singleEvents": True}, full=True)
+
+
+def _as_api_event(row: ds.CalendarEventRow) -> dict:
+    if row.all_day:
+        start, end = {"date": row.start_at.date().isoformat()}, {"date": row.end_at.date().isoformat()}
+    else:
+        start = {"dateTime": rfc3339(row.start_at), "timeZone": TIME_ZONE}
+        end   = {"dateTime": rfc3339(row.end_at),   "timeZone": TIME_ZONE}
+    return {"id": row.event_id, "summary": row.summary, "start": start, "end": end}
+
+
+def get_events(
+    user_id: int,
+    access_token: str,
+    days_ahead: int = 7,
+    calendar_id: str = "primary",
+    *,
+    api_base: str | None = None,
+    http=None,
+) -> list[dict]:
+    """Sync, then return the cached events of the next `days_ahead` days in events.list shape."""
+    sync_calendar(user_id, access_token, calendar_id, api_base=api_base, http=http)
+    now  = wall_clock_now()
+    rows = ds.get_calendar_events_between(user_id, calendar_id, now, now + datetime.timedelta(days=days_ahead))
+    return [_as_api_event(row) for row in rows]
@@ -1,52 +1,127 @@
+import csv
 import datetime
+import functools
+import inspect
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
 from contextlib import contextmanager
-from dataclasses import dataclass
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 
-import streamlit as st
-from passlib.context import CryptContext
 from sqlalchemy import (
     Column, Integer, String, Float, Date, DateTime, Boolean,
-    ForeignKey, Text, create_engine, exists, func, desc,
+    ForeignKey, Index, Text, bindparam, case, delete, exists, func, desc, insert, literal, or_,
+    select, tuple_, union_all, update,
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from urllib.parse import quote_plus
 
-# ─────────────────────────── connection ──────────────────────────────
+from db_config import create_engine_for, load_database_url, load_replica_urls
+from exercise_library import EXERCISES
+from instrumentation import instrument_engine, instrumented, timed_checkout
+from migrations import run_migrations
+from password_hashing import hash_password, verify_and_update
+from replicas import ReplicaSet
 
-def _build_database_url() -> str:
-    host     = st.secrets["DB_HOST"]
-    port     = int(st.secrets["DB_PORT"])
-    name     = st.secrets["DB_NAME"]
-    user     = st.secrets["DB_USER"]
-    password = quote_plus(st.secrets["DB_PASSWORD"])
-    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}?sslmode=require"
+# ─────────────────────────── connection ──────────────────────────────
+#
+# Nothing here touches Streamlit: the URL comes from db_config (argument,
+# environment, or st.secrets when the app has already imported Streamlit),
+# so the same functions run in the app, batch jobs, CLIs and benchmarks.
+#
+# Writes always go to the primary. Reads made through @_cached_read (and the
+# export stream) go to a read replica when any are configured, unless the
+# user wrote within READ_YOUR_WRITES_SECONDS — then the replica might not
+# have their write yet, and the primary answers. The window is per process
+# and should exceed the replicas' max lag.
+
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+
+_engine          = None
+_session_factory = None
+_replicas: ReplicaSet | None = None
+_tables_ready    = False
+_engine_lock     = threading.RLock()
+
+_recent_writes: dict[int, float] = {}   # user_id → monotonic time of their last write
+_read_user: ContextVar[int | None] = ContextVar("_read_user", default=None)   # set by @_cached_read
+
+
+def configure(url: str | None = None, replica_urls: list[str] | None = None, **engine_kwargs) -> None:
+    """
+    Point the module at a database (and optional read replicas), replacing
+    any engines already built. Optional — the first query configures
+    itself from the environment.
+    """
+    global _engine, _session_factory, _replicas, _tables_ready
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        if _replicas is not None:
+            _replicas.dispose()
+        _engine          = create_engine_for(load_database_url(url), **engine_kwargs)
+        _session_factory = sessionmaker(bind=_engine, expire_on_commit=False)
+        replica_urls     = load_replica_urls(replica_urls)
+        _replicas        = ReplicaSet(replica_urls, **engine_kwargs) if replica_urls else None
+        _tables_ready    = False
+        instrument_engine(_engine)
+        for replica in _replicas.replicas if _replicas is not None else ():
+            instrument_engine(replica.engine)
+        _recent_writes.clear()
+    _read_cache.bump(None)
 
 
-@st.cache_resource
 def get_engine():
-    return create_engine(
-        _build_database_url(),
-        pool_pre_ping=True,
-        pool_recycle=300,
-        connect_args={"connect_timeout": 10},
-    )
+    if _engine is None:
+        configure()
+    return _engine
+
+
+def get_replica_set() -> ReplicaSet | None:
+    get_engine()
+    return _replicas
+
+
+def replica_status() -> list[dict]:
+    """Lag and health of each configured replica (empty without replicas)."""
+    replicas = get_replica_set()
+    return replicas.status() if replicas is not None else []
 
 
 Base = declarative_base()
 
 
 def _get_session_factory():
-    return sessionmaker(bind=get_engine(), expire_on_commit=False)
+    get_engine()
+    return _session_factory
+
+
+def _note_write(user_id: int) -> None:
+    _recent_writes[user_id] = time.monotonic()
 
-# ─────────────────────────── password hashing ────────────────────────
 
-_pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+def _replica_for(user_id: int | None):
+    """A usable replica for a read on behalf of user_id, or None to use the primary."""
+    if _replicas is None or user_id is None:
+        return None
+    wrote_at = _recent_writes.get(user_id)
+    if wrote_at is not None and time.monotonic() - wrote_at < READ_YOUR_WRITES_SECONDS:
+        return None
+    return _replicas.pick()
+
 
-def hash_password(password: str) -> str:
-    return _pwd_context.hash(password)
+def _insert_for(s, model):
+    """Dialect-specific INSERT (for ON CONFLICT support) matching the session's database."""
+    if s.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return _pwd_context.verify(plain, hashed)
 
 # ─────────────────────────── models ──────────────────────────────────
 
@@ -78,11 +153,37 @@ class UserProfile(Base):
     equipment     = Column(String, nullable=True)   # "Full gym" | "Dumbbells" | "Bodyweight"
     focus_areas   = Column(String, nullable=True)   # comma-separated, e.g. "Chest,Arms"
     split_type    = Column(String, nullable=True)   # "PPL" | "Upper/Lower" | "Full Body"
+    weight_unit   = Column(String, nullable=True)   # preferred display unit, "lbs" | "kg"
     has_plan      = Column(Boolean, default=False, nullable=False)
 
     user = relationship("User", back_populates="profile", uselist=False)
 
 
+class ExerciseDefinition(Base):
+    """
+    The exercise dimension: every exercise_library entry (user_id NULL)
+    plus each user's custom exercises, added the first time they're used.
+    Templates, logs and the derived tables key on exercises.id, so grouping
+    and joins run on integers; the name a user typed stays on their rows.
+    (Named to avoid clashing with exercise_library.Exercise.)
+    """
+    __tablename__ = "exercises"
+
+    id       = Column(Integer, primary_key=True)
+    user_id  = Column(Integer, ForeignKey("users.id"), nullable=True)   # NULL = library exercise
+    name     = Column(String, nullable=False)
+    category = Column(String, nullable=False, default="other")   # "push" | "pull" | "legs" | "core" | "other"
+
+
+# Case-insensitive name lookup, unique per owner (library rows share owner 0)
+Index(
+    "uq_exercises_owner_lower_name",
+    func.coalesce(ExerciseDefinition.user_id, 0),
+    func.lower(ExerciseDefinition.name),
+    unique=True,
+)
+
+
 class Workout(Base):
     """
     The user's programme template — what they *plan* to do each session.
@@ -92,10 +193,15 @@ class Workout(Base):
     NOT a history record; this is the source of truth for the scheduler.
     """
     __tablename__ = "workouts"
+    __table_args__ = (
+        Index("ix_workouts_user_plan_day", "user_id", "plan_day", "sort_order"),
+        Index("ix_workouts_user_exercise_id", "user_id", "exercise_id"),
+    )
 
     id           = Column(Integer, primary_key=True)
     user_id      = Column(Integer, ForeignKey("users.id"), nullable=False)
     exercise     = Column(String, nullable=False)
+    exercise_id  = Column(Integer, ForeignKey("exercises.id"), nullable=True)   # set on every write
     sets         = Column(Integer, nullable=False)
     reps         = Column(Integer, nullable=False)
     weight       = Column(Float, nullable=True)
@@ -113,16 +219,25 @@ class WorkoutSession(Base):
     and optional free-text notes.
     """
     __tablename__ = "workout_sessions"
+    __table_args__ = (
+        Index("ix_workout_sessions_user_history", "user_id", "date", "created_at", "id",
+              postgresql_include=["ppl_day"]),
+        Index("uq_workout_sessions_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
 
     id         = Column(Integer, primary_key=True)
     user_id    = Column(Integer, ForeignKey("users.id"), nullable=False)
     date       = Column(Date, nullable=False, default=datetime.date.today)
     ppl_day    = Column(String, nullable=True)   # "Push" | "Pull" | "Legs" | None
     notes      = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)   # part of the history cursor
+    idempotency_key = Column(String, nullable=True)   # set by log_full_session
 
     user = relationship("User", back_populates="workout_sessions")
-    logs = relationship("WorkoutLog", back_populates="session", cascade="all, delete-orphan")
+    logs = relationship(
+        "WorkoutLog", back_populates="session", cascade="all, delete-orphan",
+        order_by="WorkoutLog.id",
+    )
 
 
 class WorkoutLog(Base):
@@ -132,55 +247,186 @@ class WorkoutLog(Base):
     from the Workout template because performance varies day to day.
     """
     __tablename__ = "workout_logs"
+    __table_args__ = (
+        Index("ix_workout_logs_user_exercise_id_weight_kg", "user_id", "exercise_id", "weight_kg",
+              postgresql_include=["session_id", "sets", "reps"]),
+        Index("ix_workout_logs_session_id", "session_id"),
+    )
 
     id          = Column(Integer, primary_key=True)
     session_id  = Column(Integer, ForeignKey("workout_sessions.id"), nullable=False)
     user_id     = Column(Integer, ForeignKey("users.id"), nullable=False)
     exercise    = Column(String, nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=True)   # set on every write
     sets        = Column(Integer, nullable=False)
     reps        = Column(Integer, nullable=False)
-    weight      = Column(Float, nullable=True)
+    weight      = Column(Float, nullable=True)    # as entered, in weight_unit
     weight_unit = Column(String, nullable=True)
+    weight_kg   = Column(Float, nullable=True)    # canonical; set on every write, used by all aggregates
 
     session = relationship("WorkoutSession", back_populates="logs")
 
 
-# ─────────────────────────── DB session context manager ──────────────
+class PersonalRecord(Base):
+    """
+    Heaviest logged weight per (user, exercise), compared in kg whatever unit
+    each log was entered in. Maintained in the same transaction as every
+    workout_logs write, so reading PRs is a primary-key range scan instead
+    of a pass over the whole log history.
+    Derived data — backfill_personal_records() rebuilds it from the logs.
+    """
+    __tablename__ = "personal_records"
 
-def _run_migrations(engine) -> None:
-    """
-    Idempotent column migrations for tables that already exist in production.
-    create_all() never alters existing tables, so new columns must be added here.
-    Each ALTER TABLE uses IF NOT EXISTS so it is safe to run on every startup.
-    """
-    from sqlalchemy import text
-    migrations = [
-        # workouts — columns added after initial deploy
-        "ALTER TABLE workouts ADD COLUMN IF NOT EXISTS plan_day VARCHAR",
-        "ALTER TABLE workouts ADD COLUMN IF NOT EXISTS sort_order INTEGER NOT NULL DEFAULT 0",
-        # workout_sessions — columns added after initial deploy
-        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS ppl_day VARCHAR",
-        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS notes TEXT",
-        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()",
-    ]
-    with engine.begin() as conn:
-        for sql in migrations:
-            conn.execute(text(sql))
+    user_id     = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), primary_key=True)
+    weight_kg   = Column(Float, nullable=False)
+    reps        = Column(Integer, nullable=False)
+    date        = Column(Date, nullable=False)
+    log_id      = Column(Integer, nullable=False)   # the workout_logs row holding the record
+
+
+ROLLUP_GRAINS = ("day", "week", "month")
+
+
+class VolumeRollup(Base):
+    """
+    Pre-aggregated training volume (sets × reps × kg) per user, exercise
+    and period, at each of ROLLUP_GRAINS. period_start is the day itself,
+    the Monday of the week, or the 1st of the month. Per-category charts
+    join exercises on the integer key.
+    Maintained on write like personal_records; backfill_volume_rollups()
+    rebuilds it from the logs.
+    """
+    __tablename__ = "volume_rollups"
+    __table_args__ = (
+        Index("ix_volume_rollups_user_grain_period", "user_id", "grain", "period_start",
+              postgresql_include=["exercise_id", "volume_kg"]),
+    )
+
+    user_id      = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    exercise_id  = Column(Integer, ForeignKey("exercises.id"), primary_key=True)
+    grain        = Column(String, primary_key=True)   # "day" | "week" | "month"
+    period_start = Column(Date, primary_key=True)
+    volume_kg    = Column(Float, nullable=False, default=0.0)
+    log_count    = Column(Integer, nullable=False, default=0)   # row is dropped when this hits 0
+
+
+class UserStats(Base):
+    """
+    One row of running dashboard counters per user, kept current by the
+    write hooks on workout_sessions and workout_logs so the dashboard is a
+    primary-key lookup. The streak and week figures describe the user's
+    newest session date — whether that is still "current" is decided at
+    read time. A user without sessions may have no row at all.
+    Derived data — backfill_user_stats() rebuilds it, check_user_stats()
+    finds and repairs drift.
+    """
+    __tablename__ = "user_stats"
 
+    user_id           = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_sessions    = Column(Integer, nullable=False, default=0)
+    total_exercises   = Column(Integer, nullable=False, default=0)   # distinct exercise_id ever logged
+    last_session_date = Column(Date, nullable=True)
+    streak_days       = Column(Integer, nullable=False, default=0)   # consecutive days ending at last_session_date
+    week_sessions     = Column(Integer, nullable=False, default=0)   # sessions in last_session_date's week
+
+
+class UserDayCount(Base):
+    """
+    Sessions per ppl_day per user, for whatever label the session was saved
+    with — Push, Upper, Full Body — so the favourite day is a short
+    primary-key range read. (Imports only ever label Push / Pull / Legs.)
+    Kept alongside user_stats by the same hook and backfill; a row is
+    dropped when its count reaches 0.
+    """
+    __tablename__ = "user_day_counts"
+
+    user_id  = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    ppl_day  = Column(String, primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+
+
+class CalendarEvent(Base):
+    """
+    Local copy of a user's Google Calendar events, kept current by
+    calendar_sync with incremental (syncToken) syncs. Times are naive
+    wall-clock times in calendar_sync.TIME_ZONE, converted from each
+    event's own offset; all-day events start and end at midnight.
+    """
+    __tablename__ = "calendar_events"
+    __table_args__ = (
+        Index("ix_calendar_events_user_calendar_start", "user_id", "calendar_id", "start_at"),
+    )
+
+    user_id     = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    calendar_id = Column(String, primary_key=True)
+    event_id    = Column(String, primary_key=True)
+    summary     = Column(String, nullable=True)
+    start_at    = Column(DateTime, nullable=False)
+    end_at      = Column(DateTime, nullable=False)
+    all_day     = Column(Boolean, nullable=False, default=False)
+
+
+class CalendarSyncState(Base):
+    """Where the last sync of one of a user's calendars left off."""
+    __tablename__ = "calendar_sync_state"
+
+    user_id     = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    calendar_id = Column(String, primary_key=True)
+    sync_token  = Column(String, nullable=True)    # nextSyncToken from the last completed sync
+    synced_at   = Column(DateTime, nullable=False)
+
+
+# ─────────────────────────── DB session context manager ──────────────
 
-@st.cache_resource
 def _ensure_tables():
-    """Create new tables and run column migrations, exactly once per process."""
+    """Create new tables and apply pending migrations, once per configured engine."""
+    global _tables_ready
+    if _tables_ready:
+        return
     engine = get_engine()
-    Base.metadata.create_all(engine)
-    _run_migrations(engine)
+    with _engine_lock:
+        if not _tables_ready:
+            run_migrations(engine, Base.metadata)
+            with engine.begin() as conn:
+                seed_exercise_library(conn=conn)
+            _tables_ready = True
+
+
+def _open_session():
+    """A session on a replica inside a routed read, failing over to the primary."""
+    replica = _replica_for(_read_user.get())
+    if replica is not None:
+        s = replica.sessions()
+        try:
+            with timed_checkout("replica"):
+                s.connection()     # connect now, so a dead replica fails over here
+            return s
+        except DBAPIError:
+            s.close()
+            _replicas.mark_down(replica)
+    s = _get_session_factory()()
+    with timed_checkout("primary"):
+        s.connection()
+    return s
+
+
+def _read_connection(user_id: int):
+    """A Core connection for a long read on behalf of user_id, replica first."""
+    replica = _replica_for(user_id)
+    if replica is not None:
+        try:
+            return replica.engine.connect()
+        except DBAPIError:
+            _replicas.mark_down(replica)
+    return get_engine().connect()
 
 
 @contextmanager
 def _session():
     """Yield a DB session and handle commit / rollback / close automatically."""
     _ensure_tables()
-    s = _get_session_factory()()
+    s = _open_session()
     try:
         yield s
         s.commit()
@@ -190,10 +436,1061 @@ def _session():
     finally:
         s.close()
 
+# ─────────────────────────── read cache ──────────────────────────────
+#
+# Streamlit reruns the whole script on every widget interaction, so the same
+# reads repeat constantly with nothing changed in between. Reads decorated
+# with @_cached_read are served from a per-process LRU keyed by the user's
+# version counter; writes decorated with @_invalidates_user bump that
+# counter once they have committed, so older entries can never be served
+# again and simply age out. Cached results are shared — treat them as
+# read-only.
+
+READ_CACHE_MAX_ENTRIES = 4096
+
+
+class _ReadCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int | None) -> None:
+        """Invalidate one user's entries, or everything when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get(self, key) -> tuple[bool, object]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":   len(self._entries),
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "hit_rate":  self.hits / lookups if lookups else 0.0,
+            }
+
+
+_read_cache = _ReadCache(READ_CACHE_MAX_ENTRIES)
+
+
+def _bind_user_call(fn):
+    """Return a function mapping fn's call arguments to (user_id, hashable args)."""
+    sig = inspect.signature(fn)
+
+    def extract(args, kwargs) -> tuple[int, tuple]:
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return bound.arguments["user_id"], tuple(bound.arguments.items())
+    return extract
+
+
+def _cached_read(fn):
+    extract = _bind_user_call(fn)
+    timed   = instrumented(fn)     # only misses are timed — hits never reach the database
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id, call_args = extract(args, kwargs)
+        # today() is part of the key: streaks, "this week" and volume
+        # windows all move at midnight even when nothing was written
+        key = (fn.__name__, _read_cache.version(user_id), datetime.date.today(), call_args)
+        hit, value = _read_cache.get(key)
+        if hit:
+            return value
+        token = _read_user.set(user_id)   # lets _session() route this read to a replica
+        try:
+            value = timed(*args, **kwargs)
+        finally:
+            _read_user.reset(token)
+        _read_cache.put(key, value)
+        return value
+    return wrapper
+
+
+def _invalidates_user(fn):
+    extract = _bind_user_call(fn)
+    timed   = instrumented(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id, _ = extract(args, kwargs)
+        # Noted before as well as after, so a concurrent read of this user
+        # can't reach a replica while the write is in flight
+        _note_write(user_id)
+        try:
+            return timed(*args, **kwargs)
+        finally:
+            _note_write(user_id)
+            _read_cache.bump(user_id)
+    return wrapper
+
+
+def read_cache_stats() -> dict:
+    """Entry count, hit/miss/eviction counters and hit rate of the read cache."""
+    return _read_cache.stats()
+
+
+def clear_read_cache() -> None:
+    _read_cache.bump(None)
+
+# ─────────────────────────── units ───────────────────────────────────
+#
+# Logs keep the weight as entered; weight_kg is the canonical copy every
+# aggregate runs on. Conversion back happens only for display.
+
+KG_PER_LB    = 0.45359237
+DEFAULT_UNIT = "lbs"
+
+
+def to_kg(weight: float | None, unit: str | None) -> float | None:
+    """Weight in kg. Anything not entered as kg is pounds, the app's default unit."""
+    if weight is None:
+        return None
+    return weight if unit == "kg" else weight * KG_PER_LB
+
+
+def from_kg(weight_kg: float, unit: str) -> float:
+    return weight_kg if unit == "kg" else weight_kg / KG_PER_LB
+
+
+def _weight_kg_expr(table):
+    """SQL equivalent of to_kg() over a table's weight / weight_unit columns."""
+    return case((table.weight_unit == "kg", table.weight), else_=table.weight * KG_PER_LB)
+
+
+def backfill_weight_kg(*, batch_size: int = 5000, conn=None) -> int:
+    """
+    Set weight_kg on workout_logs rows that have a weight but no canonical
+    copy, in primary-key ranges of batch_size. Without `conn` every batch
+    commits on its own. Returns the number of rows updated.
+    """
+    if conn is None:
+        updated = 0
+        for low, high in _id_ranges(WorkoutLog, batch_size):
+            with get_engine().begin() as conn:
+                updated += _backfill_weight_kg_range(conn, low, high)
+        return updated
+
+    updated = 0
+    for low, high in _id_ranges(WorkoutLog, batch_size, conn):
+        updated += _backfill_weight_kg_range(conn, low, high)
+    return updated
+
+
+def _backfill_weight_kg_range(conn, low: int, high: int) -> int:
+    return conn.execute(
+        update(WorkoutLog)
+        .where(
+            WorkoutLog.weight.isnot(None),
+            WorkoutLog.weight_kg.is_(None),
+            WorkoutLog.id >= low,
+            WorkoutLog.id <  high,
+        )
+        .values(weight_kg=_weight_kg_expr(WorkoutLog))
+    ).rowcount
+
+
+def backfill_session_created_at(*, batch_size: int = 5000, conn=None) -> int:
+    """
+    Give workout_sessions rows without a created_at midnight of their date,
+    so keyset paging on (date, created_at, id) sees them. Works in
+    primary-key ranges of batch_size; without `conn` every batch commits on
+    its own. Returns the number of rows updated.
+    """
+    if conn is None:
+        updated = 0
+        for low, high in _id_ranges(WorkoutSession, batch_size):
+            with get_engine().begin() as conn:
+                updated += _backfill_created_at_range(conn, low, high)
+        return updated
+
+    updated = 0
+    for low, high in _id_ranges(WorkoutSession, batch_size, conn):
+        updated += _backfill_created_at_range(conn, low, high)
+    return updated
+
+
+def _backfill_created_at_range(conn, low: int, high: int) -> int:
+    # Computed here rather than with CAST(date AS TIMESTAMP): SQLite's cast
+    # of a date string to a timestamp yields the year alone
+    missing = conn.execute(
+        select(WorkoutSession.id, WorkoutSession.date).where(
+            WorkoutSession.created_at.is_(None),
+            WorkoutSession.id >= low,
+            WorkoutSession.id <  high,
+        )
+    ).all()
+    if missing:
+        conn.execute(
+            update(WorkoutSession)
+            .where(WorkoutSession.id == bindparam("session_id"), WorkoutSession.created_at.is_(None))
+            .values(created_at=bindparam("started")),
+            [{"session_id": sid, "started": datetime.datetime.combine(date, datetime.time())} for sid, date in missing],
+        )
+    return len(missing)
+
+
+def _prepare_log_rows(s, user_id: int, rows: list[dict]) -> list[dict]:
+    """workout_logs insert rows with exercise_id and weight_kg filled in."""
+    return [
+        {**r, "weight_kg": to_kg(r.get("weight"), r.get("weight_unit"))}
+        for r in _with_exercise_ids(s, user_id, rows)
+    ]
+
+# ─────────────────────────── exercises ───────────────────────────────
+#
+# Names are matched case-insensitively. A library exercise wins over a
+# user's custom one of the same name; a name neither knows becomes a new
+# custom exercise for that user.
+
+def seed_exercise_library(*, conn=None) -> int:
+    """
+    Add every exercise_library entry missing from the exercises table.
+    Runs at startup, so exercises added to the library in code appear
+    without a migration. Returns the number of rows inserted.
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            return seed_exercise_library(conn=conn)
+
+    present = set(conn.execute(
+        select(func.lower(ExerciseDefinition.name)).where(ExerciseDefinition.user_id.is_(None))
+    ).scalars())
+    missing = [
+        {"user_id": None, "name": e.name, "category": e.category}
+        for e in EXERCISES if e.name.lower() not in present
+    ]
+    if missing:
+        conn.execute(insert(ExerciseDefinition), missing)
+    return len(missing)
+
+
+def _lookup_exercise_ids(s, user_id: int, names) -> dict[str, int]:
+    """Map lower-cased names to exercises.id for those that already exist."""
+    keys = {name.lower() for name in names}
+    if not keys:
+        return {}
+    found: dict[str, int] = {}
+    rows = s.execute(
+        select(ExerciseDefinition.id, func.lower(ExerciseDefinition.name), ExerciseDefinition.user_id)
+        .where(
+            func.coalesce(ExerciseDefinition.user_id, 0).in_([0, user_id]),
+            func.lower(ExerciseDefinition.name).in_(keys),
+        )
+    )
+    for exercise_id, key, owner in rows:
+        if owner is None or key not in found:
+            found[key] = exercise_id
+    return found
+
+
+def _exercise_ids(s, user_id: int, names) -> dict[str, int]:
+    """Like _lookup_exercise_ids, creating custom exercises for unknown names."""
+    names = list(names)
+    found = _lookup_exercise_ids(s, user_id, names)
+    new   = {name.lower(): name for name in names if name.lower() not in found}
+    if new:
+        s.execute(
+            _insert_for(s, ExerciseDefinition)
+            .values([{"user_id": user_id, "name": name, "category": "other"} for name in new.values()])
+            .on_conflict_do_nothing()      # a concurrent request created it first
+        )
+        found.update(_lookup_exercise_ids(s, user_id, new.values()))
+    return found
+
+
+def _with_exercise_ids(s, user_id: int, rows: list[dict]) -> list[dict]:
+    """Copies of rows with exercise_id set from "exercise", where present."""
+    ids = _exercise_ids(s, user_id, [r["exercise"] for r in rows if "exercise" in r])
+    return [
+        {**r, "exercise_id": ids[r["exercise"].lower()]} if "exercise" in r else dict(r)
+        for r in rows
+    ]
+
+
+def _matching_exercise_id(table):
+    """Correlated subquery resolving table.exercise for table.user_id, library first."""
+    return (
+        select(ExerciseDefinition.id)
+        .where(
+            func.lower(ExerciseDefinition.name) == func.lower(table.exercise),
+            or_(ExerciseDefinition.user_id.is_(None), ExerciseDefinition.user_id == table.user_id),
+        )
+        .order_by(func.coalesce(ExerciseDefinition.user_id, 0))
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def backfill_exercise_ids(*, batch_size: int = 5000, conn=None) -> int:
+    """
+    Set exercise_id on workouts and workout_logs rows that lack it,
+    creating custom exercises for names the library doesn't know. Rows are
+    updated in primary-key ranges of batch_size; without `conn` every batch
+    commits on its own, so this can run against a live database. Returns
+    the number of rows updated.
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            _create_missing_custom_exercises(conn)
+        updated = 0
+        for table in (Workout, WorkoutLog):
+            for low, high in _id_ranges(table, batch_size):
+                with get_engine().begin() as conn:
+                    updated += _backfill_exercise_id_range(conn, table, low, high)
+        return updated
+
+    _create_missing_custom_exercises(conn)
+    updated = 0
+    for table in (Workout, WorkoutLog):
+        for low, high in _id_ranges(table, batch_size, conn):
+            updated += _backfill_exercise_id_range(conn, table, low, high)
+    return updated
+
+
+def _create_missing_custom_exercises(conn) -> None:
+    names = union_all(
+        select(Workout.user_id, Workout.exercise).where(Workout.exercise_id.is_(None)),
+        select(WorkoutLog.user_id, WorkoutLog.exercise).where(WorkoutLog.exercise_id.is_(None)),
+    ).subquery()
+    known = exists().where(
+        func.lower(ExerciseDefinition.name) == func.lower(names.c.exercise),
+        or_(ExerciseDefinition.user_id.is_(None), ExerciseDefinition.user_id == names.c.user_id),
+    )
+    conn.execute(insert(ExerciseDefinition).from_select(
+        ["user_id", "name", "category"],
+        select(names.c.user_id, func.min(names.c.exercise), literal("other"))
+        .where(~known)
+        .group_by(names.c.user_id, func.lower(names.c.exercise)),
+    ))
+
+
+def _id_ranges(table, batch_size: int, conn=None):
+    if conn is None:
+        with get_engine().connect() as conn:
+            return _id_ranges(table, batch_size, conn)
+    low, high = conn.execute(select(func.min(table.id), func.max(table.id))).one()
+    if low is None:
+        return []
+    return [(start, start + batch_size) for start in range(low, high + 1, batch_size)]
+
+
+def _backfill_exercise_id_range(conn, table, low: int, high: int) -> int:
+    return conn.execute(
+        update(table)
+        .where(table.exercise_id.is_(None), table.id >= low, table.id < high)
+        .values(exercise_id=_matching_exercise_id(table))
+    ).rowcount
+
+# ─────────────────────────── derived-table maintenance ───────────────
+#
+# Called from every write path that adds, edits or removes workout logs,
+# inside that write's transaction (after a flush, so log ids exist).
+# Hooks take plain "facts" dicts rather than ORM objects so callers can
+# snapshot a log before editing it.
+
+def _log_facts(log: "WorkoutLog", date: datetime.date) -> dict:
+    return {
+        "id":          log.id,
+        "exercise_id": log.exercise_id,
+        "sets":        log.sets,
+        "reps":        log.reps,
+        "weight_kg":   log.weight_kg,
+        "date":        date,
+    }
+
+
+def _on_logs_added(s, user_id: int, facts: list[dict]) -> None:
+    """Raise beaten personal records, add the new volume to the rollups and count new exercises."""
+    weighted = [f for f in facts if f["weight_kg"] is not None]
+    _upsert_personal_records(s, user_id, [
+        {
+            "exercise_id": f["exercise_id"],
+            "weight_kg":   f["weight_kg"],
+            "reps":        f["reps"],
+            "date":        f["date"],
+            "log_id":      f["id"],
+        }
+        for f in weighted
+    ])
+    _apply_volume_deltas(s, user_id, weighted, sign=1)
+    _adjust_exercise_count(s, user_id, facts, sign=1)
+
+
+def _on_logs_removed(s, user_id: int, facts: list[dict]) -> None:
+    """
+    Subtract removed volume from the rollups, and recompute the personal
+    records that pointed at deleted or edited logs. Records held by other
+    logs are still valid and are left alone. Exercises left without any
+    logs drop out of the user's exercise count.
+    """
+    if not facts:
+        return
+    _apply_volume_deltas(s, user_id, [f for f in facts if f["weight_kg"] is not None], sign=-1)
+
+    stale = {
+        row[0] for row in
+        s.query(PersonalRecord.exercise_id)
+         .filter(
+             PersonalRecord.user_id == user_id,
+             PersonalRecord.log_id.in_([f["id"] for f in facts]),
+         )
+    }
+    for exercise_id in stale:
+        _recompute_personal_record(s, user_id, exercise_id)
+    _adjust_exercise_count(s, user_id, facts, sign=-1)
+
+
+def _upsert_personal_records(s, user_id: int, candidates: list[dict]) -> None:
+    """
+    Upsert the best candidate per exercise in one statement. An existing
+    record is only replaced by a heavier weight, or an equal weight logged
+    on the same day or later (the most recent tie wins).
+    """
+    best: dict[int, dict] = {}
+    for c in candidates:
+        cur = best.get(c["exercise_id"])
+        if cur is None or (c["weight_kg"], c["date"]) >= (cur["weight_kg"], cur["date"]):
+            best[c["exercise_id"]] = c
+    if not best:
+        return
+
+    stmt = _insert_for(s, PersonalRecord).values(
+        [{"user_id": user_id, **c} for c in best.values()]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PersonalRecord.user_id, PersonalRecord.exercise_id],
+        set_={
+            col: stmt.excluded[col]
+            for col in ("weight_kg", "reps", "date", "log_id")
+        },
+        where=(stmt.excluded.weight_kg > PersonalRecord.weight_kg) | (
+            (stmt.excluded.weight_kg == PersonalRecord.weight_kg)
+            & (stmt.excluded.date >= PersonalRecord.date)
+        ),
+    )
+    s.execute(stmt)
+
+
+def _recompute_personal_record(s, user_id: int, exercise_id: int) -> None:
+    """Rebuild one exercise's record from the raw logs (an index range scan)."""
+    s.query(PersonalRecord).filter_by(user_id=user_id, exercise_id=exercise_id).delete()
+    best = (
+        s.query(WorkoutLog, WorkoutSession.date)
+        .join(WorkoutSession, WorkoutLog.session_id == WorkoutSession.id)
+        .filter(
+            WorkoutLog.user_id     == user_id,
+            WorkoutLog.exercise_id == exercise_id,
+            WorkoutLog.weight_kg.isnot(None),
+        )
+        .order_by(desc(WorkoutLog.weight_kg), desc(WorkoutSession.date), desc(WorkoutLog.id))
+        .first()
+    )
+    if best:
+        log, date = best
+        s.add(PersonalRecord(
+            user_id=user_id,
+            exercise_id=exercise_id,
+            weight_kg=log.weight_kg,
+            reps=log.reps,
+            date=date,
+            log_id=log.id,
+        ))
+        s.flush()
+
+
+def _period_start(date: datetime.date, grain: str) -> datetime.date:
+    """First day of the rollup period containing `date`."""
+    if grain == "week":
+        return date - datetime.timedelta(days=date.weekday())
+    if grain == "month":
+        return date.replace(day=1)
+    return date
+
+
+def _rollup_deltas(facts: list[dict], sign: int = 1) -> dict[tuple, list]:
+    """Fold weighted log facts into {(exercise_id, grain, period_start): [volume, log_count]}."""
+    deltas: dict[tuple, list] = {}
+    for f in facts:
+        volume = f["sets"] * f["reps"] * f["weight_kg"]
+        for grain in ROLLUP_GRAINS:
+            key = (f["exercise_id"], grain, _period_start(f["date"], grain))
+            acc = deltas.setdefault(key, [0.0, 0])
+            acc[0] += sign * volume
+            acc[1] += sign
+    return deltas
+
+
+def _rollup_rows(user_id: int, deltas: dict[tuple, list]) -> list[dict]:
+    return [
+        {
+            "user_id":      user_id,
+            "exercise_id":  exercise_id,
+            "grain":        grain,
+            "period_start": period_start,
+            "volume_kg":    volume,
+            "log_count":    count,
+        }
+        for (exercise_id, grain, period_start), (volume, count) in deltas.items()
+    ]
+
+
+def _apply_volume_deltas(s, user_id: int, facts: list[dict], sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) the logs' volume in one upsert."""
+    if not facts:
+        return
+    stmt = _insert_for(s, VolumeRollup).values(_rollup_rows(user_id, _rollup_deltas(facts, sign)))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            VolumeRollup.user_id, VolumeRollup.exercise_id,
+            VolumeRollup.grain, VolumeRollup.period_start,
+        ],
+        set_={
+            "volume_kg": VolumeRollup.volume_kg + stmt.excluded.volume_kg,
+            "log_count": VolumeRollup.log_count + stmt.excluded.log_count,
+        },
+    )
+    s.execute(stmt)
+    if sign < 0:
+        s.query(VolumeRollup).filter(
+            VolumeRollup.user_id == user_id,
+            VolumeRollup.log_count <= 0,
+        ).delete()
+
+
+# user_stats is kept current the same way, with one extra hook for the
+# session rows themselves: _on_sessions_changed() runs after every session
+# insert or delete, once that write's log hooks have run. Stats are plain
+# dicts of UserStats columns so the hooks, the backfill and the consistency
+# check all fold sessions with the same two functions. user_day_counts moves
+# by per-day deltas in the same hook, like volume_rollups.
+
+_STATS_COLUMNS = [c.name for c in UserStats.__table__.columns if c.name != "user_id"]
+_ONE_DAY = datetime.timedelta(days=1)
+
+
+def _empty_stats() -> dict:
+    return {col: None if col == "last_session_date" else 0 for col in _STATS_COLUMNS}
+
+
+def _same_week(a: datetime.date, b: datetime.date) -> bool:
+    return _period_start(a, "week") == _period_start(b, "week")
+
+
+def _stats_add(stats: dict, date: datetime.date) -> bool:
+    """
+    Fold one new session into `stats`. Returns False when the session lands
+    on the day before the current streak, which may join it to an older
+    run of days — the row alone can't tell, so the caller rebuilds it.
+    """
+    stats["total_sessions"] += 1
+    last = stats["last_session_date"]
+    if last is None or date > last:
+        stats["streak_days"]   = stats["streak_days"] + 1 if last is not None and date - last == _ONE_DAY else 1
+        stats["week_sessions"] = stats["week_sessions"] + 1 if last is not None and _same_week(date, last) else 1
+        stats["last_session_date"] = date
+        return True
+    if _same_week(date, last):
+        stats["week_sessions"] += 1
+    run_start = last - datetime.timedelta(days=stats["streak_days"] - 1)
+    return date != run_start - _ONE_DAY
+
+
+def _stats_remove(stats: dict, date: datetime.date) -> bool:
+    """
+    Take one deleted session out of `stats`. Returns False when it fell
+    inside the current streak: unless another session shares its day, the
+    streak (and maybe the last session date) has to be recomputed.
+    """
+    stats["total_sessions"] -= 1
+    last = stats["last_session_date"]
+    if last is None:
+        return False
+    if _same_week(date, last):
+        stats["week_sessions"] -= 1
+    run_start = last - datetime.timedelta(days=stats["streak_days"] - 1)
+    return date < run_start
+
+
+def _on_sessions_changed(
+    s,
+    user_id: int,
+    added: list[tuple[datetime.date, str | None]] = (),
+    removed: list[tuple[datetime.date, str | None]] = (),
+) -> None:
+    """
+    Apply sessions added to or removed from the user's history, as
+    (date, ppl_day) pairs, to their user_stats row. The row is locked for
+    the read-modify-write. Counters move by deltas; the few changes that
+    touch the current streak in a way the row can't resolve, and a missing
+    row, rebuild it from the user's sessions (one index range scan).
+    """
+    row = s.execute(
+        select(UserStats.__table__).where(UserStats.user_id == user_id).with_for_update()
+    ).mappings().first()
+    if row is None:
+        _rebuild_user_stats(s, user_id)
+        return
+
+    stats = {col: row[col] for col in _STATS_COLUMNS}
+    resolved = True
+    for date, _ in added:
+        resolved &= _stats_add(stats, date)
+    for date, _ in removed:
+        if not _stats_remove(stats, date):
+            # the streak survives if another session is still logged that day
+            resolved &= s.query(exists().where(
+                WorkoutSession.user_id == user_id,
+                WorkoutSession.date    == date,
+            )).scalar()
+    if not resolved:
+        _rebuild_user_stats(s, user_id)
+        return
+    s.execute(update(UserStats).where(UserStats.user_id == user_id).values(**stats))
+    _apply_day_counts(s, user_id, added, removed)
+
+
+def _apply_day_counts(s, user_id: int, added, removed) -> None:
+    """Move user_day_counts by the sessions' ppl_days in one upsert."""
+    deltas: dict[str, int] = {}
+    for pairs, sign in ((added, 1), (removed, -1)):
+        for _, ppl_day in pairs:
+            if ppl_day is not None:
+                deltas[ppl_day] = deltas.get(ppl_day, 0) + sign
+    deltas = {day: n for day, n in deltas.items() if n}
+    if not deltas:
+        return
+    stmt = _insert_for(s, UserDayCount).values([
+        {"user_id": user_id, "ppl_day": day, "sessions": n} for day, n in deltas.items()
+    ])
+    s.execute(stmt.on_conflict_do_update(
+        index_elements=[UserDayCount.user_id, UserDayCount.ppl_day],
+        set_={"sessions": UserDayCount.sessions + stmt.excluded.sessions},
+    ))
+    if any(n < 0 for n in deltas.values()):
+        s.query(UserDayCount).filter(
+            UserDayCount.user_id == user_id,
+            UserDayCount.sessions <= 0,
+        ).delete()
+
+
+def _adjust_exercise_count(s, user_id: int, facts: list[dict], sign: int) -> None:
+    """
+    Count the exercises these logs were the first (sign=1) or the last
+    (sign=-1) of. Other logs are looked up excluding the facts' own ids,
+    so an edit that moves a log to another exercise nets out. Only an
+    existing row is updated; _on_sessions_changed() creates it.
+    """
+    exercise_ids = {f["exercise_id"] for f in facts if f["exercise_id"] is not None}
+    if not exercise_ids:
+        return
+    still_logged = {
+        row[0] for row in
+        s.query(WorkoutLog.exercise_id)
+         .filter(
+             WorkoutLog.user_id == user_id,
+             WorkoutLog.exercise_id.in_(exercise_ids),
+             WorkoutLog.id.notin_([f["id"] for f in facts]),
+         )
+         .distinct()
+    }
+    delta = sign * len(exercise_ids - still_logged)
+    if delta:
+        s.execute(
+            update(UserStats)
+            .where(UserStats.user_id == user_id)
+            .values(total_exercises=UserStats.total_exercises + delta)
+        )
+
+
+def _rebuild_user_stats(s, user_id: int) -> None:
+    backfill_user_stats(user_id, conn=s.connection())
+
+
+def backfill_personal_records(user_id: int | None = None, *, conn=None) -> int:
+    """
+    Rebuild personal_records from workout_logs for one user, or everyone
+    when user_id is None. Runs on `conn` if given (e.g. inside a migration),
+    otherwise in its own transaction. Returns the number of records written.
+    On a caller's connection the caller invalidates the read cache once it
+    commits, as the @_invalidates_user writes do.
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            written = backfill_personal_records(user_id, conn=conn)
+        _read_cache.bump(user_id)   # after commit, or a read in between caches the old rows
+        return written
+
+    ranked = (
+        select(
+            WorkoutLog.user_id,
+            WorkoutLog.exercise_id,
+            WorkoutLog.weight_kg,
+            WorkoutLog.reps,
+            WorkoutSession.date,
+            WorkoutLog.id.label("log_id"),
+            func.row_number().over(
+                partition_by=(WorkoutLog.user_id, WorkoutLog.exercise_id),
+                order_by=(desc(WorkoutLog.weight_kg), desc(WorkoutSession.date), desc(WorkoutLog.id)),
+            ).label("rank"),
+        )
+        .join(WorkoutSession, WorkoutLog.session_id == WorkoutSession.id)
+        .where(WorkoutLog.weight_kg.isnot(None))
+    )
+    clear = delete(PersonalRecord)
+    if user_id is not None:
+        ranked = ranked.where(WorkoutLog.user_id == user_id)
+        clear  = clear.where(PersonalRecord.user_id == user_id)
+    ranked = ranked.subquery()
+
+    cols = ["user_id", "exercise_id", "weight_kg", "reps", "date", "log_id"]
+    conn.execute(clear)
+    result = conn.execute(
+        insert(PersonalRecord).from_select(
+            cols,
+            select(*(ranked.c[c] for c in cols)).where(ranked.c.rank == 1),
+        )
+    )
+    return result.rowcount
+
+
+def backfill_volume_rollups(user_id: int | None = None, *, conn=None) -> int:
+    """
+    Rebuild volume_rollups from workout_logs for one user, or everyone when
+    user_id is None. Daily sums are streamed in user order and folded into
+    every grain one user at a time, so memory stays bounded by a single
+    user's history. Returns the number of rollup rows written.
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            written = backfill_volume_rollups(user_id, conn=conn)
+        _read_cache.bump(user_id)
+        return written
+
+    daily = (
+        select(
+            WorkoutLog.user_id,
+            WorkoutLog.exercise_id,
+            WorkoutSession.date,
+            WorkoutLog.sets,
+            WorkoutLog.reps,
+            WorkoutLog.weight_kg,
+        )
+        .join(WorkoutSession, WorkoutLog.session_id == WorkoutSession.id)
+        .where(WorkoutLog.weight_kg.isnot(None))
+        .order_by(WorkoutLog.user_id)
+    )
+    clear = delete(VolumeRollup)
+    if user_id is not None:
+        daily = daily.where(WorkoutLog.user_id == user_id)
+        clear = clear.where(VolumeRollup.user_id == user_id)
+    conn.execute(clear)
+
+    written = 0
+    def _flush(uid: int, facts: list[dict]) -> None:
+        nonlocal written
+        rows = _rollup_rows(uid, _rollup_deltas(facts))
+        conn.execute(insert(VolumeRollup), rows)
+        written += len(rows)
+
+    current_user, facts = None, []
+    for row in conn.execute(daily.execution_options(yield_per=5000)):
+        if row.user_id != current_user and facts:
+            _flush(current_user, facts)
+            facts = []
+        current_user = row.user_id
+        facts.append(row._asdict())
+    if facts:
+        _flush(current_user, facts)
+    return written
+
+
+def _computed_user_stats(conn, user_id: int | None = None) -> Iterator[tuple[dict, dict[str, int]]]:
+    """
+    Fresh (user_stats row, {ppl_day: sessions}) pairs for one user or
+    everyone, folded from the raw sessions in date order and streamed one
+    user at a time. Users without sessions get nothing.
+    """
+    exercises = (
+        select(WorkoutLog.user_id, func.count(WorkoutLog.exercise_id.distinct()))
+        .group_by(WorkoutLog.user_id)
+    )
+    sessions = (
+        select(WorkoutSession.user_id, WorkoutSession.date, WorkoutSession.ppl_day)
+        .order_by(WorkoutSession.user_id, WorkoutSession.date)
+    )
+    if user_id is not None:
+        exercises = exercises.where(WorkoutLog.user_id == user_id)
+        sessions  = sessions.where(WorkoutSession.user_id == user_id)
+    exercise_counts = dict(conn.execute(exercises).all())
+
+    stats, days = None, {}
+    for row in conn.execute(sessions.execution_options(yield_per=5000)):
+        if stats is None or row.user_id != stats["user_id"]:
+            if stats is not None:
+                yield stats, days
+            stats = {
+                "user_id": row.user_id,
+                **_empty_stats(),
+                "total_exercises": exercise_counts.get(row.user_id, 0),
+            }
+            days = {}
+        _stats_add(stats, row.date)
+        if row.ppl_day is not None:
+            days[row.ppl_day] = days.get(row.ppl_day, 0) + 1
+    if stats is not None:
+        yield stats, days
+
+
+def backfill_user_stats(user_id: int | None = None, *, conn=None) -> int:
+    """
+    Rebuild user_stats and user_day_counts from workout_sessions and
+    workout_logs for one user, or everyone when user_id is None. Returns
+    the number of user_stats rows written.
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            written = backfill_user_stats(user_id, conn=conn)
+        _read_cache.bump(user_id)
+        return written
+
+    for model in (UserStats, UserDayCount):
+        clear = delete(model)
+        if user_id is not None:
+            clear = clear.where(model.user_id == user_id)
+        conn.execute(clear)
+
+    written, rows, day_rows = 0, [], []
+    def _flush() -> None:
+        nonlocal written
+        if rows:
+            conn.execute(insert(UserStats), rows)
+            written += len(rows)
+        if day_rows:
+            conn.execute(insert(UserDayCount), day_rows)
+        rows.clear()
+        day_rows.clear()
+
+    for stats, days in _computed_user_stats(conn, user_id):
+        rows.append(stats)
+        day_rows += [{"user_id": stats["user_id"], "ppl_day": d, "sessions": n} for d, n in days.items()]
+        if len(rows) >= 5000:
+            _flush()
+    _flush()
+    return written
+
+
+@dataclass
+class StatsDrift:
+    user_id: int
+    fields:  dict[str, tuple]   # column → (stored, expected); stored is None for a missing row,
+                                # "day_counts" compares the {ppl_day: sessions} maps
+    missing: bool = False       # no user_stats row at all
+
+
+def check_user_stats(user_id: int | None = None, repair: bool = False) -> list[StatsDrift]:
+    """
+    Compare every user_stats row (or one user's) with a fresh fold of the
+    raw sessions and logs, and report the rows that drifted — a write that
+    bypassed the hooks, or a bug in them. The comparison reads one snapshot
+    (REPEATABLE READ on Postgres) so concurrent writes can't show up as
+    drift. With repair=True each drifted user's row is rebuilt in its own
+    short transaction afterwards.
+    """
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        engine = engine.execution_options(isolation_level="REPEATABLE READ")
+
+    stored_query = select(UserStats.__table__)
+    days_query   = select(UserDayCount.user_id, UserDayCount.ppl_day, UserDayCount.sessions)
+    if user_id is not None:
+        stored_query = stored_query.where(UserStats.user_id == user_id)
+        days_query   = days_query.where(UserDayCount.user_id == user_id)
+
+    drift: list[StatsDrift] = []
+    with engine.begin() as conn:
+        stored = {row["user_id"]: row for row in conn.execute(stored_query).mappings()}
+        stored_days: dict[int, dict[str, int]] = {}
+        for uid, day, n in conn.execute(days_query):
+            stored_days.setdefault(uid, {})[day] = n
+        for expected, expected_days in _computed_user_stats(conn, user_id):
+            row  = stored.pop(expected["user_id"], None)
+            days = stored_days.pop(expected["user_id"], {})
+            fields = {
+                col: (row[col] if row is not None else None, expected[col])
+                for col in _STATS_COLUMNS
+                if row is None or row[col] != expected[col]
+            }
+            if days != expected_days:
+                fields["day_counts"] = (days, expected_days)
+            if fields:
+                drift.append(StatsDrift(expected["user_id"], fields, missing=row is None))
+    # rows left over belong to users who no longer have any sessions
+    empty = _empty_stats()
+    for uid in stored.keys() | stored_days.keys():
+        row = stored.get(uid)
+        fields = {
+            col: (row[col], empty[col])
+            for col in _STATS_COLUMNS
+            if row is not None and row[col] != empty[col]
+        }
+        if uid in stored_days:
+            fields["day_counts"] = (stored_days[uid], {})
+        if fields:
+            drift.append(StatsDrift(uid, fields))
+
+    if repair:
+        for d in drift:
+            backfill_user_stats(d.user_id)
+    return drift
+
+# ─────────────────────────── read models ─────────────────────────────
+#
+# Hot reads return these instead of ORM instances: plain immutable records
+# built straight from Core rows, with no identity map, instrumentation or
+# lazy-load state riding along into the read cache and st.session_state.
+# Each has a module-level select() over exactly its fields, built once;
+# parameters are bound per call, so every call hits the compiled cache.
+
+@dataclass(frozen=True, slots=True)
+class UserRow:
+    """The logged-in user as the app holds it — no password hash."""
+    id:       int
+    username: str
+    email:    str
+
+
+@dataclass(frozen=True, slots=True)
+class WorkoutRow:
+    id:           int
+    exercise:     str
+    exercise_id:  int | None
+    sets:         int
+    reps:         int
+    weight:       float | None
+    weight_unit:  str | None
+    plan_day:     str | None
+    sort_order:   int
+    workout_date: datetime.date | None
+
+
+@dataclass(frozen=True, slots=True)
+class SessionRow:
+    id:         int
+    date:       datetime.date
+    ppl_day:    str | None
+    notes:      str | None
+    created_at: datetime.datetime | None
+
+
+@dataclass(frozen=True, slots=True)
+class LogRow:
+    id:          int
+    session_id:  int
+    exercise:    str
+    exercise_id: int | None
+    sets:        int
+    reps:        int
+    weight:      float | None
+    weight_unit: str | None
+    weight_kg:   float | None
+
+
+def _columns(model, row_type) -> list:
+    return [getattr(model, name) for name in row_type.__dataclass_fields__]
+
+
+_USER_COLUMNS    = _columns(User, UserRow)
+_WORKOUT_COLUMNS = _columns(Workout, WorkoutRow)
+_SESSION_COLUMNS = _columns(WorkoutSession, SessionRow)
+_LOG_COLUMNS     = _columns(WorkoutLog, LogRow)
+
+_SELECT_USER_BY_ID = select(*_USER_COLUMNS).where(User.id == bindparam("user_id"))
+_SELECT_USER_LOGIN = (
+    select(*_USER_COLUMNS, User.hashed_password).where(User.username == bindparam("username"))
+)
+_SELECT_WORKOUTS = (
+    select(*_WORKOUT_COLUMNS)
+    .where(Workout.user_id == bindparam("user_id"))
+    .order_by(Workout.id)
+)
+_SELECT_PLAN = (
+    select(*_WORKOUT_COLUMNS)
+    .where(Workout.user_id == bindparam("user_id"))
+    .order_by(Workout.plan_day, Workout.sort_order)
+)
+_SELECT_RECENT_SESSIONS = (
+    select(*_SESSION_COLUMNS)
+    .where(WorkoutSession.user_id == bindparam("user_id"))
+    .order_by(desc(WorkoutSession.date), desc(WorkoutSession.created_at))
+    .limit(bindparam("limit"))
+)
+_SELECT_SESSION_LOGS = (
+    select(*_LOG_COLUMNS)
+    .where(WorkoutLog.session_id.in_(bindparam("session_ids", expanding=True)))
+    .order_by(WorkoutLog.session_id, WorkoutLog.id)
+)
+_SELECT_FAVOURITE_DAY = (
+    select(UserDayCount.ppl_day)
+    .where(UserDayCount.user_id == UserStats.user_id)
+    .order_by(desc(UserDayCount.sessions), UserDayCount.ppl_day)
+    .limit(1)
+    .scalar_subquery()
+)
+_SELECT_USER_STATS = (
+    select(UserStats.__table__, _SELECT_FAVOURITE_DAY.label("favourite_day"))
+    .where(UserStats.user_id == bindparam("user_id"))
+)
+
+
+def _rows(s, stmt, row_type, **params) -> list:
+    return [row_type(*row) for row in s.connection().execute(stmt, params)]
+
+
+def _with_logs(s, sessions: list[SessionRow]) -> list[tuple[SessionRow, list[LogRow]]]:
+    """Pair each session with its logs, fetched in one statement."""
+    if not sessions:
+        return []
+    by_session: dict[int, list[LogRow]] = {sess.id: [] for sess in sessions}
+    for log in _rows(s, _SELECT_SESSION_LOGS, LogRow, session_ids=list(by_session)):
+        by_session[log.session_id].append(log)
+    return [(sess, by_session[sess.id]) for sess in sessions]
+
 # ─────────────────────────── user CRUD ───────────────────────────────
 
-def create_user(username: str, email: str, password: str) -> User | None:
-    """Create a new user. Returns the User, or None if username/email is taken."""
+@instrumented
+def create_user(username: str, email: str, password: str) -> UserRow | None:
+    """Create a new user. Returns it, or None if username/email is taken."""
+    # Hash before opening the session so no connection is held while the
+    # job waits in the hashing pool
+    hashed = hash_password(password)
     with _session() as s:
         already_exists = s.query(
             s.query(User)
@@ -205,57 +1502,71 @@ def create_user(username: str, email: str, password: str) -> User | None:
         user = User(
             username=username,
             email=email,
-            hashed_password=hash_password(password),
+            hashed_password=hashed,
         )
         s.add(user)
         s.flush()      # assign user.id before the session closes
-        s.refresh(user)
-        return user
+        return UserRow(user.id, user.username, user.email)
 
 
-def authenticate_user(username: str, password: str) -> User | None:
-    """Return the User if credentials are valid, otherwise None."""
+@instrumented
+def authenticate_user(username: str, password: str) -> UserRow | None:
+    """
+    Return the user if credentials are valid, otherwise None.
+    A hash made with outdated argon2 parameters is transparently replaced.
+    """
     with _session() as s:
-        user = s.query(User).filter_by(username=username).first()
-        if user and verify_password(password, user.hashed_password):
-            return user
+        row = s.connection().execute(_SELECT_USER_LOGIN, {"username": username}).first()
+    if not row:
+        return None
+
+    *fields, hashed = row
+    valid, new_hash = verify_and_update(password, hashed)
+    if not valid:
         return None
+    user = UserRow(*fields)
+    if new_hash:
+        with _session() as s:
+            s.query(User).filter_by(id=user.id).update({"hashed_password": new_hash})
+    return user
 
 
-def get_user_by_id(user_id: int) -> User | None:
-    """Return a User by primary key, or None if not found. Used for cookie re-hydration."""
+@instrumented
+def get_user_by_id(user_id: int) -> UserRow | None:
+    """Return a user by primary key, or None if not found. Used for cookie re-hydration."""
     with _session() as s:
-        return s.query(User).filter_by(id=user_id).first()
+        rows = _rows(s, _SELECT_USER_BY_ID, UserRow, user_id=user_id)
+        return rows[0] if rows else None
 
 # ─────────────────────────── workout template CRUD ───────────────────
 
+@_invalidates_user
 def insert_workout(user_id: int, data: dict) -> Workout:
     with _session() as s:
-        w = Workout(user_id=user_id, **data)
+        data = _with_exercise_ids(s, user_id, [data])[0]
+        w    = Workout(user_id=user_id, **data)
         s.add(w)
         return w
 
 
-def get_all_workouts(user_id: int) -> list[Workout]:
+@_cached_read
+def get_all_workouts(user_id: int) -> list[WorkoutRow]:
     with _session() as s:
-        return (
-            s.query(Workout)
-            .filter_by(user_id=user_id)
-            .order_by(Workout.id)
-            .all()
-        )
+        return _rows(s, _SELECT_WORKOUTS, WorkoutRow, user_id=user_id)
 
 
+@_invalidates_user
 def update_workout(user_id: int, workout_id: int, data: dict) -> Workout | None:
     with _session() as s:
         w = s.query(Workout).filter_by(id=workout_id, user_id=user_id).first()
         if not w:
             return None
-        for key, val in data.items():
+        for key, val in _with_exercise_ids(s, user_id, [data])[0].items():
             setattr(w, key, val)
         return w
 
 
+@_invalidates_user
 def delete_workout(user_id: int, workout_id: int) -> bool:
     with _session() as s:
         w = s.query(Workout).filter_by(id=workout_id, user_id=user_id).first()
@@ -265,17 +1576,23 @@ def delete_workout(user_id: int, workout_id: int) -> bool:
         return True
 
 
+@instrumented
 def workout_exists(user_id: int, exercise: str) -> bool:
+    """Whether the user's templates include `exercise` (matched case-insensitively)."""
     with _session() as s:
+        exercise_id = _lookup_exercise_ids(s, user_id, [exercise]).get(exercise.lower())
+        if exercise_id is None:
+            return False
         return s.query(
             exists().where(
-                Workout.user_id == user_id,
-                Workout.exercise == exercise,
+                Workout.user_id     == user_id,
+                Workout.exercise_id == exercise_id,
             )
         ).scalar()
 
 # ─────────────────────────── workout session CRUD ────────────────────
 
+@_invalidates_user
 def start_session(
     user_id: int,
     ppl_day: str | None = None,
@@ -293,53 +1610,200 @@ def start_session(
         s.add(ws)
         s.flush()      # assign ws.id before the session closes
         s.refresh(ws)
+        _on_sessions_changed(s, user_id, added=[(ws.date, ws.ppl_day)])
         return ws
 
 
-def get_sessions(user_id: int, limit: int = 30) -> list[WorkoutSession]:
+@_cached_read
+def get_sessions(user_id: int, limit: int = 30) -> list[SessionRow]:
     """Return the most recent `limit` sessions, newest first."""
     with _session() as s:
-        return (
-            s.query(WorkoutSession)
-            .filter_by(user_id=user_id)
-            .order_by(desc(WorkoutSession.date), desc(WorkoutSession.created_at))
-            .limit(limit)
-            .all()
+        return _rows(s, _SELECT_RECENT_SESSIONS, SessionRow, user_id=user_id, limit=limit)
+
+
+@dataclass(frozen=True)
+class SessionCursor:
+    """Where a history page ended: the (date, created_at, id) of its last session."""
+    date:       datetime.date
+    created_at: datetime.datetime
+    id:         int
+
+
+@dataclass
+class HistoryPage:
+    sessions:    list[tuple[SessionRow, list[LogRow]]]
+    next_cursor: SessionCursor | None    # None on the last page
+
+
+@_cached_read
+def get_session_history(
+    user_id: int,
+    cursor: SessionCursor | None = None,
+    limit: int = 20,
+    ppl_day: str | None = None,
+    date_from: datetime.date | None = None,
+    date_to: datetime.date | None = None,
+    exercise: str | None = None,
+) -> HistoryPage:
+    """
+    One page of the user's sessions, newest first, each with its logs.
+    Pass the previous page's next_cursor to continue. Paging is keyset on
+    (date, created_at, id) rather than OFFSET, so the cursor is an index
+    seek and a page deep in a multi-year history costs the same as the
+    first. Optional filters: ppl_day, an inclusive date range, and sessions
+    containing `exercise` (matched case-insensitively). Logs for the page
+    are fetched in one more statement — two per page.
+    """
+    stmt = select(*_SESSION_COLUMNS).where(WorkoutSession.user_id == user_id)
+    if ppl_day is not None:
+        stmt = stmt.where(WorkoutSession.ppl_day == ppl_day)
+    if date_from is not None:
+        stmt = stmt.where(WorkoutSession.date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(WorkoutSession.date <= date_to)
+    if exercise is not None:
+        stmt = stmt.where(exists().where(
+            WorkoutLog.session_id  == WorkoutSession.id,
+            WorkoutLog.exercise_id == ExerciseDefinition.id,
+            func.lower(ExerciseDefinition.name) == exercise.lower(),
+        ))
+    if cursor is not None:
+        stmt = stmt.where(
+            tuple_(WorkoutSession.date, WorkoutSession.created_at, WorkoutSession.id)
+            < tuple_(cursor.date, cursor.created_at, cursor.id)
         )
+    stmt = (
+        stmt.order_by(desc(WorkoutSession.date), desc(WorkoutSession.created_at), desc(WorkoutSession.id))
+        .limit(limit + 1)      # one extra row tells us whether there is a next page
+    )
+    with _session() as s:
+        rows = _rows(s, stmt, SessionRow)
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = SessionCursor(last.date, last.created_at, last.id)
+        return HistoryPage(sessions=_with_logs(s, page), next_cursor=next_cursor)
 
 
+@instrumented
 def get_session_by_id(user_id: int, session_id: int) -> WorkoutSession | None:
     with _session() as s:
         return s.query(WorkoutSession).filter_by(id=session_id, user_id=user_id).first()
 
 
+@_invalidates_user
 def delete_session(user_id: int, session_id: int) -> bool:
     """Delete a session and cascade-delete all its logs."""
     with _session() as s:
         ws = s.query(WorkoutSession).filter_by(id=session_id, user_id=user_id).first()
         if not ws:
             return False
+        removed = [_log_facts(log, ws.date) for log in ws.logs]
         s.delete(ws)
+        s.flush()
+        _on_logs_removed(s, user_id, removed)
+        _on_sessions_changed(s, user_id, removed=[(ws.date, ws.ppl_day)])
         return True
 
 # ─────────────────────────── workout log CRUD ────────────────────────
 
+def _owned_session_date(s, user_id: int, session_id: int) -> datetime.date:
+    """The date of one of the user's sessions; ValueError if it isn't theirs or doesn't exist."""
+    date = s.query(WorkoutSession.date).filter_by(id=session_id, user_id=user_id).scalar()
+    if date is None:
+        raise ValueError(f"Session {session_id} does not exist or belongs to another user")
+    return date
+
+
+@_invalidates_user
 def log_exercise(session_id: int, user_id: int, data: dict) -> WorkoutLog:
-    """Append one exercise entry to an existing session."""
+    """Append one exercise entry to an existing session of the user's."""
     with _session() as s:
+        date  = _owned_session_date(s, user_id, session_id)
+        data  = _prepare_log_rows(s, user_id, [data])[0]
         entry = WorkoutLog(session_id=session_id, user_id=user_id, **data)
         s.add(entry)
+        s.flush()
+        _on_logs_added(s, user_id, [_log_facts(entry, date)])
         return entry
 
 
+@_invalidates_user
 def log_exercises_bulk(session_id: int, user_id: int, entries: list[dict]) -> list[WorkoutLog]:
-    """Insert multiple log entries for a session in one transaction."""
+    """Insert multiple log entries for a session of the user's in one transaction."""
     with _session() as s:
-        logs = [WorkoutLog(session_id=session_id, user_id=user_id, **d) for d in entries]
+        date = _owned_session_date(s, user_id, session_id)
+        logs = [
+            WorkoutLog(session_id=session_id, user_id=user_id, **d)
+            for d in _prepare_log_rows(s, user_id, entries)
+        ]
         s.add_all(logs)
+        s.flush()
+        _on_logs_added(s, user_id, [_log_facts(log, date) for log in logs])
         return logs
 
 
+@_invalidates_user
+def log_full_session(
+    user_id: int,
+    meta: dict,
+    entries: list[dict],
+    idempotency_key: str | None = None,
+) -> SessionRow:
+    """
+    Create a session and all of its log entries in one transaction: one
+    INSERT ... RETURNING for the session and one multi-row INSERT for the
+    logs, however many exercises there are.
+    meta holds the start_session fields (date, ppl_day, notes).
+    With an idempotency_key, repeating the call (a Streamlit double-submit,
+    or a rerun that interrupted the first save) returns the session the
+    first call created and writes nothing.
+
+    The two INSERTs are not folded into one WITH ... INSERT statement: the
+    personal-record and rollup hooks need the new log ids, and SQLite (tests,
+    local runs) has no data-modifying CTEs. That second statement is the
+    only extra round trip, and it shares the transaction.
+    """
+    with _session() as s:
+        values = {
+            "user_id":         user_id,
+            "date":            meta.get("date") or datetime.date.today(),
+            "ppl_day":         meta.get("ppl_day"),
+            "notes":           meta.get("notes"),
+            "idempotency_key": idempotency_key,
+        }
+        stmt = _insert_for(s, WorkoutSession).values(**values)
+        if idempotency_key is not None:
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[WorkoutSession.user_id, WorkoutSession.idempotency_key],
+            )
+        created = s.execute(stmt.returning(*_SESSION_COLUMNS)).first()
+        if created is None:
+            # Conflict — this key was already logged
+            return _rows(
+                s,
+                select(*_SESSION_COLUMNS).filter_by(user_id=user_id, idempotency_key=idempotency_key),
+                SessionRow,
+            )[0]
+        session = SessionRow(*created)
+
+        if entries:
+            entries = _prepare_log_rows(s, user_id, entries)
+            rows = [{"session_id": session.id, "user_id": user_id, **e} for e in entries]
+            log_ids = s.execute(
+                insert(WorkoutLog).returning(WorkoutLog.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+            _on_logs_added(s, user_id, [
+                {"id": log_id, "date": session.date, **e}
+                for log_id, e in zip(log_ids, entries)
+            ])
+        _on_sessions_changed(s, user_id, added=[(session.date, session.ppl_day)])
+        return session
+
+
+@instrumented
 def get_logs_for_session(session_id: int, user_id: int) -> list[WorkoutLog]:
     with _session() as s:
         return (
@@ -350,32 +1814,45 @@ def get_logs_for_session(session_id: int, user_id: int) -> list[WorkoutLog]:
         )
 
 
+@_invalidates_user
 def update_log(user_id: int, log_id: int, data: dict) -> WorkoutLog | None:
     with _session() as s:
         entry = s.query(WorkoutLog).filter_by(id=log_id, user_id=user_id).first()
         if not entry:
             return None
-        for key, val in data.items():
+        date   = entry.session.date
+        before = _log_facts(entry, date)
+        for key, val in _with_exercise_ids(s, user_id, [data])[0].items():
             setattr(entry, key, val)
+        entry.weight_kg = to_kg(entry.weight, entry.weight_unit)
+        s.flush()
+        _on_logs_removed(s, user_id, [before])
+        _on_logs_added(s, user_id, [_log_facts(entry, date)])
         return entry
 
 
+@_invalidates_user
 def delete_log(user_id: int, log_id: int) -> bool:
     with _session() as s:
         entry = s.query(WorkoutLog).filter_by(id=log_id, user_id=user_id).first()
         if not entry:
             return False
+        removed = _log_facts(entry, entry.session.date)
         s.delete(entry)
+        s.flush()
+        _on_logs_removed(s, user_id, [removed])
         return True
 
 
 # ─────────────────────────── user profile CRUD ───────────────────────
 
+@_cached_read
 def get_profile(user_id: int) -> "UserProfile | None":
     with _session() as s:
         return s.query(UserProfile).filter_by(user_id=user_id).first()
 
 
+@_invalidates_user
 def save_profile(user_id: int, data: dict) -> "UserProfile":
     """Upsert the user's profile / onboarding answers."""
     with _session() as s:
@@ -389,6 +1866,13 @@ def save_profile(user_id: int, data: dict) -> "UserProfile":
         return profile
 
 
+def get_preferred_unit(user_id: int) -> str:
+    """The unit the user wants weights shown in ("lbs" | "kg")."""
+    profile = get_profile(user_id)
+    return (profile.weight_unit if profile else None) or DEFAULT_UNIT
+
+
+@_cached_read
 def has_active_plan(user_id: int) -> bool:
     with _session() as s:
         profile = s.query(UserProfile).filter_by(user_id=user_id).first()
@@ -396,19 +1880,86 @@ def has_active_plan(user_id: int) -> bool:
 
 # ─────────────────────────── plan CRUD ───────────────────────────────
 
+_PLAN_FIELDS = (
+    "exercise", "exercise_id", "sets", "reps", "weight", "weight_unit", "plan_day", "sort_order",
+)
+
+
+@dataclass
+class PlanDiff:
+    inserts: list[dict]    # new rows, plan fields only
+    updates: list[dict]    # {"id": ..., every plan field} for rows that changed
+    deletes: list[int]     # ids of rows no longer in the plan
+
+
+def _diff_plan(existing: list[dict], exercises: list[dict]) -> PlanDiff:
+    """
+    Match the saved plan rows (dicts with id plus the plan fields) against
+    the new plan. A row is matched on (plan_day, sort_order, exercise)
+    first, then on (plan_day, exercise) so a reordered exercise keeps its
+    id. Matched rows are updated only if a field changed; the rest of the
+    old rows are deleted and the rest of the new ones inserted.
+    """
+    wanted = [
+        {f: ex.get(f, 0 if f == "sort_order" else None) for f in _PLAN_FIELDS}
+        for ex in exercises
+    ]
+    unmatched = {row["id"]: row for row in existing}
+    exact: dict[tuple, list[int]] = {}
+    loose: dict[tuple, list[int]] = {}
+    for row in sorted(existing, key=lambda r: (r["sort_order"], r["id"])):
+        exact.setdefault((row["plan_day"], row["sort_order"], row["exercise"]), []).append(row["id"])
+        loose.setdefault((row["plan_day"], row["exercise"]), []).append(row["id"])
+
+    def take(candidates: list[int]) -> dict | None:
+        while candidates:
+            row = unmatched.pop(candidates.pop(0), None)
+            if row is not None:
+                return row
+        return None
+
+    matched: list[dict | None] = [
+        take(exact.get((new["plan_day"], new["sort_order"], new["exercise"]), []))
+        for new in wanted
+    ]
+    for i, new in enumerate(wanted):
+        if matched[i] is None:
+            matched[i] = take(loose.get((new["plan_day"], new["exercise"]), []))
+
+    diff = PlanDiff(inserts=[], updates=[], deletes=sorted(unmatched))
+    for new, old in zip(wanted, matched):
+        if old is None:
+            diff.inserts.append(new)
+        elif any(old[f] != new[f] for f in _PLAN_FIELDS):
+            diff.updates.append({"id": old["id"], **new})
+    return diff
+
+
+@_invalidates_user
 def save_plan(user_id: int, exercises: list[dict]) -> None:
     """
     Replace the user's entire plan with a new set of exercises.
     Each dict must have: exercise, sets, reps, plan_day, sort_order,
     and optionally weight / weight_unit.
+    Only the difference is written — one bulk DELETE, UPDATE and INSERT at
+    most — so unchanged rows are untouched and keep their ids.
     Marks the user's profile has_plan = True.
     """
     with _session() as s:
-        # Delete all existing template exercises for this user
-        s.query(Workout).filter_by(user_id=user_id).delete()
-        # Insert new plan
-        for ex in exercises:
-            s.add(Workout(user_id=user_id, **ex))
+        existing = [
+            row._asdict()
+            for row in s.execute(
+                select(Workout.id, *(getattr(Workout, f) for f in _PLAN_FIELDS))
+                .where(Workout.user_id == user_id)
+            )
+        ]
+        diff = _diff_plan(existing, _with_exercise_ids(s, user_id, exercises))
+        if diff.deletes:
+            s.execute(delete(Workout).where(Workout.user_id == user_id, Workout.id.in_(diff.deletes)))
+        if diff.updates:
+            s.execute(update(Workout), diff.updates)
+        if diff.inserts:
+            s.execute(insert(Workout), [{"user_id": user_id, **row} for row in diff.inserts])
         # Mark profile as having a plan
         profile = s.query(UserProfile).filter_by(user_id=user_id).first()
         if profile:
@@ -417,25 +1968,20 @@ def save_plan(user_id: int, exercises: list[dict]) -> None:
             s.add(UserProfile(user_id=user_id, has_plan=True))
 
 
-def get_plan_by_day(user_id: int) -> dict[str, list]:
+@_cached_read
+def get_plan_by_day(user_id: int) -> dict[str, list[WorkoutRow]]:
     """
     Return the user's plan grouped by plan_day, ordered by sort_order.
     Returns an empty dict if no plan exists.
     """
     with _session() as s:
-        rows = (
-            s.query(Workout)
-            .filter_by(user_id=user_id)
-            .order_by(Workout.plan_day, Workout.sort_order)
-            .all()
-        )
-        grouped: dict[str, list] = {}
-        for w in rows:
-            day = w.plan_day or "Unassigned"
-            grouped.setdefault(day, []).append(w)
+        grouped: dict[str, list[WorkoutRow]] = {}
+        for w in _rows(s, _SELECT_PLAN, WorkoutRow, user_id=user_id):
+            grouped.setdefault(w.plan_day or "Unassigned", []).append(w)
         return grouped
 
 
+@_cached_read
 def get_next_plan_day(user_id: int) -> str | None:
     """
     Infer the next PPL day based on the last logged session.
@@ -474,17 +2020,19 @@ def get_next_plan_day(user_id: int) -> str | None:
 
 @dataclass
 class ExercisePR:
-    exercise:    str
-    weight:      float
-    weight_unit: str
-    reps:        int
-    date:        datetime.date
+    exercise:  str
+    weight_kg: float
+    reps:      int
+    date:      datetime.date
+
+    def weight_in(self, unit: str) -> float:
+        return from_kg(self.weight_kg, unit)
 
 
 @dataclass
 class VolumePoint:
-    date:   datetime.date
-    volume: float        # sets × reps × weight for that day
+    date:      datetime.date
+    volume_kg: float     # sets × reps × kg for the period starting on `date`
 
 
 @dataclass
@@ -496,187 +2044,430 @@ class DashboardStats:
     favourite_day:      str | None # most frequently logged ppl_day
 
 
+@_cached_read
 def get_personal_records(user_id: int) -> list[ExercisePR]:
     """
-    Return the heaviest logged weight per exercise.
+    Return the heaviest logged weight per exercise, read from the
+    incrementally maintained personal_records table. Weights are compared
+    and returned in kg; convert with ExercisePR.weight_in() for display.
     When two logs tie on weight, the most recent one wins.
-    Only includes logs where weight is not null.
     """
     with _session() as s:
-        # Max weight per exercise
-        subq = (
-            s.query(
-                WorkoutLog.exercise,
-                func.max(WorkoutLog.weight).label("max_weight"),
-            )
-            .filter(WorkoutLog.user_id == user_id, WorkoutLog.weight.isnot(None))
-            .group_by(WorkoutLog.exercise)
-            .subquery()
+        rows = (
+            s.query(PersonalRecord, ExerciseDefinition.name)
+            .join(ExerciseDefinition, PersonalRecord.exercise_id == ExerciseDefinition.id)
+            .filter(PersonalRecord.user_id == user_id)
+            .order_by(ExerciseDefinition.name)
+            .all()
         )
+        return [
+            ExercisePR(
+                exercise=name,
+                weight_kg=r.weight_kg,
+                reps=r.reps,
+                date=r.date,
+            )
+            for r, name in rows
+        ]
 
+
+@_cached_read
+def get_volume_over_time(
+    user_id: int,
+    exercise: str,
+    days: int = 90,
+    grain: str = "day",
+) -> list[VolumePoint]:
+    """
+    Total volume in kg (sets × reps × kg) for one exercise per day, week or
+    month over the last `days` days, read from volume_rollups. The
+    exercise is matched by name, case-insensitively. Rows with null weight
+    are excluded. A multi-year range at week/month grain is a few hundred
+    precomputed rows.
+    """
+    since = _period_start(datetime.date.today() - datetime.timedelta(days=days), grain)
+    with _session() as s:
         rows = (
-            s.query(WorkoutLog, WorkoutSession.date)
-            .join(subq, (WorkoutLog.exercise == subq.c.exercise) &
-                        (WorkoutLog.weight   == subq.c.max_weight))
-            .join(WorkoutSession, WorkoutLog.session_id == WorkoutSession.id)
-            .filter(WorkoutLog.user_id == user_id)
-            .order_by(WorkoutLog.exercise, desc(WorkoutSession.date))
+            s.query(VolumeRollup.period_start, func.sum(VolumeRollup.volume_kg).label("volume_kg"))
+            .join(ExerciseDefinition, VolumeRollup.exercise_id == ExerciseDefinition.id)
+            .filter(
+                func.lower(ExerciseDefinition.name) == exercise.lower(),
+                VolumeRollup.user_id      == user_id,
+                VolumeRollup.grain        == grain,
+                VolumeRollup.period_start >= since,
+            )
+            # a custom exercise later added to the library has rows under both ids
+            .group_by(VolumeRollup.period_start)
+            .order_by(VolumeRollup.period_start)
             .all()
         )
-
-        # De-duplicate (take first/most-recent per exercise)
-        seen: set[str] = set()
-        prs: list[ExercisePR] = []
-        for log, date in rows:
-            if log.exercise not in seen:
-                seen.add(log.exercise)
-                prs.append(ExercisePR(
-                    exercise=log.exercise,
-                    weight=log.weight,
-                    weight_unit=log.weight_unit or "lbs",
-                    reps=log.reps,
-                    date=date,
-                ))
-        return prs
+        return [VolumePoint(date=r.period_start, volume_kg=float(r.volume_kg)) for r in rows]
 
 
-def get_volume_over_time(user_id: int, exercise: str, days: int = 90) -> list[VolumePoint]:
+@_cached_read
+def get_category_volume_over_time(
+    user_id: int,
+    days: int = 90,
+    grain: str = "week",
+) -> dict[str, list[VolumePoint]]:
     """
-    Daily total volume (sets × reps × weight) for one exercise over the
-    last `days` days. Rows with null weight are excluded.
+    Volume per exercise category ("push", "pull", "legs", "core", "other")
+    per period, in one query over volume_rollups joined to exercises.
     """
-    since = datetime.date.today() - datetime.timedelta(days=days)
+    since = _period_start(datetime.date.today() - datetime.timedelta(days=days), grain)
     with _session() as s:
         rows = (
             s.query(
-                WorkoutSession.date,
-                func.sum(WorkoutLog.sets * WorkoutLog.reps * WorkoutLog.weight).label("volume"),
+                ExerciseDefinition.category,
+                VolumeRollup.period_start,
+                func.sum(VolumeRollup.volume_kg).label("volume_kg"),
             )
-            .join(WorkoutLog, WorkoutSession.id == WorkoutLog.session_id)
+            .join(ExerciseDefinition, VolumeRollup.exercise_id == ExerciseDefinition.id)
             .filter(
-                WorkoutLog.user_id  == user_id,
-                WorkoutLog.exercise == exercise,
-                WorkoutLog.weight.isnot(None),
-                WorkoutSession.date >= since,
+                VolumeRollup.user_id      == user_id,
+                VolumeRollup.grain        == grain,
+                VolumeRollup.period_start >= since,
             )
-            .group_by(WorkoutSession.date)
-            .order_by(WorkoutSession.date)
+            .group_by(ExerciseDefinition.category, VolumeRollup.period_start)
+            .order_by(ExerciseDefinition.category, VolumeRollup.period_start)
             .all()
         )
-        return [VolumePoint(date=r.date, volume=float(r.volume)) for r in rows]
+        by_category: dict[str, list[VolumePoint]] = {}
+        for r in rows:
+            by_category.setdefault(r.category, []).append(
+                VolumePoint(date=r.period_start, volume_kg=float(r.volume_kg))
+            )
+        return by_category
 
 
+@_cached_read
 def get_dashboard_stats(user_id: int) -> DashboardStats:
-    """Compute all stats needed for the home dashboard in one call."""
-    today      = datetime.date.today()
-    week_start = today - datetime.timedelta(days=today.weekday())  # Monday
-
+    """
+    Stats for the home dashboard: a primary-key lookup of the user's
+    user_stats row, which the write hooks keep current. The streak only
+    counts if it ends today or yesterday (so logging later in the day
+    doesn't break it), and the week's sessions only if the newest session
+    is in this week. The favourite day is the ppl_day with the most sessions,
+    whatever its name; ties go to the alphabetically first.
+    """
     with _session() as s:
-        total_sessions = (
-            s.query(func.count(WorkoutSession.id))
-            .filter_by(user_id=user_id)
-            .scalar() or 0
-        )
-
-        sessions_this_week = (
-            s.query(func.count(WorkoutSession.id))
-            .filter(
-                WorkoutSession.user_id == user_id,
-                WorkoutSession.date   >= week_start,
-            )
-            .scalar() or 0
+        row = s.connection().execute(_SELECT_USER_STATS, {"user_id": user_id}).first()
+    if row is None:
+        return DashboardStats(
+            total_sessions=0, sessions_this_week=0, current_streak=0,
+            total_exercises=0, favourite_day=None,
         )
 
-        # All distinct session dates, newest first — for streak calculation
-        all_dates: list[datetime.date] = [
-            row[0] for row in (
-                s.query(WorkoutSession.date)
-                .filter_by(user_id=user_id)
-                .distinct()
-                .order_by(desc(WorkoutSession.date))
-                .all()
-            )
-        ]
-        current_streak = _calculate_streak(all_dates, today)
-
-        total_exercises = (
-            s.query(func.count(WorkoutLog.exercise.distinct()))
-            .filter(WorkoutLog.user_id == user_id)
-            .scalar() or 0
-        )
+    today = datetime.date.today()
+    last  = row.last_session_date
+    return DashboardStats(
+        total_sessions=row.total_sessions,
+        sessions_this_week=row.week_sessions if last is not None and _same_week(last, today) else 0,
+        current_streak=row.streak_days if last in (today, today - _ONE_DAY) else 0,
+        total_exercises=row.total_exercises,
+        favourite_day=row.favourite_day,
+    )
 
-        fav_row = (
-            s.query(
-                WorkoutSession.ppl_day,
-                func.count(WorkoutSession.ppl_day).label("n"),
-            )
-            .filter(
-                WorkoutSession.user_id  == user_id,
-                WorkoutSession.ppl_day.isnot(None),
-            )
-            .group_by(WorkoutSession.ppl_day)
-            .order_by(desc("n"))
-            .first()
-        )
-        favourite_day = fav_row[0] if fav_row else None
 
-        return DashboardStats(
-            total_sessions=total_sessions,
-            sessions_this_week=sessions_this_week,
-            current_streak=current_streak,
-            total_exercises=total_exercises,
-            favourite_day=favourite_day,
-        )
+@_cached_read
+def get_session_days(user_id: int) -> list[str]:
+    """The ppl_day labels the user's sessions carry, alphabetically — from user_day_counts."""
+    with _session() as s:
+        return list(s.scalars(
+            select(UserDayCount.ppl_day)
+            .where(UserDayCount.user_id == user_id)
+            .order_by(UserDayCount.ppl_day)
+        ))
 
 
+@_cached_read
 def get_recent_sessions_with_logs(
     user_id: int,
     limit: int = 5,
-) -> list[tuple[WorkoutSession, list[WorkoutLog]]]:
-    """Return the last `limit` sessions, each paired with its log entries."""
+) -> list[tuple[SessionRow, list[LogRow]]]:
+    """
+    Return the last `limit` sessions, each paired with its log entries.
+    Logs for all of them are fetched in one statement, so this is two
+    statements whatever the limit — a 100-session history view costs the
+    same as 5.
+    """
     with _session() as s:
-        sessions = (
-            s.query(WorkoutSession)
-            .filter_by(user_id=user_id)
-            .order_by(desc(WorkoutSession.date), desc(WorkoutSession.created_at))
-            .limit(limit)
-            .all()
-        )
-        return [
-            (
-                sess,
-                s.query(WorkoutLog)
-                 .filter_by(session_id=sess.id, user_id=user_id)
-                 .order_by(WorkoutLog.id)
-                 .all(),
-            )
-            for sess in sessions
-        ]
+        sessions = _rows(s, _SELECT_RECENT_SESSIONS, SessionRow, user_id=user_id, limit=limit)
+        return _with_logs(s, sessions)
+
+# ─────────────────────────── export ──────────────────────────────────
+
+_EXPORT_QUERY = (
+    select(
+        WorkoutSession.id.label("session_id"),
+        WorkoutSession.date,
+        WorkoutSession.ppl_day,
+        WorkoutSession.notes,
+        WorkoutLog.id.label("log_id"),
+        WorkoutLog.exercise,
+        WorkoutLog.sets,
+        WorkoutLog.reps,
+        WorkoutLog.weight,
+        WorkoutLog.weight_unit,
+        WorkoutLog.weight_kg,
+    )
+    .outerjoin(WorkoutLog, WorkoutLog.session_id == WorkoutSession.id)
+    .order_by(WorkoutSession.date, WorkoutSession.id, WorkoutLog.id)
+)
 
-# ─────────────────────────── streak helper ───────────────────────────
+EXPORT_COLUMNS: tuple[str, ...] = tuple(_EXPORT_QUERY.selected_columns.keys())
 
-def _calculate_streak(dates: list[datetime.date], today: datetime.date) -> int:
+
+def iter_history_rows(user_id: int, batch_size: int = 1000) -> Iterator[list[tuple]]:
     """
-    Given distinct session dates sorted newest-first, return the current
-    consecutive-day streak. The streak counts if the user worked out today
-    OR yesterday (so logging later in the day doesn't break it).
-    A gap of more than one calendar day resets it to zero.
+    Yield a user's whole training history, oldest first, in batches of
+    rows shaped like EXPORT_COLUMNS: one row per log, and one row with
+    empty log columns for a session without logs. Rows come from a
+    server-side cursor (yield_per), so memory is bounded by batch_size
+    however long the history is. Reads from a replica when one is usable.
+    Holds a connection until exhausted or closed.
     """
-    if not dates:
-        return 0
+    _ensure_tables()
+    stmt    = _EXPORT_QUERY.where(WorkoutSession.user_id == user_id).execution_options(yield_per=batch_size)
+    with _read_connection(user_id) as conn:
+        for partition in conn.execute(stmt).partitions():
+            yield [tuple(row) for row in partition]
+
+
+@instrumented
+def get_all_user_ids() -> list[int]:
+    with _session() as s:
+        return [row[0] for row in s.query(User.id).order_by(User.id)]
 
-    # Anchor: streak must end on today or yesterday
-    if dates[0] == today:
-        anchor = today
-    elif dates[0] == today - datetime.timedelta(days=1):
-        anchor = today - datetime.timedelta(days=1)
-    else:
-        return 0
 
-    streak = 1
-    for i in range(1, len(dates)):
-        if dates[i] == anchor - datetime.timedelta(days=i):
-            streak += 1
+# ─────────────────────────── calendar cache ──────────────────────────
+#
+# Storage for calendar_sync. A sync's pages are applied in one transaction
+# together with its new sync token, so an interrupted sync leaves the
+# previous state intact rather than half-applied.
+
+@dataclass(frozen=True, slots=True)
+class CalendarEventRow:
+    event_id: str
+    summary:  str | None
+    start_at: datetime.datetime
+    end_at:   datetime.datetime
+    all_day:  bool
+
+
+_CALENDAR_BATCH = 1000   # events per upsert statement
+
+_SELECT_CALENDAR_EVENTS = (
+    select(*_columns(CalendarEvent, CalendarEventRow))
+    .where(
+        CalendarEvent.user_id     == bindparam("user_id"),
+        CalendarEvent.calendar_id == bindparam("calendar_id"),
+        CalendarEvent.start_at    <  bindparam("time_max"),
+        CalendarEvent.end_at      >  bindparam("time_min"),
+    )
+    .order_by(CalendarEvent.start_at, CalendarEvent.event_id)
+)
+
+
+@instrumented
+def get_calendar_sync_token(user_id: int, calendar_id: str) -> str | None:
+    with _session() as s:
+        return s.query(CalendarSyncState.sync_token).filter_by(
+            user_id=user_id, calendar_id=calendar_id,
+        ).scalar()
+
+
+@instrumented
+def apply_calendar_sync(
+    user_id: int,
+    calendar_id: str,
+    events: list[dict],
+    deleted: Iterable[str],
+    sync_token: str | None,
+    full: bool = False,
+    prune_before: datetime.datetime | None = None,
+) -> None:
+    """
+    Store one completed sync: upsert `events` (dicts of CalendarEvent
+    columns other than user_id / calendar_id), drop `deleted` event ids and
+    save the new sync token. A full sync replaces the calendar's cached
+    events outright. Events that ended before prune_before are dropped.
+    """
+    owner = (CalendarEvent.user_id == user_id) & (CalendarEvent.calendar_id == calendar_id)
+    with _session() as s:
+        if full:
+            s.execute(delete(CalendarEvent).where(owner))
+        for i in range(0, len(events), _CALENDAR_BATCH):
+            stmt = _insert_for(s, CalendarEvent).values([
+                {"user_id": user_id, "calendar_id": calendar_id, **e}
+                for e in events[i:i + _CALENDAR_BATCH]
+            ])
+            s.execute(stmt.on_conflict_do_update(
+                index_elements=[CalendarEvent.user_id, CalendarEvent.calendar_id, CalendarEvent.event_id],
+                set_={col: stmt.excluded[col] for col in ("summary", "start_at", "end_at", "all_day")},
+            ))
+        deleted = list(deleted)
+        for i in range(0, len(deleted), _CALENDAR_BATCH):
+            s.execute(delete(CalendarEvent).where(
+                owner, CalendarEvent.event_id.in_(deleted[i:i + _CALENDAR_BATCH]),
+            ))
+        if prune_before is not None:
+            s.execute(delete(CalendarEvent).where(owner, CalendarEvent.end_at < prune_before))
+
+        stmt = _insert_for(s, CalendarSyncState).values(
+            user_id=user_id,
+            calendar_id=calendar_id,
+            sync_token=sync_token,
+            synced_at=datetime.datetime.utcnow(),
+        )
+        s.execute(stmt.on_conflict_do_update(
+            index_elements=[CalendarSyncState.user_id, CalendarSyncState.calendar_id],
+            set_={col: stmt.excluded[col] for col in ("sync_token", "synced_at")},
+        ))
+
+
+@instrumented
+def get_calendar_events_between(
+    user_id: int,
+    calendar_id: str,
+    time_min: datetime.datetime,
+    time_max: datetime.datetime,
+) -> list[CalendarEventRow]:
+    """Cached events overlapping [time_min, time_max), in start order."""
+    with _session() as s:
+        return _rows(
+            s, _SELECT_CALENDAR_EVENTS, CalendarEventRow,
+            user_id=user_id, calendar_id=calendar_id, time_min=time_min, time_max=time_max,
+        )
+
+
+@instrumented
+def clear_calendar_cache(user_id: int) -> None:
+    """Forget every cached event and sync token of the user (e.g. on disconnect)."""
+    with _session() as s:
+        s.execute(delete(CalendarEvent).where(CalendarEvent.user_id == user_id))
+        s.execute(delete(CalendarSyncState).where(CalendarSyncState.user_id == user_id))
+
+# ─────────────────────────── import ──────────────────────────────────
+
+@dataclass
+class ImportResult:
+    sessions:      int = 0
+    logs:          int = 0
+    duplicates:    int = 0    # sessions skipped because an earlier import wrote them
+    new_exercises: list[str] = field(default_factory=list)   # custom exercises created
+
+
+_COPY_LOG_COLUMNS = (
+    "session_id", "user_id", "exercise", "exercise_id",
+    "sets", "reps", "weight", "weight_unit", "weight_kg",
+)
+
+
+def _copy_logs(s, rows: list[dict]) -> None:
+    """Bulk-load workout_logs rows: COPY on psycopg2, executemany elsewhere."""
+    if s.get_bind().dialect.driver != "psycopg2":
+        s.execute(insert(WorkoutLog), rows)
+        return
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow([r[c] for c in _COPY_LOG_COLUMNS])   # None → empty field → NULL
+    buf.seek(0)
+    cursor = s.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY workout_logs ({', '.join(_COPY_LOG_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf,
+        )
+    finally:
+        cursor.close()
+
+
+@_invalidates_user
+def import_sessions(
+    user_id: int,
+    batches: Iterable[list[tuple[dict, list[dict]]]],
+    dry_run: bool = False,
+    on_batch=None,
+) -> ImportResult:
+    """
+    Load historical sessions in one transaction. Each batch is a list of
+    (meta, entries) pairs shaped like log_full_session's arguments; every
+    meta must carry an idempotency_key, so re-running an import skips the
+    sessions it already wrote, and a key seen again in a later batch adds
+    its entries to the session created earlier. Sessions go in with one
+    multi-row INSERT per batch and logs with COPY (Postgres) or
+    executemany. personal_records, volume_rollups and user_stats are
+    rebuilt for the user once at the end instead of per write. With dry_run everything is
+    written and then rolled back. on_batch(result) is called after each
+    batch.
+    """
+    result   = ImportResult()
+    imported: dict[str, int] = {}      # idempotency key → session id, for this run
+    skipped:  set[str]       = set()   # keys an earlier import already wrote
+    with _session() as s:
+        for batch in batches:
+            names = {e["exercise"] for _, entries in batch for e in entries}
+            known = _lookup_exercise_ids(s, user_id, names)
+            created = sorted({n.lower(): n for n in names if n.lower() not in known}.values())
+            ids     = {**known, **_exercise_ids(s, user_id, created)} if created else known
+            result.new_exercises.extend(created)
+
+            fresh = {}
+            for meta, _ in batch:
+                key = meta["idempotency_key"]
+                if key not in imported and key not in skipped:
+                    date = meta["date"]
+                    started = meta.get("created_at") or datetime.datetime.combine(date, datetime.time())
+                    fresh[key] = {
+                        "user_id":         user_id,
+                        "date":            date,
+                        "ppl_day":         meta.get("ppl_day"),
+                        "notes":           meta.get("notes"),
+                        "created_at":      started,
+                        "idempotency_key": key,
+                    }
+            if fresh:
+                stmt = (
+                    _insert_for(s, WorkoutSession)
+                    .values(list(fresh.values()))
+                    .on_conflict_do_nothing(index_elements=[WorkoutSession.user_id, WorkoutSession.idempotency_key])
+                    .returning(WorkoutSession.id, WorkoutSession.idempotency_key)
+                )
+                for session_id, key in s.execute(stmt):
+                    imported[key] = session_id
+                new_skips = fresh.keys() - imported.keys()
+                skipped |= new_skips
+                result.sessions   += len(fresh) - len(new_skips)
+                result.duplicates += len(new_skips)
+
+            rows = [
+                {
+                    "session_id":  imported[meta["idempotency_key"]],
+                    "user_id":     user_id,
+                    "exercise":    e["exercise"],
+                    "exercise_id": ids[e["exercise"].lower()],
+                    "sets":        e["sets"],
+                    "reps":        e["reps"],
+                    "weight":      e.get("weight"),
+                    "weight_unit": e.get("weight_unit"),
+                    "weight_kg":   to_kg(e.get("weight"), e.get("weight_unit")),
+                }
+                for meta, entries in batch if meta["idempotency_key"] in imported
+                for e in entries
+            ]
+            if rows:
+                _copy_logs(s, rows)
+                result.logs += len(rows)
+            if on_batch is not None:
+                on_batch(result)
+
+        if dry_run:
+            s.rollback()
         else:
-            break
-    return streak
\ No newline at end of file
+            if result.logs:
+                backfill_personal_records(user_id, conn=s.connection())
+                backfill_volume_rollups(user_id, conn=s.connection())
+            if result.sessions or result.logs:
+                backfill_user_stats(user_id, conn=s.connection())
+    return result
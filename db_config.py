@@ -0,0 +1,103 @@
+"""
+db_config.py — database URL resolution and engine construction.
+
+Kept free of Streamlit so database_service can run from batch jobs, API
+servers, benchmarks and CLIs. The URL is resolved in this order:
+
+  1. an explicit url argument (database_service.configure(url=...))
+  2. the DATABASE_URL environment variable
+  3. DB_HOST / DB_PORT / DB_NAME / DB_USER / DB_PASSWORD environment variables
+  4. the same keys in st.secrets — consulted only when Streamlit has already
+     been imported by the running app, never imported from here
+
+Any SQLAlchemy URL works; postgresql+psycopg2 in production and sqlite for
+local and test runs (e.g. DATABASE_URL=sqlite:///skibfit.db).
+
+Read replicas are optional: DATABASE_REPLICA_URLS (comma-separated), or the
+same key in st.secrets. See replicas.py.
+"""
+
+import os
+import sys
+from urllib.parse import quote_plus
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+_SECRET_KEYS = ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD")
+
+
+def _postgres_url(parts: dict) -> str:
+    password = quote_plus(parts["DB_PASSWORD"])
+    return (
+        f"postgresql+psycopg2://{parts['DB_USER']}:{password}"
+        f"@{parts['DB_HOST']}:{int(parts['DB_PORT'])}/{parts['DB_NAME']}?sslmode=require"
+    )
+
+
+def _streamlit_secrets() -> dict | None:
+    """DB_* keys from st.secrets, if we're inside an app that already imported Streamlit."""
+    st = sys.modules.get("streamlit")
+    if st is None:
+        return None
+    try:
+        return {key: st.secrets[key] for key in _SECRET_KEYS}
+    except (KeyError, FileNotFoundError):
+        return None
+
+
+def load_database_url(url: str | None = None) -> str:
+    """Resolve the database URL (see module docstring for the order)."""
+    if url:
+        return url
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    if all(os.environ.get(key) for key in _SECRET_KEYS):
+        return _postgres_url({key: os.environ[key] for key in _SECRET_KEYS})
+    secrets = _streamlit_secrets()
+    if secrets:
+        return _postgres_url(secrets)
+    raise RuntimeError(
+        "No database configured. Set DATABASE_URL (or DB_HOST, DB_PORT, DB_NAME, "
+        "DB_USER, DB_PASSWORD), or call database_service.configure(url=...)."
+    )
+
+
+def load_replica_urls(urls: list[str] | None = None) -> list[str]:
+    """Replica URLs: the argument, else DATABASE_REPLICA_URLS, else st.secrets; may be empty."""
+    if urls is not None:
+        return list(urls)
+    raw = os.environ.get("DATABASE_REPLICA_URLS")
+    if raw is None:
+        st = sys.modules.get("streamlit")
+        if st is not None:
+            try:
+                raw = st.secrets["DATABASE_REPLICA_URLS"]
+            except (KeyError, FileNotFoundError):
+                raw = None
+    return [u.strip() for u in (raw or "").split(",") if u.strip()]
+
+
+def create_engine_for(url: str, **engine_kwargs) -> Engine:
+    """Build an engine with sensible per-backend defaults; kwargs override them."""
+    if make_url(url).get_backend_name() == "sqlite":
+        options: dict = {"connect_args": {"check_same_thread": False}}
+        if make_url(url).database in (None, "", ":memory:"):
+            # One shared connection, otherwise every checkout sees an empty database
+            options["poolclass"] = StaticPool
+        options.update(engine_kwargs)
+        engine = create_engine(url, **options)
+
+        @event.listens_for(engine, "connect")
+        def _enable_foreign_keys(dbapi_conn, _record):
+            dbapi_conn.execute("PRAGMA foreign_keys = ON")
+        return engine
+
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle":  300,
+        "connect_args":  {"connect_timeout": 10},
+    }
+    options.update(engine_kwargs)
+    return create_engine(url, **options)
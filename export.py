@@ -0,0 +1,188 @@
+"""
+export.py — streaming export of a user's training history.
+
+One row per logged exercise (sessions without logs appear once, with
+empty log columns), in CSV, JSON Lines or Parquet. Everything is a
+generator of byte chunks fed by database_service.iter_history_rows(), which
+reads through a server-side cursor — memory stays flat whatever the length
+of the history, whether the chunks go to a file, a socket or a download.
+
+    export_chunks(user_id, "csv")            -> Iterator[bytes]
+    export_to_file(user_id, "jsonl", path)   -> bytes written
+    export_all_users("parquet", out_dir)     -> one file per user, in parallel
+
+Parquet needs pyarrow; CSV and JSON Lines have no extra dependencies.
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import database_service as ds
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # optional — only the Parquet format needs it
+    pa = pq = None
+
+# format → (mime type, file extension)
+FORMATS: dict[str, tuple[str, str]] = {
+    "csv":     ("text/csv",                       ".csv"),
+    "jsonl":   ("application/x-ndjson",           ".jsonl"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+BATCH_SIZE = 1000   # rows fetched per round trip, and per output chunk
+
+# ─────────────────────────── formats ─────────────────────────────────
+
+def _csv_chunks(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(ds.EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()   # header only — no rows
+
+
+def _jsonl_chunks(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(ds.EXPORT_COLUMNS, row)), default=str) + "\n"
+            for row in batch
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("session_id",  pa.int64()),
+        ("date",        pa.date32()),
+        ("ppl_day",     pa.string()),
+        ("notes",       pa.string()),
+        ("log_id",      pa.int64()),
+        ("exercise",    pa.string()),
+        ("sets",        pa.int64()),
+        ("reps",        pa.int64()),
+        ("weight",      pa.float64()),
+        ("weight_unit", pa.string()),
+        ("weight_kg",   pa.float64()),
+    ])
+
+
+def _parquet_chunks(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """One row group per batch; each group's bytes are yielded as soon as it's written."""
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = _parquet_schema()
+    sink   = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_table(pa.table(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+_CHUNKERS = {"csv": _csv_chunks, "jsonl": _jsonl_chunks, "parquet": _parquet_chunks}
+
+# ─────────────────────────── public API ──────────────────────────────
+
+def export_chunks(user_id: int, fmt: str, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Stream one user's history as byte chunks in `fmt` (a FORMATS key)."""
+    if fmt not in _CHUNKERS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return _CHUNKERS[fmt](ds.iter_history_rows(user_id, batch_size))
+
+
+def export_filename(username: str, fmt: str) -> str:
+    return f"skibfit_{username}_history{FORMATS[fmt][1]}"
+
+
+def export_to_file(user_id: int, fmt: str, path: str, batch_size: int = BATCH_SIZE) -> int:
+    """Write one user's history to `path`. Returns the number of bytes written."""
+    written = 0
+    with open(path, "wb") as f:
+        for chunk in export_chunks(user_id, fmt, batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+# ─────────────────────────── bulk export ─────────────────────────────
+#
+# Module-level so they pickle into the worker processes. Each worker builds
+# its own engines from the URLs; connections can't cross process boundaries.
+
+def _init_worker(database_url: str, replica_urls: list[str]) -> None:
+    ds.configure(database_url, replica_urls)
+
+
+def _export_user_job(user_id: int, fmt: str, out_dir: str) -> tuple[int, str, int]:
+    path = os.path.join(out_dir, f"user_{user_id}{FORMATS[fmt][1]}")
+    return user_id, path, export_to_file(user_id, fmt, path)
+
+
+def export_all_users(
+    fmt: str,
+    out_dir: str,
+    workers: int = os.cpu_count() or 1,
+    user_ids: list[int] | None = None,
+) -> Iterator[tuple[int, str, int]]:
+    """
+    Export every user (or `user_ids`) to out_dir/user_<id>.<ext> across a
+    process pool, yielding (user_id, path, bytes) as each file completes.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    os.makedirs(out_dir, exist_ok=True)
+    if user_ids is None:
+        user_ids = ds.get_all_user_ids()
+    database_url = ds.get_engine().url.render_as_string(hide_password=False)
+    replicas     = ds.get_replica_set()
+    replica_urls = replicas.urls if replicas is not None else []
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(database_url, replica_urls),
+    ) as pool:
+        futures = [pool.submit(_export_user_job, uid, fmt, out_dir) for uid in user_ids]
+        for future in as_completed(futures):
+            yield future.result()
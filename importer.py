@@ -0,0 +1,341 @@
+"""
+importer.py — bulk import of training history from other tracker apps.
+
+Reads a CSV export (Strong, Hevy, FitNotes-style sheets, or our own
+export.py CSV) as a stream, maps its columns and exercise names onto ours,
+groups rows into sessions and hands them to
+database_service.import_sessions() in batches. Memory is bounded by the
+batch size, not the file.
+
+    import_csv(user_id, "strong.csv")                 -> ImportReport
+    import_csv(user_id, "hevy.csv", dry_run=True)     -> validate, write nothing
+
+Columns are found by header (COLUMN_ALIASES, case-insensitive) unless given
+explicitly. One row per set is the common layout; consecutive identical
+sets are folded into one log with a sets count. Rows sharing a start time
+and workout name form one session, so two same-day workouts with the same
+name stay apart whenever the file records times. Exercise names are matched
+to the library ignoring case, punctuation and a trailing "(Equipment)"
+suffix; anything still unknown becomes a custom exercise. Re-importing the
+same file skips the sessions already imported.
+"""
+
+import contextlib
+import csv
+import datetime
+import re
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from typing import TextIO
+
+import database_service as ds
+from exercise_library import EXERCISES
+
+BATCH_SIZE = 5000   # log rows per batch handed to the database
+MAX_ISSUES = 100    # rejected rows reported individually; the rest are only counted
+
+# our field → header names other apps use for it, most specific first
+COLUMN_ALIASES: dict[str, tuple[str, ...]] = {
+    "date":        ("date", "start_time", "workout date", "day"),
+    "session":     ("session_id", "workout name", "title", "workout", "routine"),
+    "ppl_day":     ("ppl_day",),
+    "notes":       ("workout notes", "notes", "description"),
+    "exercise":    ("exercise", "exercise name", "exercise_title", "exercise_name", "name"),
+    "sets":        ("sets",),
+    "reps":        ("reps", "repetitions"),
+    "weight":      ("weight", "weight_kg", "weight_lbs", "weight (kg)", "weight (lbs)", "load"),
+    "weight_unit": ("weight_unit", "weight unit", "unit", "units"),
+}
+
+# headers whose name fixes the unit of the weight column
+_HEADER_UNITS = {"weight_kg": "kg", "weight (kg)": "kg", "weight_lbs": "lbs", "weight (lbs)": "lbs"}
+
+_UNIT_NAMES = {"kg": "kg", "kgs": "kg", "kilograms": "kg", "lb": "lbs", "lbs": "lbs", "pounds": "lbs"}
+
+_DATE_FORMATS = ("%d %b %Y, %H:%M", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%d.%m.%Y")
+
+_PPL_WORDS = re.compile(r"\b(push|pull|legs?)\b", re.IGNORECASE)
+
+
+class ImportFileError(ValueError):
+    """The file can't be imported at all (no header, missing required columns)."""
+
+
+@dataclass
+class ImportIssue:
+    line:    int
+    message: str
+
+
+@dataclass
+class ImportReport:
+    rows_read:    int = 0
+    rows_skipped: int = 0
+    issues:       list[ImportIssue] = field(default_factory=list)   # the first MAX_ISSUES
+    first_date:   datetime.date | None = None
+    last_date:    datetime.date | None = None
+    result:       ds.ImportResult = field(default_factory=ds.ImportResult)
+    dry_run:      bool = False
+
+    def reject(self, line: int, message: str) -> None:
+        self.rows_skipped += 1
+        if len(self.issues) < MAX_ISSUES:
+            self.issues.append(ImportIssue(line, message))
+
+# ─────────────────────────── columns ─────────────────────────────────
+
+def resolve_columns(header: list[str], columns: dict[str, str] | None = None) -> dict[str, str]:
+    """
+    Map our field names to the file's headers: explicit `columns` first,
+    then COLUMN_ALIASES. date, exercise and reps are required.
+    """
+    by_lower = {h.strip().lower(): h for h in header}
+    resolved: dict[str, str] = {}
+    for name, wanted in (columns or {}).items():
+        if name not in COLUMN_ALIASES:
+            raise ImportFileError(f"Unknown field {name!r}; expected one of {', '.join(COLUMN_ALIASES)}")
+        if wanted.strip().lower() not in by_lower:
+            raise ImportFileError(f"Column {wanted!r} not found in the file header")
+        resolved[name] = by_lower[wanted.strip().lower()]
+    for name, aliases in COLUMN_ALIASES.items():
+        if name not in resolved:
+            match = next((by_lower[a] for a in aliases if a in by_lower), None)
+            if match is not None:
+                resolved[name] = match
+    missing = [name for name in ("date", "exercise", "reps") if name not in resolved]
+    if missing:
+        raise ImportFileError(f"No column found for {', '.join(missing)} — pass it explicitly")
+    return resolved
+
+# ─────────────────────────── exercise names ──────────────────────────
+
+def _name_key(name: str) -> str:
+    """Lower-case, punctuation-insensitive form: "Pull Up" and "pull-up" match."""
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+
+_LIBRARY_KEYS: dict[str, str] = {_name_key(e.name): e.name for e in EXERCISES}
+
+
+class ExerciseNameMapper:
+    """
+    Map another app's exercise names onto ours. An explicit name_map entry
+    wins; otherwise "Bench Press (Barbell)" is tried as itself, as
+    "Barbell Bench Press" and as "Bench Press" against the library. Names
+    that match nothing are kept as written (and become custom exercises).
+    """
+
+    def __init__(self, name_map: dict[str, str] | None = None):
+        self._explicit = {_name_key(k): v for k, v in (name_map or {}).items()}
+        self._cache: dict[str, str] = {}
+
+    def __call__(self, name: str) -> str:
+        mapped = self._cache.get(name)
+        if mapped is None:
+            mapped = self._cache[name] = self._map(name.strip())
+        return mapped
+
+    def _map(self, name: str) -> str:
+        key = _name_key(name)
+        if key in self._explicit:
+            return self._explicit[key]
+        candidates = [key]
+        suffixed = re.fullmatch(r"(.*?)\s*\(([^)]*)\)", name)
+        if suffixed:
+            base, equipment = _name_key(suffixed[1]), _name_key(suffixed[2])
+            candidates += [f"{equipment} {base}", base]
+        for candidate in candidates:
+            if candidate in _LIBRARY_KEYS:
+                return _LIBRARY_KEYS[candidate]
+        return name
+
+
+def load_name_map(f: TextIO) -> dict[str, str]:
+    """Read a headerless two-column CSV of (their name, our name) pairs."""
+    return {
+        row[0].strip(): row[1].strip()
+        for row in csv.reader(f)
+        if len(row) >= 2 and row[0].strip() and row[1].strip()
+    }
+
+# ─────────────────────────── parsing ─────────────────────────────────
+
+class _DateParser:
+    """Parse the date column, caching per distinct string — a session repeats it on every row."""
+
+    def __init__(self):
+        self._cache: dict[str, datetime.datetime] = {}
+
+    def __call__(self, text: str) -> datetime.datetime:
+        parsed = self._cache.get(text)
+        if parsed is None:
+            parsed = self._cache[text] = self._parse(text.strip())
+        return parsed
+
+    @staticmethod
+    def _parse(text: str) -> datetime.datetime:
+        try:
+            return datetime.datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        raise ValueError(f"unrecognised date {text!r}")
+
+
+def _number(text: str | None) -> float | None:
+    text = (text or "").strip().replace(",", ".")
+    return float(text) if text else None
+
+
+def _ppl_day(label: str) -> str | None:
+    """"Push A", "Leg day", "PULL" → "Push" / "Legs" / "Pull"; anything else → None."""
+    match = _PPL_WORDS.search(label)
+    if not match:
+        return None
+    word = match[1].lower()
+    return "Legs" if word.startswith("leg") else word.capitalize()
+
+
+def _open_reader(f: TextIO) -> csv.DictReader:
+    sample = f.read(8192)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(f, dialect=dialect)
+
+
+def iter_session_batches(
+    f: TextIO,
+    report: ImportReport,
+    *,
+    unit: str,
+    columns: dict[str, str] | None = None,
+    name_map: dict[str, str] | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[list[tuple[dict, list[dict]]]]:
+    """
+    Stream (meta, entries) batches for database_service.import_sessions().
+    Invalid rows are skipped and recorded on `report`. A batch is cut only
+    between sessions, once it holds at least batch_size log rows.
+    """
+    reader = _open_reader(f)
+    if not reader.fieldnames:
+        raise ImportFileError("The file is empty or has no header row")
+    cols        = resolve_columns(reader.fieldnames, columns)
+    header_unit = _HEADER_UNITS.get(cols.get("weight", "").strip().lower())
+    per_set     = "sets" not in cols     # one row per set — fold identical sets together
+    map_name    = ExerciseNameMapper(name_map)
+    parse_date  = _DateParser()
+
+    def parse_entry(row: dict, exercise: str) -> dict:
+        try:
+            reps   = int(_number(row.get(cols["reps"])) or 0)
+            sets   = int(_number(row.get(cols["sets"])) or 0) if not per_set else 1
+            weight = _number(row.get(cols["weight"])) if "weight" in cols else None
+        except ValueError:
+            raise ValueError("sets, reps and weight must be numbers")
+        if reps <= 0 or sets <= 0:
+            raise ValueError("no reps logged (cardio and timed sets aren't imported)")
+        if weight is not None and weight < 0:
+            raise ValueError("negative weight")
+        raw_unit    = (row.get(cols["weight_unit"]) or "").strip().lower() if "weight_unit" in cols else ""
+        weight_unit = _UNIT_NAMES.get(raw_unit) or header_unit or unit
+        return {
+            "exercise":    map_name(exercise),
+            "sets":        sets,
+            "reps":        reps,
+            "weight":      weight,
+            "weight_unit": weight_unit if weight is not None else None,
+        }
+
+    pending: dict[str, tuple[dict, list[dict]]] = {}
+    pending_logs = 0
+    current_key  = None
+    for row in reader:
+        report.rows_read += 1
+        line = reader.line_num
+        try:
+            started  = parse_date(row[cols["date"]] or "")
+            exercise = (row.get(cols["exercise"]) or "").strip()
+            # no exercise: a session with nothing logged (our own export writes these)
+            entry    = parse_entry(row, exercise) if exercise else None
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+        label = (row.get(cols["session"]) or "").strip() if "session" in cols else ""
+        key   = f"import:{started.isoformat()}:{label}"
+
+        if key != current_key and pending_logs >= batch_size:
+            yield list(pending.values())
+            pending.clear()
+            pending_logs = 0
+        current_key = key
+
+        if key not in pending:
+            ppl_day = (row.get(cols["ppl_day"]) or "").strip() if "ppl_day" in cols else _ppl_day(label)
+            notes   = (row.get(cols["notes"]) or "").strip() if "notes" in cols else None
+            pending[key] = ({
+                "date":            started.date(),
+                "created_at":      started,
+                "ppl_day":         ppl_day or None,
+                "notes":           notes or None,
+                "idempotency_key": key,
+            }, [])
+            report.first_date = min(report.first_date or started.date(), started.date())
+            report.last_date  = max(report.last_date or started.date(), started.date())
+        if entry is None:
+            continue
+
+        entries = pending[key][1]
+        last    = entries[-1] if entries else None
+        if per_set and last and all(last[k] == entry[k] for k in ("exercise", "reps", "weight", "weight_unit")):
+            last["sets"] += 1
+        else:
+            entries.append(entry)
+            pending_logs += 1
+    if pending:
+        yield list(pending.values())
+
+# ─────────────────────────── public API ──────────────────────────────
+
+def import_csv(
+    user_id: int,
+    source: str | TextIO,
+    *,
+    unit: str | None = None,
+    columns: dict[str, str] | None = None,
+    name_map: dict[str, str] | None = None,
+    dry_run: bool = False,
+    batch_size: int = BATCH_SIZE,
+    progress: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    """
+    Import a CSV file (a path or an open text file) into user_id's history.
+    `unit` is the unit of weights whose row and header don't say — by
+    default the user's preferred unit. The whole import is one transaction;
+    with dry_run it is rolled back, so the report shows exactly what would
+    be written. progress(report) is called after every batch.
+    """
+    report = ImportReport(dry_run=dry_run)
+    unit   = unit or ds.get_preferred_unit(user_id)
+
+    def _on_batch(result: ds.ImportResult) -> None:
+        report.result = result
+        if progress is not None:
+            progress(report)
+
+    with contextlib.ExitStack() as stack:
+        f = source
+        if isinstance(source, str):
+            f = stack.enter_context(open(source, newline="", encoding="utf-8-sig"))   # -sig: Excel's BOM
+        batches = iter_session_batches(
+            f, report, unit=unit, columns=columns, name_map=name_map, batch_size=batch_size,
+        )
+        report.result = ds.import_sessions(user_id, batches, dry_run=dry_run, on_batch=_on_batch)
+    return report
@@ -0,0 +1,438 @@
+"""
+instrumentation.py — latency histograms and a slow-query log for the database layer.
+
+database_service wraps its public functions with instrumented() and calls
+instrument_engine() on every engine it builds. From then on:
+
+  * every call of an instrumented function lands in a per-function latency
+    histogram, with the number of statements it ran
+  * every statement lands in a per-statement histogram (keyed by its SQL
+    with IN-lists and multi-row VALUES collapsed) with the rows the driver
+    reported, attributed to the innermost instrumented function running
+  * connection checkout waits are recorded per pool ("primary" / "replica")
+  * statements slower than slow_query_ms are kept in a bounded slow-query
+    log, and logged as warnings, with the *shape* of their bound
+    parameters (types and lengths, never values)
+
+Sampling is decided once per outermost call: with sample_rate=0.01 one call
+in a hundred is measured, and the others cost a context-variable lookup
+per statement. The slow-query check still times every statement — two
+perf_counter() calls — unless slow_query_ms is None.
+
+metrics_snapshot() returns everything as a dict; prometheus_text() renders
+it in the Prometheus text exposition format. Counts are of sampled events.
+Configure with configure_instrumentation() or the DB_METRICS_SAMPLE_RATE /
+DB_SLOW_QUERY_MS environment variables. serve_metrics(port, host) exposes
+the Prometheus text on http://<host>:<port>/metrics from a daemon thread;
+it binds to loopback unless given another address.
+"""
+
+import bisect
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SLOW_LOG_SIZE = 200   # most recent slow queries kept in memory
+
+_IN_LIST     = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s)\s*,)+\s*(?:\?|%\(\w+\)s)\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE  = re.compile(r"\s+")
+
+
+@dataclass
+class _Config:
+    sample_rate:   float = float(os.environ.get("DB_METRICS_SAMPLE_RATE", 1.0))
+    slow_query_ms: float | None = float(os.environ.get("DB_SLOW_QUERY_MS", 500)) or None
+
+
+_config = _Config()
+_UNSET  = object()
+
+
+def configure_instrumentation(sample_rate: float | None = None, slow_query_ms=_UNSET) -> None:
+    """Change the sample rate (0–1) and/or slow-query threshold in ms (None disables the log)."""
+    if sample_rate is not None:
+        _config.sample_rate = max(0.0, min(1.0, sample_rate))
+    if slow_query_ms is not _UNSET:
+        _config.slow_query_ms = slow_query_ms or None
+
+# ─────────────────────────── histograms ──────────────────────────────
+
+class _Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count  = 0
+        self.sum    = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum   += ms
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (None if empty or past the last bound)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def summary(self) -> dict:
+        return {
+            "count":   self.count,
+            "mean_ms": self.sum / self.count if self.count else None,
+            "p50_ms":  self.quantile(0.50),
+            "p95_ms":  self.quantile(0.95),
+            "p99_ms":  self.quantile(0.99),
+        }
+
+
+@dataclass
+class SlowQuery:
+    at:          float              # time.time()
+    function:    str | None
+    statement:   str
+    duration_ms: float
+    params:      str                # parameter shape, e.g. "{user_id: int, exercise: str}"
+
+
+@dataclass
+class _StatementStats:
+    sql:       str
+    latency:   _Histogram = field(default_factory=_Histogram)
+    rows:      int = 0
+    functions: set[str] = field(default_factory=set)
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.functions:  dict[str, _Histogram] = {}
+            self.fn_stmts:   dict[str, int] = {}
+            self.statements: dict[str, _StatementStats] = {}
+            self.checkouts:  dict[str, _Histogram] = {}
+            self.slow:       deque[SlowQuery] = deque(maxlen=SLOW_LOG_SIZE)
+            self.slow_total = 0
+
+    def function(self, name: str, ms: float, statements: int) -> None:
+        with self._lock:
+            self.functions.setdefault(name, _Histogram()).observe(ms)
+            self.fn_stmts[name] = self.fn_stmts.get(name, 0) + statements
+
+    def statement(self, key: str, sql: str, function: str | None, ms: float, rows: int) -> None:
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = _StatementStats(sql)
+            stats.latency.observe(ms)
+            stats.rows += max(rows, 0)
+            if function is not None:
+                stats.functions.add(function)
+
+    def checkout(self, pool: str, ms: float) -> None:
+        with self._lock:
+            self.checkouts.setdefault(pool, _Histogram()).observe(ms)
+
+    def slow_query(self, entry: SlowQuery) -> None:
+        with self._lock:
+            self.slow.append(entry)
+            self.slow_total += 1
+
+
+_metrics = _Metrics()
+
+# ─────────────────────────── function scopes ─────────────────────────
+
+class _Call:
+    __slots__ = ("name", "sampled", "statements")
+
+    def __init__(self, name: str, sampled: bool):
+        self.name       = name
+        self.sampled    = sampled
+        self.statements = 0
+
+
+_current: ContextVar[_Call | None] = ContextVar("_current_db_call", default=None)
+
+
+def _sample() -> bool:
+    rate = _config.sample_rate
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def instrumented(fn):
+    """Record fn's latency and attribute the statements it runs to it."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        parent = _current.get()
+        call   = _Call(name, parent.sampled if parent is not None else _sample())
+        token  = _current.set(call)
+        start  = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            if call.sampled:
+                _metrics.function(name, (time.perf_counter() - start) * 1000, call.statements)
+    return wrapper
+
+
+class timed_checkout:
+    """Context manager timing a connection checkout from `pool` (sampled calls only)."""
+
+    __slots__ = ("pool", "start")
+
+    def __init__(self, pool: str):
+        self.pool = pool
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        call = _current.get()
+        if call is not None and call.sampled:
+            _metrics.checkout(self.pool, (time.perf_counter() - self.start) * 1000)
+
+# ─────────────────────────── statement hooks ─────────────────────────
+
+def statement_key(sql: str) -> str:
+    """Normalised SQL: whitespace collapsed, IN-lists and VALUES rows folded to one."""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _IN_LIST.sub("(...)", sql)
+    return _VALUES_ROWS.sub(r"\1, ...", sql)
+
+
+_KEY_CACHE_SIZE = 4096
+_key_cache: dict[str, tuple[str, str]] = {}   # raw SQL → (statement id, normalised SQL)
+
+
+def _statement_ids(sql: str) -> tuple[str, str]:
+    """(id, key) for a raw statement. SQLAlchemy reuses compiled SQL strings, so this is nearly always a hit."""
+    cached = _key_cache.get(sql)
+    if cached is None:
+        if len(_key_cache) >= _KEY_CACHE_SIZE:
+            _key_cache.clear()
+        key    = statement_key(sql)
+        cached = _key_cache[sql] = (hashlib.sha1(key.encode()).hexdigest()[:12], key)
+    return cached
+
+
+def _type_name(value) -> str:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        inner = _type_name(next(iter(value))) if value else "?"
+        return f"{type(value).__name__}[{inner}]({len(value)})"
+    return type(value).__name__
+
+
+def param_shape(parameters, executemany: bool) -> str:
+    """Types (and lengths) of bound parameters, without their values."""
+    if executemany and parameters:
+        return f"{len(parameters)} × {param_shape(parameters[0], False)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_type_name(v) for v in parameters) + ")"
+    return _type_name(parameters)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    call = _current.get()
+    sampled = call.sampled if call is not None else _sample()
+    if sampled or _config.slow_query_ms is not None:
+        context._instr_start   = time.perf_counter()
+        context._instr_sampled = sampled
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_instr_start", None) if context is not None else None
+    if start is None:
+        return
+    ms   = (time.perf_counter() - start) * 1000
+    call = _current.get()
+    name = call.name if call is not None else None
+    if context._instr_sampled:
+        if call is not None:
+            call.statements += 1
+        sid, key = _statement_ids(statement)
+        _metrics.statement(sid, key, name, ms, cursor.rowcount)
+    threshold = _config.slow_query_ms
+    if threshold is not None and ms >= threshold:
+        entry = SlowQuery(time.time(), name, _statement_ids(statement)[1], ms, param_shape(parameters, executemany))
+        _metrics.slow_query(entry)
+        logger.warning("slow query %.1f ms in %s: %s  params=%s",
+                       ms, name or "-", entry.statement, entry.params)
+
+
+def instrument_engine(engine) -> None:
+    """Attach the statement hooks to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# ─────────────────────────── reporting ───────────────────────────────
+
+def metrics_snapshot() -> dict:
+    """Per-function, per-statement and pool-checkout latency, plus recent slow queries."""
+    m = _metrics
+    with m._lock:
+        return {
+            "sample_rate":   _config.sample_rate,
+            "slow_query_ms": _config.slow_query_ms,
+            "functions": {
+                name: {**h.summary(), "statements": m.fn_stmts.get(name, 0)}
+                for name, h in m.functions.items()
+            },
+            "statements": {
+                sid: {
+                    **s.latency.summary(),
+                    "rows":      s.rows,
+                    "functions": sorted(s.functions),
+                    "sql":       s.sql,
+                }
+                for sid, s in m.statements.items()
+            },
+            "pool_checkout": {pool: h.summary() for pool, h in m.checkouts.items()},
+            "slow_queries_total": m.slow_total,
+        }
+
+
+def slow_queries() -> list[SlowQuery]:
+    """The most recent slow queries, oldest first."""
+    with _metrics._lock:
+        return list(_metrics.slow)
+
+
+def reset_metrics() -> None:
+    _metrics.reset()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _histogram_lines(metric: str, labels: str, h: _Histogram) -> list[str]:
+    lines, cumulative = [], 0
+    for bound, n in zip((*BUCKETS_MS, None), h.counts):
+        cumulative += n
+        le = "+Inf" if bound is None else repr(bound / 1000)
+        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f"{metric}_sum{{{labels}}} {h.sum / 1000}")
+    lines.append(f"{metric}_count{{{labels}}} {h.count}")
+    return lines
+
+
+def prometheus_text() -> str:
+    """All metrics in the Prometheus text exposition format (durations in seconds)."""
+    m   = _metrics
+    out = [
+        "# HELP skibfit_db_metrics_sample_rate Fraction of database_service calls measured.",
+        "# TYPE skibfit_db_metrics_sample_rate gauge",
+        f"skibfit_db_metrics_sample_rate {_config.sample_rate}",
+    ]
+    with m._lock:
+        out += [
+            "# HELP skibfit_db_function_duration_seconds Latency of database_service functions.",
+            "# TYPE skibfit_db_function_duration_seconds histogram",
+        ]
+        for name, h in sorted(m.functions.items()):
+            out += _histogram_lines("skibfit_db_function_duration_seconds", f'function="{name}"', h)
+        out += [
+            "# HELP skibfit_db_function_statements_total SQL statements run by each function.",
+            "# TYPE skibfit_db_function_statements_total counter",
+        ]
+        out += [f'skibfit_db_function_statements_total{{function="{name}"}} {n}'
+                for name, n in sorted(m.fn_stmts.items())]
+
+        out += [
+            "# HELP skibfit_db_statement_duration_seconds Latency per normalised SQL statement.",
+            "# TYPE skibfit_db_statement_duration_seconds histogram",
+        ]
+        for sid, s in sorted(m.statements.items()):
+            out += _histogram_lines("skibfit_db_statement_duration_seconds", f'statement="{sid}"', s.latency)
+        out += [
+            "# HELP skibfit_db_statement_rows_total Rows reported by the driver per statement.",
+            "# TYPE skibfit_db_statement_rows_total counter",
+        ]
+        out += [f'skibfit_db_statement_rows_total{{statement="{sid}"}} {s.rows}'
+                for sid, s in sorted(m.statements.items())]
+        out += [
+            "# HELP skibfit_db_statement_info SQL text of each statement id.",
+            "# TYPE skibfit_db_statement_info gauge",
+        ]
+        out += [f'skibfit_db_statement_info{{statement="{sid}",sql="{_label(s.sql[:500])}"}} 1'
+                for sid, s in sorted(m.statements.items())]
+
+        out += [
+            "# HELP skibfit_db_pool_checkout_seconds Wait to check a connection out of the pool.",
+            "# TYPE skibfit_db_pool_checkout_seconds histogram",
+        ]
+        for pool, h in sorted(m.checkouts.items()):
+            out += _histogram_lines("skibfit_db_pool_checkout_seconds", f'pool="{pool}"', h)
+        out += [
+            "# HELP skibfit_db_slow_queries_total Statements over the slow-query threshold.",
+            "# TYPE skibfit_db_slow_queries_total counter",
+            f"skibfit_db_slow_queries_total {m.slow_total}",
+        ]
+    return "\n".join(out) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass    # scrapes every few seconds would flood stderr
+
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> None:
+    """
+    Serve /metrics on `host`:`port` from a daemon thread; later calls in the
+    same process do nothing. Pass host="0.0.0.0" only when the port is
+    firewalled to the scraper — the endpoint has no authentication.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="db-metrics", daemon=True).start()
@@ -0,0 +1,235 @@
+"""
+manage.py — maintenance commands for the SkibFit database.
+
+    python manage.py migrate          apply pending schema migrations
+    python manage.py check-indexes    EXPLAIN hot queries, confirm they hit their indexes
+    python manage.py check-replicas   report read-replica lag and health
+    python manage.py backfill-prs     rebuild personal_records from the raw logs
+    python manage.py backfill-rollups rebuild volume_rollups from the raw logs
+    python manage.py check-stats      compare user_stats with the raw history (--repair fixes drift)
+    python manage.py backfill-exercise-ids
+                                      set exercise_id on rows written without one
+    python manage.py backfill-weight-kg
+                                      set weight_kg on rows written without one
+    python manage.py export           export one user's history (csv / jsonl / parquet)
+    python manage.py export-all       export every user, one file each, across a process pool
+    python manage.py import           import a CSV from another tracker app into a user's history
+"""
+
+import argparse
+import os
+import sys
+
+from database_service import (
+    Base, backfill_exercise_ids, backfill_personal_records, backfill_volume_rollups,
+    backfill_weight_kg, check_user_stats, get_engine, get_user_by_id, replica_status,
+)
+from export import FORMATS, export_all_users, export_to_file
+from importer import COLUMN_ALIASES, ImportFileError, import_csv, load_name_map
+from migrations import check_index_usage, current_version, run_migrations
+
+# ─────────────────────────── commands ────────────────────────────────
+
+def cmd_migrate(args) -> int:
+    engine = get_engine()
+    ran = run_migrations(engine, Base.metadata)
+    if ran:
+        print(f"Applied migration(s): {', '.join(map(str, ran))}")
+    else:
+        print("Schema already up to date.")
+    print(f"Schema version: {current_version(engine)}")
+    return 0
+
+
+def cmd_check_indexes(args) -> int:
+    missing = 0
+    for probe, used in check_index_usage(get_engine()):
+        status = "ok     " if used else "MISSING"
+        print(f"{status} {probe.name:<32} {probe.index}")
+        missing += not used
+    return 1 if missing else 0
+
+
+def cmd_check_replicas(args) -> int:
+    status = replica_status()
+    if not status:
+        print("No read replicas configured (DATABASE_REPLICA_URLS).")
+        return 0
+    for r in status:
+        lag = "-" if r["lag_s"] is None else f"{r['lag_s']:.1f}s"
+        state = "ok     " if r["usable"] else "SKIPPED"
+        print(f"{state} lag {lag:>7}  failures {r['failures']:<4} {r['replica']}")
+    return 0 if any(r["usable"] for r in status) else 1
+
+
+def cmd_backfill_prs(args) -> int:
+    written = backfill_personal_records(args.user_id)
+    scope = f"user {args.user_id}" if args.user_id is not None else "all users"
+    print(f"Wrote {written} personal record(s) for {scope}.")
+    return 0
+
+
+def cmd_backfill_rollups(args) -> int:
+    written = backfill_volume_rollups(args.user_id)
+    scope = f"user {args.user_id}" if args.user_id is not None else "all users"
+    print(f"Wrote {written} volume rollup row(s) for {scope}.")
+    return 0
+
+
+def cmd_check_stats(args) -> int:
+    drift = check_user_stats(args.user_id, repair=args.repair)
+    for d in drift:
+        what = "missing row" if d.missing else ", ".join(
+            f"{col} {stored} != {expected}" for col, (stored, expected) in d.fields.items()
+        )
+        print(f"user {d.user_id:<8} {what}")
+    scope = f"user {args.user_id}" if args.user_id is not None else "all users"
+    if not drift:
+        print(f"user_stats matches the history for {scope}.")
+        return 0
+    if args.repair:
+        print(f"Repaired {len(drift)} user_stats row(s).")
+        return 0
+    print(f"{len(drift)} user_stats row(s) drifted; rerun with --repair to rebuild them.")
+    return 1
+
+
+def cmd_backfill_exercise_ids(args) -> int:
+    updated = backfill_exercise_ids(batch_size=args.batch_size)
+    print(f"Set exercise_id on {updated} row(s).")
+    return 0
+
+
+def cmd_backfill_weight_kg(args) -> int:
+    updated = backfill_weight_kg(batch_size=args.batch_size)
+    print(f"Set weight_kg on {updated} row(s).")
+    return 0
+
+
+def cmd_export(args) -> int:
+    written = export_to_file(args.user_id, args.format, args.out)
+    print(f"Wrote {written} bytes to {args.out}.")
+    return 0
+
+
+def cmd_export_all(args) -> int:
+    files = total = 0
+    for user_id, path, written in export_all_users(args.format, args.out_dir, args.workers):
+        files += 1
+        total += written
+        print(f"user {user_id:<8} {written:>12} bytes  {path}")
+    print(f"Exported {files} user(s), {total} bytes.")
+    return 0
+
+def _print_progress(report) -> None:
+    r = report.result
+    print(f"\r{report.rows_read} rows read, {r.sessions} sessions, {r.logs} logs", end="", file=sys.stderr)
+
+
+def cmd_import(args) -> int:
+    if get_user_by_id(args.user_id) is None:
+        print(f"No user with id {args.user_id}.", file=sys.stderr)
+        return 1
+    columns = dict(pair.split("=", 1) for pair in args.column)
+    name_map = None
+    if args.map:
+        with open(args.map, newline="", encoding="utf-8-sig") as f:
+            name_map = load_name_map(f)
+    try:
+        report = import_csv(
+            args.user_id, args.file,
+            unit=args.unit, columns=columns, name_map=name_map,
+            dry_run=args.dry_run, batch_size=args.batch_size, progress=_print_progress,
+        )
+    except ImportFileError as e:
+        print(f"Cannot import {args.file}: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+
+    r = report.result
+    verb = "Would import" if report.dry_run else "Imported"
+    print(f"{verb} {r.sessions} session(s) and {r.logs} log(s) "
+          f"from {report.rows_read} row(s), {report.first_date} to {report.last_date}.")
+    if r.duplicates:
+        print(f"Skipped {r.duplicates} session(s) already imported.")
+    if r.new_exercises:
+        print(f"New custom exercise(s): {', '.join(r.new_exercises)}")
+    if report.rows_skipped:
+        print(f"Rejected {report.rows_skipped} row(s):")
+        for issue in report.issues:
+            print(f"  line {issue.line}: {issue.message}")
+        if report.rows_skipped > len(report.issues):
+            print(f"  ... and {report.rows_skipped - len(report.issues)} more")
+    return 0
+
+# ─────────────────────────── entry point ─────────────────────────────
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="manage.py", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_migrate = sub.add_parser("migrate", help="apply pending schema migrations")
+    p_migrate.set_defaults(func=cmd_migrate)
+
+    p_check = sub.add_parser("check-indexes", help="verify hot queries use their indexes")
+    p_check.set_defaults(func=cmd_check_indexes)
+
+    p_replicas = sub.add_parser("check-replicas", help="report read-replica lag and health")
+    p_replicas.set_defaults(func=cmd_check_replicas)
+
+    p_prs = sub.add_parser("backfill-prs", help="rebuild personal_records from workout_logs")
+    p_prs.add_argument("--user-id", type=int, default=None, help="only this user (default: everyone)")
+    p_prs.set_defaults(func=cmd_backfill_prs)
+
+    p_rollups = sub.add_parser("backfill-rollups", help="rebuild volume_rollups from workout_logs")
+    p_rollups.add_argument("--user-id", type=int, default=None, help="only this user (default: everyone)")
+    p_rollups.set_defaults(func=cmd_backfill_rollups)
+
+    p_stats = sub.add_parser("check-stats", help="find (and optionally repair) drift in user_stats")
+    p_stats.add_argument("--user-id", type=int, default=None, help="only this user (default: everyone)")
+    p_stats.add_argument("--repair", action="store_true", help="rebuild the rows that drifted")
+    p_stats.set_defaults(func=cmd_check_stats)
+
+    p_exercise_ids = sub.add_parser("backfill-exercise-ids",
+                                    help="set exercise_id on workouts / logs, one batch per transaction")
+    p_exercise_ids.add_argument("--batch-size", type=int, default=5000, help="rows per transaction")
+    p_exercise_ids.set_defaults(func=cmd_backfill_exercise_ids)
+
+    p_weight_kg = sub.add_parser("backfill-weight-kg",
+                                 help="set weight_kg on workout_logs, one batch per transaction")
+    p_weight_kg.add_argument("--batch-size", type=int, default=5000, help="rows per transaction")
+    p_weight_kg.set_defaults(func=cmd_backfill_weight_kg)
+
+    p_export = sub.add_parser("export", help="export one user's history")
+    p_export.add_argument("--user-id", type=int, required=True)
+    p_export.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    p_export.add_argument("--out", required=True, help="output file")
+    p_export.set_defaults(func=cmd_export)
+
+    p_export_all = sub.add_parser("export-all", help="export every user, one file each")
+    p_export_all.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    p_export_all.add_argument("--out-dir", required=True, help="directory for the per-user files")
+    p_export_all.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                              help="export processes (default: one per CPU)")
+    p_export_all.set_defaults(func=cmd_export_all)
+
+    p_import = sub.add_parser("import", help="import a CSV export from another tracker app")
+    p_import.add_argument("--user-id", type=int, required=True)
+    p_import.add_argument("--file", required=True, help="CSV file (Strong, Hevy, our own export, ...)")
+    p_import.add_argument("--unit", choices=("kg", "lbs"), default=None,
+                          help="unit of weights the file doesn't label (default: the user's preference)")
+    p_import.add_argument("--map", default=None,
+                          help="CSV of 'their name,our name' pairs for exercises the matcher misses")
+    p_import.add_argument("--column", action="append", default=[], metavar="FIELD=HEADER",
+                          help=f"header for one of: {', '.join(COLUMN_ALIASES)} (repeatable)")
+    p_import.add_argument("--dry-run", action="store_true", help="validate and report, write nothing")
+    p_import.add_argument("--batch-size", type=int, default=5000, help="log rows per batch")
+    p_import.set_defaults(func=cmd_import)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
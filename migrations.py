@@ -0,0 +1,371 @@
+"""
+migrations.py — versioned schema migrations.
+
+create_all() only creates tables that don't exist yet; anything that changes
+an existing table (new columns, indexes, backfills) is a numbered Migration
+in MIGRATIONS. run_migrations() applies the pending ones in order and records
+each in the schema_version table. The run holds a Postgres advisory lock,
+so replicas that boot together queue up behind the first one instead of
+racing on DDL, and applies migrations in one transaction — except where a
+migration has online steps. Those can't run inside a transaction (CREATE
+INDEX CONCURRENTLY) or shouldn't (a backfill that commits per batch), so
+everything before them is committed first, they run in autocommit mode,
+and the migration is recorded only once they have finished. A failure
+there re-runs the whole migration next time, so online steps — and the
+regular steps of a migration that has them — must be safe to repeat.
+
+A brand-new database is built at the latest schema by create_all(), so
+every migration is stamped as applied without running. That is also what
+makes SQLite usable for local and test runs: only databases that predate a
+migration ever execute it, and those are Postgres.
+
+Never edit a migration once it has shipped — add a new one.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import inspect, text
+
+# Arbitrary key shared by every process that migrates this database
+_ADVISORY_LOCK_KEY = 7_262_041
+
+# A step is raw SQL, or a callable that receives the open Connection
+Step = str | Callable
+
+
+@dataclass(frozen=True)
+class Migration:
+    version:     int
+    description: str
+    steps:       tuple[Step, ...]
+    online:      tuple[Step, ...] = ()   # run after `steps` commit, on an autocommit connection
+
+
+# ─────────────────────────── data steps ──────────────────────────────
+#
+# database_service imports this module, so data steps import it lazily.
+
+def _seed_exercise_library(conn) -> None:
+    from database_service import seed_exercise_library
+    seed_exercise_library(conn=conn)
+
+
+def _backfill_exercise_ids(conn) -> None:
+    # On the autocommit connection each id batch commits on its own
+    from database_service import backfill_exercise_ids
+    backfill_exercise_ids(conn=conn)
+
+
+def _backfill_weight_kg(conn) -> None:
+    # Like _backfill_exercise_ids: one commit per batch on the autocommit connection
+    from database_service import backfill_weight_kg
+    backfill_weight_kg(conn=conn)
+
+
+def _backfill_session_created_at(conn) -> None:
+    from database_service import backfill_session_created_at
+    backfill_session_created_at(conn=conn)
+
+
+def _build_derived_tables(conn) -> None:
+    """Fill personal_records / volume_rollups from the logs (create_all() made them empty)."""
+    from database_service import (
+        PersonalRecord, VolumeRollup, backfill_personal_records, backfill_volume_rollups,
+    )
+    for model in (PersonalRecord, VolumeRollup):
+        model.__table__.create(conn, checkfirst=True)
+    backfill_personal_records(conn=conn)
+    backfill_volume_rollups(conn=conn)
+
+
+def _concurrent_index(name: str, definition: str) -> Callable:
+    """
+    Online step building an index with CREATE INDEX CONCURRENTLY. A build
+    that was interrupted leaves an invalid index behind, which IF NOT EXISTS
+    would accept; that one is dropped and built again.
+    """
+    def step(conn) -> None:
+        invalid = conn.execute(
+            text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+            {"name": name},
+        ).scalar()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+    return step
+
+
+def _build_user_stats(conn) -> None:
+    from database_service import UserDayCount, UserStats, backfill_user_stats
+    for model in (UserStats, UserDayCount):
+        model.__table__.create(conn, checkfirst=True)
+    backfill_user_stats(conn=conn)
+
+
+# ─────────────────────────── migrations ──────────────────────────────
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "columns added after initial deploy", (
+        "ALTER TABLE workouts ADD COLUMN IF NOT EXISTS plan_day VARCHAR",
+        "ALTER TABLE workouts ADD COLUMN IF NOT EXISTS sort_order INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS ppl_day VARCHAR",
+        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS notes TEXT",
+        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()",
+    )),
+    Migration(2, "covering indexes for hot read paths", (
+        # get_personal_records / get_volume_over_time
+        "CREATE INDEX IF NOT EXISTS ix_workout_logs_user_exercise_weight "
+        "ON workout_logs (user_id, exercise, weight) INCLUDE (session_id, sets, reps, weight_unit)",
+        # selectin loading of a session's logs, and cascade deletes
+        "CREATE INDEX IF NOT EXISTS ix_workout_logs_session_id ON workout_logs (session_id)",
+        # get_sessions / get_recent_sessions_with_logs / get_next_plan_day
+        "CREATE INDEX IF NOT EXISTS ix_workout_sessions_user_date "
+        "ON workout_sessions (user_id, date, created_at) INCLUDE (ppl_day)",
+        # get_next_plan_day / get_plan_by_day
+        "CREATE INDEX IF NOT EXISTS ix_workouts_user_plan_day ON workouts (user_id, plan_day, sort_order)",
+    )),
+    Migration(3, "idempotency keys for log_full_session", (
+        "ALTER TABLE workout_sessions ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_workout_sessions_idempotency_key "
+        "ON workout_sessions (user_id, idempotency_key)",
+    )),
+    # exercises itself is created by create_all(). Nullable columns without
+    # a default are a catalog-only change, so these ALTERs don't rewrite.
+    Migration(4, "exercise_id on workouts and workout_logs", (
+        "ALTER TABLE workouts ADD COLUMN IF NOT EXISTS exercise_id INTEGER REFERENCES exercises (id)",
+        "ALTER TABLE workout_logs ADD COLUMN IF NOT EXISTS exercise_id INTEGER REFERENCES exercises (id)",
+        _seed_exercise_library,
+    )),
+    # Nothing transactional: 4 added the nullable columns. The backfill is
+    # the batched one manage.py backfill-exercise-ids runs, committing per
+    # batch, and the indexes build without blocking writes.
+    Migration(5, "backfill exercise_id and index it", (), online=(
+        _backfill_exercise_ids,
+        _concurrent_index(
+            "ix_workouts_user_exercise_id", "ON workouts (user_id, exercise_id)",
+        ),
+        _concurrent_index(
+            "ix_workout_logs_user_exercise_id_weight",
+            "ON workout_logs (user_id, exercise_id, weight) INCLUDE (session_id, sets, reps, weight_unit)",
+        ),
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_workout_logs_user_exercise_weight",
+    )),
+    # Same shape as 5: the ALTERs are catalog-only, the backfill is the
+    # batched one manage.py backfill-weight-kg runs, and the index swap
+    # doesn't block writes.
+    Migration(6, "canonical weight_kg on workout_logs, preferred display unit", (
+        "ALTER TABLE workout_logs ADD COLUMN IF NOT EXISTS weight_kg DOUBLE PRECISION",
+        "ALTER TABLE user_profiles ADD COLUMN IF NOT EXISTS weight_unit VARCHAR",
+    ), online=(
+        _backfill_weight_kg,
+        _concurrent_index(
+            "ix_workout_logs_user_exercise_id_weight_kg",
+            "ON workout_logs (user_id, exercise_id, weight_kg) INCLUDE (session_id, sets, reps)",
+        ),
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_workout_logs_user_exercise_id_weight",
+    )),
+    # Both tables are keyed on exercise_id and hold kg, so they wait for 5 and 6
+    Migration(7, "backfill personal_records and volume_rollups", (
+        _build_derived_tables,
+    )),
+    # Keyset paging compares (date, created_at, id); a NULL created_at would
+    # drop the row from every page after the first. All online: nothing to
+    # change in the schema, and workout_sessions takes writes throughout
+    Migration(8, "history cursor index on workout_sessions", (), online=(
+        _backfill_session_created_at,
+        _concurrent_index(
+            "ix_workout_sessions_user_history",
+            "ON workout_sessions (user_id, date, created_at, id) INCLUDE (ppl_day)",
+        ),
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_workout_sessions_user_date",
+    )),
+    # create_all() has usually made the (empty) tables already; the step fills them
+    Migration(9, "user_stats dashboard counters and per-day session counts", (
+        _build_user_stats,
+    )),
+]
+
+
+# ─────────────────────────── runner ──────────────────────────────────
+
+def _run_steps(conn, steps: tuple[Step, ...]) -> None:
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            conn.execute(text(step))
+
+
+def run_migrations(engine, metadata=None) -> list[int]:
+    """
+    Create missing tables (if metadata is given) and apply every pending
+    migration, all under the advisory lock. On a fresh database the
+    migrations are only stamped. Returns the versions applied.
+    """
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            # Session-level, so it survives the commits around online steps
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+        try:
+            return _apply_pending(engine, conn, metadata)
+        finally:
+            if postgres:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+                conn.commit()
+
+
+def _apply_pending(engine, conn, metadata) -> list[int]:
+    fresh = not inspect(conn).has_table("users")
+    if metadata is not None:
+        metadata.create_all(conn)
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "  version     INTEGER PRIMARY KEY,"
+        "  description VARCHAR NOT NULL,"
+        "  applied_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+        ")"
+    ))
+    applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+    ran: list[int] = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        if not (fresh and metadata is not None):
+            _run_steps(conn, migration.steps)
+            if migration.online:
+                conn.commit()
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as online:
+                    _run_steps(online, migration.online)
+        conn.execute(
+            text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+            {"v": migration.version, "d": migration.description},
+        )
+        ran.append(migration.version)
+    conn.commit()
+    return ran
+
+
+def current_version(engine) -> int:
+    """Highest applied migration version, or 0 for an unmigrated database."""
+    with engine.connect() as conn:
+        if not engine.dialect.has_table(conn, "schema_version"):
+            return 0
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+# ─────────────────────────── index checks ────────────────────────────
+
+@dataclass(frozen=True)
+class IndexProbe:
+    name:  str    # the database_service function the query comes from
+    sql:   str    # representative shape of that function's hot query
+    index: str    # index the plan is expected to use
+
+
+INDEX_PROBES: list[IndexProbe] = [
+    IndexProbe(
+        "get_personal_records",
+        "SELECT exercise_id, weight_kg, reps, date FROM personal_records WHERE user_id = 0",
+        "personal_records_pkey",
+    ),
+    IndexProbe(
+        "_recompute_personal_record",
+        "SELECT id, weight_kg FROM workout_logs "
+        "WHERE user_id = 0 AND exercise_id = 0 AND weight_kg IS NOT NULL ORDER BY weight_kg DESC LIMIT 1",
+        "ix_workout_logs_user_exercise_id_weight_kg",
+    ),
+    IndexProbe(
+        "get_volume_over_time",
+        "SELECT period_start, volume_kg FROM volume_rollups "
+        "WHERE user_id = 0 AND exercise_id = 0 AND grain = 'week' AND period_start >= '2000-01-01' "
+        "ORDER BY period_start",
+        "volume_rollups_pkey",
+    ),
+    IndexProbe(
+        "get_category_volume_over_time",
+        "SELECT exercise_id, period_start, volume_kg FROM volume_rollups "
+        "WHERE user_id = 0 AND grain = 'week' AND period_start >= '2000-01-01'",
+        "ix_volume_rollups_user_grain_period",
+    ),
+    IndexProbe(
+        "workout_exists",
+        "SELECT 1 FROM workouts WHERE user_id = 0 AND exercise_id = 0",
+        "ix_workouts_user_exercise_id",
+    ),
+    IndexProbe(
+        "_lookup_exercise_ids",
+        "SELECT id FROM exercises WHERE coalesce(user_id, 0) IN (0, 1) AND lower(name) IN ('dip')",
+        "uq_exercises_owner_lower_name",
+    ),
+    IndexProbe(
+        "get_sessions",
+        "SELECT id, date, ppl_day FROM workout_sessions "
+        "WHERE user_id = 0 ORDER BY date DESC, created_at DESC LIMIT 30",
+        "ix_workout_sessions_user_history",
+    ),
+    IndexProbe(
+        "get_session_history",
+        "SELECT id, date, ppl_day FROM workout_sessions "
+        "WHERE user_id = 0 AND (date, created_at, id) < ('2000-01-01', '2000-01-01', 0) "
+        "ORDER BY date DESC, created_at DESC, id DESC LIMIT 21",
+        "ix_workout_sessions_user_history",
+    ),
+    IndexProbe(
+        "get_dashboard_stats",
+        "SELECT total_sessions, streak_days FROM user_stats WHERE user_id = 0",
+        "user_stats_pkey",
+    ),
+    IndexProbe(
+        "get_dashboard_stats",
+        "SELECT ppl_day FROM user_day_counts WHERE user_id = 0 ORDER BY sessions DESC, ppl_day LIMIT 1",
+        "user_day_counts_pkey",
+    ),
+    IndexProbe(
+        "_on_sessions_changed",
+        "SELECT 1 FROM workout_sessions WHERE user_id = 0 AND date = '2000-01-01'",
+        "ix_workout_sessions_user_history",
+    ),
+    IndexProbe(
+        "get_recent_sessions_with_logs",
+        "SELECT id, exercise FROM workout_logs WHERE session_id IN (0, 1, 2)",
+        "ix_workout_logs_session_id",
+    ),
+    IndexProbe(
+        "get_next_plan_day",
+        "SELECT ppl_day FROM workout_sessions WHERE user_id = 0 AND ppl_day IS NOT NULL "
+        "ORDER BY date DESC, created_at DESC LIMIT 1",
+        "ix_workout_sessions_user_history",
+    ),
+    IndexProbe(
+        "get_next_plan_day",
+        "SELECT DISTINCT plan_day FROM workouts "
+        "WHERE user_id = 0 AND plan_day IS NOT NULL ORDER BY plan_day",
+        "ix_workouts_user_plan_day",
+    ),
+]
+
+
+def check_index_usage(engine) -> list[tuple[IndexProbe, bool]]:
+    """
+    EXPLAIN every probe and report whether its plan uses the expected index.
+    Sequential scans are disabled for the check, because on a small dev
+    database the planner would rightly prefer them; what matters here is
+    that the index is *usable* for the query shape. Postgres only.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("check_index_usage needs PostgreSQL")
+    results: list[tuple[IndexProbe, bool]] = []
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for probe in INDEX_PROBES:
+                plan = "\n".join(row[0] for row in conn.execute(text("EXPLAIN " + probe.sql)))
+                results.append((probe, probe.index in plan))
+        finally:
+            trans.rollback()
+    return results
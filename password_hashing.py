@@ -0,0 +1,227 @@
+"""
+password_hashing.py — argon2 hashing off the Streamlit script thread.
+
+Argon2 is deliberately CPU- and memory-hard. Run inline, a burst of logins
+serialises on the script threads and stalls every other session in the
+process. Here every hash / verify is a job on a small process pool:
+
+  * at most `max_pending` jobs may be queued or running; a caller waits up
+    to SUBMIT_TIMEOUT for a slot, then gets HashingUnavailable
+  * a job that takes longer than JOB_TIMEOUT also raises HashingUnavailable
+  * argon2 cost parameters come from Argon2Params: passlib's own defaults
+    (what every existing hash was made with) unless ARGON2_* env vars say
+    otherwise. verify_and_update() returns a fresh hash whenever the stored
+    one was made with other parameters, so setting ARGON2_* is an opt-in
+    upgrade — each user is rehashed, once, at their next login
+
+Set HASH_WORKERS=0 to hash inline (CLIs, one-off scripts).
+hashing_metrics() reports queue depth and latency percentiles for sizing
+workers against login throughput.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+
+SUBMIT_TIMEOUT = 5.0     # seconds to wait for a free slot
+JOB_TIMEOUT    = 10.0    # seconds for a single hash / verify
+_LATENCY_SAMPLES = 1000  # per operation, for the percentiles
+
+
+class HashingUnavailable(RuntimeError):
+    """The hashing pool is saturated or a job timed out — ask the user to retry."""
+
+# ─────────────────────────── parameters ──────────────────────────────
+
+@dataclass(frozen=True)
+class Argon2Params:
+    # Unset, these are passlib's defaults, so existing hashes stay current
+    time_cost:   int = int(os.environ.get("ARGON2_TIME_COST", argon2.default_rounds))
+    memory_cost: int = int(os.environ.get("ARGON2_MEMORY_COST", argon2.memory_cost))   # KiB
+    parallelism: int = int(os.environ.get("ARGON2_PARALLELISM", argon2.parallelism))
+
+
+_contexts: dict[Argon2Params, CryptContext] = {}
+
+
+def _context(params: Argon2Params) -> CryptContext:
+    """One CryptContext per parameter set, built lazily in whichever process needs it."""
+    ctx = _contexts.get(params)
+    if ctx is None:
+        ctx = CryptContext(
+            schemes=["argon2"],
+            deprecated="auto",
+            argon2__time_cost=params.time_cost,
+            argon2__memory_cost=params.memory_cost,
+            argon2__parallelism=params.parallelism,
+        )
+        _contexts[params] = ctx
+    return ctx
+
+# ─────────────────────────── worker jobs ─────────────────────────────
+#
+# Module-level so they pickle into the worker processes.
+
+def _hash_job(password: str, params: Argon2Params) -> str:
+    return _context(params).hash(password)
+
+
+def _verify_job(plain: str, hashed: str, params: Argon2Params) -> tuple[bool, str | None]:
+    return _context(params).verify_and_update(plain, hashed)
+
+# ─────────────────────────── pool ────────────────────────────────────
+
+class _HashingService:
+    def __init__(self, workers: int, max_pending: int, params: Argon2Params):
+        self.workers     = workers
+        self.max_pending = max_pending
+        self.params      = params
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots      = threading.BoundedSemaphore(max_pending)
+        self._lock       = threading.Lock()
+        self._pending    = 0
+        self._peak       = 0
+        self._completed  = 0
+        self._rejected   = 0
+        self._timeouts   = 0
+        self._latency: dict[str, deque] = {
+            "hash":   deque(maxlen=_LATENCY_SAMPLES),
+            "verify": deque(maxlen=_LATENCY_SAMPLES),
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the Streamlit server process is multi-threaded
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, op: str, fn, *args):
+        start = time.perf_counter()
+        if self.workers <= 0:
+            result = fn(*args)
+            self._record(op, start)
+            return result
+
+        if not self._slots.acquire(timeout=SUBMIT_TIMEOUT):
+            with self._lock:
+                self._rejected += 1
+            raise HashingUnavailable("Password hashing is busy — please try again.")
+        with self._lock:
+            self._pending += 1
+            self._peak = max(self._peak, self._pending)
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self.shutdown()
+            raise HashingUnavailable("Password hashing workers restarted — please try again.")
+        # The slot is freed when the job really finishes, even if we time out
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=JOB_TIMEOUT)
+        except FutureTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise HashingUnavailable("Password hashing timed out — please try again.")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise HashingUnavailable("Password hashing workers restarted — please try again.")
+        self._record(op, start)
+        return result
+
+    def _record(self, op: str, start: float) -> None:
+        with self._lock:
+            self._completed += 1
+            self._latency[op].append((time.perf_counter() - start) * 1000)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latency = {op: _percentiles(list(samples)) for op, samples in self._latency.items()}
+            return {
+                "workers":          self.workers,
+                "max_pending":      self.max_pending,
+                "queue_depth":      self._pending,
+                "peak_queue_depth": self._peak,
+                "completed":        self._completed,
+                "rejected":         self._rejected,
+                "timeouts":         self._timeouts,
+                "latency_ms":       latency,
+            }
+
+
+def _percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None}
+    samples.sort()
+
+    def pick(q: float) -> float:
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {"count": len(samples), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+_service = _HashingService(
+    workers=int(os.environ.get("HASH_WORKERS", 2)),
+    max_pending=int(os.environ.get("HASH_MAX_PENDING", 32)),
+    params=Argon2Params(),
+)
+
+
+def configure_hashing(
+    workers: int | None = None,
+    max_pending: int | None = None,
+    params: Argon2Params | None = None,
+) -> None:
+    """Replace the hashing service, e.g. to tune it from a CLI or benchmark."""
+    global _service
+    _service.shutdown()
+    _service = _HashingService(
+        workers=_service.workers if workers is None else workers,
+        max_pending=_service.max_pending if max_pending is None else max_pending,
+        params=params or _service.params,
+    )
+
+# ─────────────────────────── public API ──────────────────────────────
+
+def hash_password(password: str) -> str:
+    return _service.run("hash", _hash_job, password, _service.params)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return verify_and_update(plain, hashed)[0]
+
+
+def verify_and_update(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """
+    Return (valid, new_hash). new_hash is set when the password is valid but
+    `hashed` was made with outdated parameters and should be replaced.
+    """
+    return _service.run("verify", _verify_job, plain, hashed, _service.params)
+
+
+def hashing_metrics() -> dict:
+    return _service.metrics()
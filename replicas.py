@@ -0,0 +1,174 @@
+"""
+replicas.py — read replicas with lag checks and automatic failover.
+
+A ReplicaSet owns one engine per replica URL and hands out the next usable
+one, round-robin. A replica is usable while
+
+  * its replication lag, re-measured every LAG_CHECK_INTERVAL seconds by a
+    background thread, is known and within max_lag, and
+  * it isn't cooling down after a failed connection (mark_down()) or a
+    failed lag check
+
+pick() returns None when no replica is usable; callers then read from the
+primary, so losing every replica degrades to single-database operation
+rather than an outage. pick() only reads the last measurements — a slow or
+hung replica delays the refresh thread, never a request. Until a replica's
+first measurement lands, reads go to the primary.
+
+Lag comes from pg_last_xact_replay_timestamp() on Postgres streaming
+replicas (0 once the replica has replayed everything it received, so an
+idle primary doesn't read as lag). "Everything it received" only means
+caught up while WAL is arriving, so a replica whose WAL receiver isn't
+streaming — disconnected, restarting, or recovering from archive with no
+receive LSN at all — has unknown lag and is skipped. Reading the receiver
+status needs the pg_read_all_stats role (pg_monitor includes it). SQLite has no replication; a read-only
+URL onto the primary's file (sqlite:///file:app.db?mode=ro&uri=true) is a
+lag-free stand-in for local runs.
+"""
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from db_config import create_engine_for
+
+MAX_LAG_SECONDS    = 5.0    # replicas further behind than this are skipped
+LAG_CHECK_INTERVAL = 5.0    # seconds between lag measurements per replica
+DOWN_COOLDOWN      = 30.0   # seconds a failed replica is left alone
+LAG_CHECK_TIMEOUT  = 1.0    # statement timeout for the lag query
+
+# NULL means the lag can't be trusted; the replica is treated as unhealthy
+_PG_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() IS NULL THEN NULL
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+@dataclass(eq=False)
+class Replica:
+    url:        str
+    engine:     Engine
+    sessions:   sessionmaker
+    lag:        float | None = None   # seconds; None until first measured
+    checked_at: float = field(default=float("-inf"))
+    down_until: float = 0.0
+    failures:   int = 0
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+
+def measure_lag(engine: Engine, timeout: float = LAG_CHECK_TIMEOUT) -> float | None:
+    """
+    Replication lag of `engine`'s database in seconds (0 for non-replicating
+    backends), or None when the replica isn't streaming and its lag is unknown.
+    On Postgres the query is cancelled after `timeout` seconds.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            conn.execute(text("SELECT 1"))    # still proves the replica is reachable
+            return 0.0
+        conn.execute(text("SELECT set_config('statement_timeout', :ms, true)"), {"ms": str(int(timeout * 1000))})
+        lag = conn.execute(_PG_LAG_SQL).scalar()
+        return None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    def __init__(
+        self,
+        urls: list[str],
+        max_lag: float = MAX_LAG_SECONDS,
+        check_interval: float = LAG_CHECK_INTERVAL,
+        cooldown: float = DOWN_COOLDOWN,
+        refresh_in_background: bool = True,
+        **engine_kwargs,
+    ):
+        self.max_lag        = max_lag
+        self.check_interval = check_interval
+        self.cooldown       = cooldown
+        self.replicas: list[Replica] = []
+        for url in urls:
+            engine = create_engine_for(url, **engine_kwargs)
+            self.replicas.append(Replica(url, engine, sessionmaker(bind=engine, expire_on_commit=False)))
+        self._order = itertools.cycle(self.replicas)
+        self._lock  = threading.Lock()
+        self._stop  = threading.Event()
+        if refresh_in_background and self.replicas:
+            threading.Thread(target=self._refresh_loop, name="replica-lag", daemon=True).start()
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    @property
+    def urls(self) -> list[str]:
+        return [r.url for r in self.replicas]
+
+    def _usable(self, replica: Replica, now: float) -> bool:
+        return now >= replica.down_until and replica.lag is not None and replica.lag <= self.max_lag
+
+    def _check(self, replica: Replica, now: float) -> None:
+        replica.checked_at = now
+        try:
+            replica.lag = measure_lag(replica.engine)
+        except DBAPIError:
+            self.mark_down(replica)
+
+    def refresh(self) -> None:
+        """Re-measure every replica whose reading is stale and isn't cooling down."""
+        for replica in self.replicas:
+            now = time.monotonic()
+            if now >= replica.down_until and now - replica.checked_at >= self.check_interval:
+                self._check(replica, now)
+
+    def _refresh_loop(self) -> None:
+        while True:
+            self.refresh()
+            if self._stop.wait(self.check_interval):
+                return
+
+    def pick(self) -> Replica | None:
+        """The next usable replica, or None to read from the primary."""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._order)
+            if self._usable(replica, now):
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica) -> None:
+        """Take a replica out of rotation for `cooldown` seconds after a connection failure."""
+        replica.failures  += 1
+        replica.lag        = None
+        replica.down_until = time.monotonic() + self.cooldown
+
+    def status(self) -> list[dict]:
+        """Per-replica lag and health, as of the last measurement."""
+        now = time.monotonic()
+        return [
+            {
+                "replica":  replica.name,
+                "usable":   self._usable(replica, now),
+                "lag_s":    replica.lag,
+                "down_for": max(0.0, replica.down_until - now),
+                "failures": replica.failures,
+            }
+            for replica in self.replicas
+        ]
+
+    def dispose(self) -> None:
+        self._stop.set()
+        for replica in self.replicas:
+            replica.engine.dispose()
@@ -1,3 +1,4 @@
+import bisect
 import datetime
 import json
 from urllib.parse import urlencode
@@ -6,6 +7,11 @@ import requests
 import streamlit as st
 from groq import Groq
 
+import calendar_sync
+from busy_time import BusyTimeProvider, list_calendars
+from calendar_client import CalendarClient, EventResult, new_event_id
+from database_service import clear_calendar_cache
+
 # ─────────────────────────── config ──────────────────────────────────
 
 GOOGLE_CLIENT_ID     = st.secrets["GOOGLE_CLIENT_ID"]
@@ -47,48 +53,32 @@ def exchange_code_for_token(code: str) -> dict:
 
 # ─────────────────────────── Google Calendar ─────────────────────────
 
-def get_calendar_events(access_token: str, days_ahead: int = 7) -> list:
-    now      = datetime.datetime.utcnow()
-    time_min = now.isoformat() + "Z"
-    time_max = (now + datetime.timedelta(days=days_ahead)).isoformat() + "Z"
-
-    resp = requests.get(
-        "https://www.googleapis.com/calendar/v3/calendars/primary/events",
-        headers={"Authorization": f"Bearer {access_token}"},
-        params={
-            "timeMin":      time_min,
-            "timeMax":      time_max,
-            "singleEvents": True,
-            "orderBy":      "startTime",
-        },
-        timeout=10,
-    )
-    resp.raise_for_status()
-    return resp.json().get("items", [])
-
-
-def add_event_to_calendar(access_token: str, event: dict) -> dict:
+def _event_body(event: dict) -> dict:
+    """
+    events.insert body for one plan session. Its id is kept on the session,
+    so pushing the same session again can't create a duplicate.
+    """
     start_dt = f"{event['date']}T{event['start_time']}:00"
     end_dt   = f"{event['date']}T{event['end_time']}:00"
-
-    body = {
+    return {
+        "id":          event.setdefault("event_id", new_event_id()),
         "summary":     event["title"],
         "description": event["description"],
-        "start":       {"dateTime": start_dt, "timeZone": "America/New_York"},
-        "end":         {"dateTime": end_dt,   "timeZone": "America/New_York"},
+        "start":       {"dateTime": start_dt, "timeZone": calendar_sync.TIME_ZONE},
+        "end":         {"dateTime": end_dt,   "timeZone": calendar_sync.TIME_ZONE},
     }
 
-    resp = requests.post(
-        "https://www.googleapis.com/calendar/v3/calendars/primary/events",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type":  "application/json",
-        },
-        data=json.dumps(body),
-        timeout=10,
-    )
-    resp.raise_for_status()
-    return resp.json()
+
+def add_event_to_calendar(access_token: str, event: dict) -> dict:
+    result = CalendarClient(access_token).insert_event(_event_body(event))
+    if not result.ok:
+        raise RuntimeError(result.error)
+    return result.event
+
+
+def add_events_to_calendar(access_token: str, events: list[dict]) -> list[EventResult]:
+    """Push every plan session concurrently over pooled connections; one result per session."""
+    return CalendarClient(access_token).insert_events([_event_body(e) for e in events])
 
 # ─────────────────────────── PPL classification ──────────────────────
 
@@ -170,16 +160,16 @@ _TIME_WINDOWS = {
 
 
 def _parse_event_times(event: dict) -> tuple[datetime.datetime, datetime.datetime] | None:
-    """Return (start, end) as naive datetimes, or None for all-day / unparseable events."""
+    """
+    Return (start, end) as naive wall-clock times in calendar_sync.TIME_ZONE,
+    or None for all-day / unparseable events.
+    """
     try:
         raw_start = event.get("start", {}).get("dateTime")
         raw_end   = event.get("end",   {}).get("dateTime")
         if not raw_start or not raw_end:
             return None   # all-day event — skip
-        # Strip timezone suffix for naive comparison
-        start = datetime.datetime.fromisoformat(raw_start[:19])
-        end   = datetime.datetime.fromisoformat(raw_end[:19])
-        return start, end
+        return calendar_sync.wall_clock(raw_start), calendar_sync.wall_clock(raw_end)
     except Exception:
         return None
 
@@ -188,11 +178,68 @@ WORKOUT_DURATION_MINUTES = 60
 BUFFER_MINUTES = 15
 _TOTAL_BLOCK_MINUTES = BUFFER_MINUTES + WORKOUT_DURATION_MINUTES + BUFFER_MINUTES  # 90
 
+SLOT_STEP_MINUTES     = 30   # spacing of candidate workout start times
+MIN_SLOT_STEP_MINUTES = 5
+
+_FALLBACK_WINDOW = (datetime.time(7, 0), datetime.time(21, 0))
+
+
+class BusyIndex:
+    """
+    Busy intervals sorted and merged once, so "is this block free?" is a
+    bisect over the interval ends instead of a scan of every event. Merged
+    intervals are disjoint, so their ends are sorted too.
+    """
+
+    def __init__(self, intervals: list[tuple[datetime.datetime, datetime.datetime]]):
+        self._starts: list[datetime.datetime] = []
+        self._ends:   list[datetime.datetime] = []
+        for start, end in sorted(i for i in intervals if i[0] < i[1]):
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def _blocker(self, start: datetime.datetime, end: datetime.datetime) -> int | None:
+        """Index of the first merged interval overlapping [start, end), or None."""
+        i = bisect.bisect_right(self._ends, start)    # first interval ending after `start`
+        if i < len(self._starts) and self._starts[i] < end:
+            return i
+        return None
+
+    def is_free(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        return self._blocker(start, end) is None
+
+    def first_free(
+        self,
+        first: datetime.datetime,
+        last: datetime.datetime,
+        length: datetime.timedelta,
+        step: datetime.timedelta,
+    ) -> datetime.datetime | None:
+        """
+        Earliest block start on the grid first, first + step, … up to `last`
+        whose [start, start + length) misses every busy interval. A blocked
+        candidate jumps straight to the first grid point past its blocker, so
+        a day costs one bisect per busy interval in the way, not per candidate.
+        """
+        t = first
+        while t <= last:
+            i = self._blocker(t, t + length)
+            if i is None:
+                return t
+            t += step * -(-(self._ends[i] - t) // step)   # ceil to the grid
+        return None
+
 
 def _slot_is_free(
     date: datetime.date,
     start_time: datetime.time,
-    busy_intervals: list[tuple[datetime.datetime, datetime.datetime]],
+    busy: BusyIndex,
 ) -> bool:
     """
     Return True if the full 90-minute block (15-min buffer + 60-min workout +
@@ -201,68 +248,118 @@ def _slot_is_free(
     """
     block_start = datetime.datetime.combine(date, start_time) - datetime.timedelta(minutes=BUFFER_MINUTES)
     block_end   = block_start + datetime.timedelta(minutes=_TOTAL_BLOCK_MINUTES)
-    for busy_start, busy_end in busy_intervals:
-        if block_start < busy_end and block_end > busy_start:
-            return False
-    return True
+    return busy.is_free(block_start, block_end)
 
 
 def _find_free_slot(
     date: datetime.date,
     preferred_start: datetime.time,
     preferred_end: datetime.time,
-    busy_intervals: list[tuple[datetime.datetime, datetime.datetime]],
+    busy: BusyIndex,
+    step_minutes: int = SLOT_STEP_MINUTES,
 ) -> datetime.time | None:
     """
-    Try every 30-min slot within the preferred window first, then fall back to
-    the full day (7:00–21:00). Each candidate is the workout start time;
-    the 15-min pre-buffer is factored into the free-slot check.
+    Try every step_minutes slot within the preferred window first, then fall
+    back to the full day (7:00–21:00). Each candidate is the workout start
+    time; the 15-min pre-buffer is factored into the free-slot check.
     Returns the workout start time of the first free slot, or None if fully blocked.
     """
-    def _candidates(t_start: datetime.time, t_end: datetime.time):
-        # Earliest candidate must leave room for the pre-buffer
-        earliest = (datetime.datetime.combine(datetime.date.today(), t_start)
-                    + datetime.timedelta(minutes=BUFFER_MINUTES))
-        end = datetime.datetime.combine(datetime.date.today(), t_end)
-        cur = earliest
-        while cur + datetime.timedelta(minutes=WORKOUT_DURATION_MINUTES + BUFFER_MINUTES) <= end:
-            yield cur.time()
-            cur += datetime.timedelta(minutes=30)
-
-    # Preferred window first
-    for slot in _candidates(preferred_start, preferred_end):
-        if _slot_is_free(date, slot, busy_intervals):
-            return slot
-
-    # Full-day fallback
-    for slot in _candidates(datetime.time(7, 0), datetime.time(21, 0)):
-        if _slot_is_free(date, slot, busy_intervals):
-            return slot
-
+    step   = datetime.timedelta(minutes=step_minutes)
+    length = datetime.timedelta(minutes=_TOTAL_BLOCK_MINUTES)
+    for t_start, t_end in ((preferred_start, preferred_end), _FALLBACK_WINDOW):
+        # Blocks start at the window start (the pre-buffer) and must end inside it
+        first = datetime.datetime.combine(date, t_start)
+        last  = datetime.datetime.combine(date, t_end) - length
+        block = busy.first_free(first, last, length, step)
+        if block is not None:
+            return (block + datetime.timedelta(minutes=BUFFER_MINUTES)).time()
     return None   # day is fully blocked
 
 
+MIN_REST_DAYS = 1   # rest days wanted between sessions, relaxed only when they can't fit
+NON_PREFERRED_WEEKDAY_COST = 3.0   # in days of drift from the ideal spacing
+
+_WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _solve_spacing(
+    days: list[int],
+    n: int,
+    min_gap: int,
+    extra_cost: list[float],
+) -> list[int] | None:
+    """
+    Choose n of `days` (ascending day numbers) at least min_gap apart,
+    minimising the total distance of the k-th pick from the k-th of n evenly
+    spaced targets across the span, plus each day's extra_cost. Returns the
+    chosen indices, or None when no n days are min_gap apart.
+
+    Dynamic programming over (pick k, day j). The cheapest predecessor of j
+    is the best of a prefix of the previous row — every day at or before
+    days[j] - min_gap — so a running minimum answers it and the whole solve
+    is O(n × len(days)).
+    """
+    ideal_gap = (days[-1] - days[0]) / (n - 1) if n > 1 else 0.0
+    inf  = float("inf")
+    prev = [abs(d - days[0]) + c for d, c in zip(days, extra_cost)]
+    parents: list[list[int]] = []
+    for k in range(1, n):
+        target = days[0] + ideal_gap * k
+        row    = [inf] * len(days)
+        parent = [-1] * len(days)
+        best, best_i, p = inf, -1, 0
+        for j, d in enumerate(days):
+            while p < j and days[p] <= d - min_gap:
+                if prev[p] < best:
+                    best, best_i = prev[p], p
+                p += 1
+            if best < inf:
+                row[j]    = best + abs(d - target) + extra_cost[j]
+                parent[j] = best_i
+        parents.append(parent)
+        prev = row
+
+    end = min(range(len(days)), key=prev.__getitem__)
+    if prev[end] == inf:
+        return None
+    picks = [end]
+    for parent in reversed(parents):
+        picks.append(parent[picks[-1]])
+    return picks[::-1]
+
+
 def _pick_distributed_dates(
     candidate_dates: list[datetime.date],
     n: int,
-    busy_intervals: list[tuple[datetime.datetime, datetime.datetime]],
+    busy: BusyIndex,
     preferred_start: datetime.time,
     preferred_end: datetime.time,
-) -> list[tuple[datetime.date, datetime.time]]:
+    step_minutes: int = SLOT_STEP_MINUTES,
+    min_rest_days: int = MIN_REST_DAYS,
+    weekday_costs: dict[int, float] | None = None,
+    blackout_dates: set[datetime.date] = frozenset(),
+) -> tuple[list[tuple[datetime.date, datetime.time]], int | None]:
     """
     Pick n dates from candidate_dates such that:
-      1. Every date has a free slot (preferred window or fallback).
-      2. No two sessions are on consecutive days (at least 1 rest day between).
-      3. Sessions are spread as evenly as possible across the window — greedy
-         pick the earliest date that is >= (last_picked + ideal_gap) and not
-         the day after the last pick. If no such date exists before the window
-         runs out, fall back to the next available date with at least 1 rest day.
-    Returns a list of (date, start_time) tuples in chronological order.
+      1. Every date has a free slot (preferred window or fallback) and isn't
+         a blackout date.
+      2. Sessions are at least min_rest_days apart. When that can't fit, the
+         rest requirement is relaxed a day at a time, down to "not the same
+         day" — so a schedule is returned whenever n free days exist.
+      3. Sessions are spread as evenly as possible across the window: the
+         solver minimises each session's distance (in days) from its evenly
+         spaced target, plus weekday_costs[date.weekday()] (0 = Monday) for
+         each session — a cost of 2 trades against two days of drift.
+    Returns the (date, start_time) tuples in chronological order, and the
+    fewest rest days actually left between two sessions — below
+    min_rest_days when it had to be relaxed; None for fewer than two.
     """
     # Build list of free (date, slot) pairs
     free: list[tuple[datetime.date, datetime.time]] = []
     for d in candidate_dates:
-        slot = _find_free_slot(d, preferred_start, preferred_end, busy_intervals)
+        if d in blackout_dates:
+            continue
+        slot = _find_free_slot(d, preferred_start, preferred_end, busy, step_minutes)
         if slot is not None:
             free.append((d, slot))
 
@@ -271,35 +368,16 @@ def _pick_distributed_dates(
             f"Not enough free days found ({len(free)}) to schedule {n} sessions. "
             "Try a longer scheduling window or fewer workout days."
         )
+    if n <= 0:
+        return [], None
 
-    if n == 1:
-        return [free[0]]
-
-    total_span = (free[-1][0] - free[0][0]).days
-    ideal_gap  = total_span / (n - 1) if n > 1 else 2
-
-    # Only enforce the minimum-rest-day rule if it's geometrically possible.
-    # With n sessions in `total_span` days, you need at least (n-1) gap days.
-    # If ideal_gap >= 2 there's room for a rest day between every session.
-    min_gap = 2 if ideal_gap >= 2 else 1   # 1 = just "not the same day"
-
-    chosen = [free[0]]
-
-    for k in range(1, n):
-        last_date = chosen[-1][0]
-        target    = chosen[0][0] + datetime.timedelta(days=round(ideal_gap * k))
-
-        eligible = [f for f in free if f[0] >= last_date + datetime.timedelta(days=min_gap)]
-        if not eligible:
-            # Last resort: just take the next available date after the last pick
-            eligible = [f for f in free if f[0] > last_date]
-        if not eligible:
-            break
-
-        best = min(eligible, key=lambda f: abs((f[0] - target).days))
-        chosen.append(best)
-
-    return chosen
+    days       = [d.toordinal() for d, _ in free]
+    extra_cost = [(weekday_costs or {}).get(d.weekday(), 0.0) for d, _ in free]
+    min_gap    = max(min_rest_days, 0) + 1
+    while (picks := _solve_spacing(days, n, min_gap, extra_cost)) is None:
+        min_gap -= 1   # n distinct free days always fit at min_gap 1
+    rest_days = min((days[b] - days[a] - 1 for a, b in zip(picks, picks[1:])), default=None)
+    return [free[i] for i in picks], rest_days
 
 
 def generate_workout_plan(
@@ -308,11 +386,24 @@ def generate_workout_plan(
     workouts: list,
     split: dict[str, list],
     preferred_time: str = "Evening (17:00–20:00)",
-) -> list[dict]:
+    step_minutes: int = SLOT_STEP_MINUTES,
+    min_rest_days: int = MIN_REST_DAYS,
+    weekday_costs: dict[int, float] | None = None,
+    blackout_dates: set[datetime.date] = frozenset(),
+    busy_provider: BusyTimeProvider | None = None,
+) -> tuple[list[dict], int | None]:
     """
     Deterministically schedule workout_days sessions using Python logic, then
-    use the LLM only to format the description strings.
+    use the LLM only to format the description strings. Candidate start
+    times are step_minutes apart (at least MIN_SLOT_STEP_MINUTES); see
+    _pick_distributed_dates for the rest days, weekday costs and blackouts.
+    Busy time comes from busy_provider (freeBusy) when given, otherwise
+    from the event bodies in `events`. Returns the plan and the fewest rest
+    days it leaves between sessions, which is below min_rest_days when the
+    free days couldn't be spaced that far apart.
     """
+    if step_minutes < MIN_SLOT_STEP_MINUTES:
+        raise ValueError(f"step_minutes must be at least {MIN_SLOT_STEP_MINUTES}, got {step_minutes}")
     today = datetime.date.today()
     days_ahead = st.session_state.get("_scheduler_days_ahead", 30)
     candidate_dates = [
@@ -324,12 +415,19 @@ def generate_workout_plan(
         preferred_time, (datetime.time(17, 0), datetime.time(20, 0))
     )
 
-    # Parse all calendar events into busy intervals once
-    busy_intervals = [t for e in events if (t := _parse_event_times(e)) is not None]
+    # Collect busy time into a merged, sorted interval index once
+    if busy_provider is not None:
+        # Same wall clock as the candidate dates, so the window is exactly their span
+        window_start = datetime.datetime.combine(candidate_dates[0], datetime.time())
+        window_end   = datetime.datetime.combine(candidate_dates[-1], datetime.time()) + datetime.timedelta(days=1)
+        busy = BusyIndex(busy_provider.busy_between(window_start, window_end))
+    else:
+        busy = BusyIndex([t for e in events if (t := _parse_event_times(e)) is not None])
 
     # Pick evenly-spaced dates with free slots
-    chosen = _pick_distributed_dates(
-        candidate_dates, workout_days, busy_intervals, pref_start, pref_end
+    chosen, rest_days = _pick_distributed_dates(
+        candidate_dates, workout_days, busy, pref_start, pref_end, step_minutes,
+        min_rest_days, weekday_costs, blackout_dates,
     )
 
     # Build the plan — use LLM only for exercise description formatting
@@ -352,7 +450,7 @@ def generate_workout_plan(
             "description": "\n".join(description_lines),
         })
 
-    return plan
+    return plan, rest_days
 
 # ─────────────────────────── Streamlit page ──────────────────────────
 
@@ -386,11 +484,31 @@ def _connect_section():
     st.link_button("Connect Google Calendar", get_google_auth_url())
 
 
-def _plan_section(workouts: list):
+def _calendar_picker() -> list[str]:
+    """Which of the user's calendars to schedule around (just the primary if they can't be listed)."""
+    if "google_calendars" not in st.session_state:
+        try:
+            st.session_state.google_calendars = list_calendars(st.session_state.google_token)
+        except Exception:
+            st.session_state.google_calendars = []
+    calendars = st.session_state.google_calendars
+    if len(calendars) < 2:
+        return ["primary"]
+    names = {c["id"]: c["summary"] for c in calendars}
+    return st.multiselect(
+        "Calendars to schedule around", list(names),
+        default=[c["id"] for c in calendars if c["primary"]],
+        format_func=names.get,
+    ) or ["primary"]
+
+
+def _plan_section(user_id: int, workouts: list):
     """Shown when the user is connected and has saved exercises."""
     st.success("Google Calendar connected!")
     if st.button("Disconnect Google Calendar"):
+        clear_calendar_cache(user_id)
         st.session_state.pop("google_token", None)
+        st.session_state.pop("google_calendars", None)
         st.session_state.pop("workout_plan", None)
         st.rerun()
 
@@ -405,22 +523,39 @@ def _plan_section(workouts: list):
         "When do you prefer to work out?",
         ["Morning (6:00–9:00)", "Afternoon (12:00–15:00)", "Evening (17:00–20:00)"],
     )
+    step_minutes = st.selectbox(
+        "Start times every", [30, 15, 10, 5],
+        format_func=lambda x: f"{x} minutes",
+    )
+    min_rest_days = st.selectbox(
+        "Rest days between sessions", [1, 0, 2],
+        format_func=lambda x: f"at least {x}",
+    )
+    preferred_weekdays = st.multiselect(
+        "Preferred weekdays", range(7), default=list(range(7)),
+        format_func=lambda i: _WEEKDAY_NAMES[i],
+    )
+    weekday_costs = {i: NON_PREFERRED_WEEKDAY_COST for i in range(7) if i not in preferred_weekdays}
+    today = datetime.date.today()
+    blackout_dates = set(st.multiselect(
+        "Days you can't train",
+        [today + datetime.timedelta(days=i) for i in range(1, days_ahead + 1)],
+        format_func=lambda d: d.strftime("%a %b %d"),
+    ))
 
     # Derive workout_days from the number of distinct plan days; default to 3
     distinct_days = len(set(w.plan_day for w in workouts if w.plan_day)) or 3
     split = build_ppl_split(workouts, distinct_days)
     workout_days = len(split)
+    calendar_ids = _calendar_picker()
     if st.button("Generate Workout Schedule"):
-        with st.spinner("Fetching your calendar events..."):
+        busy_provider = BusyTimeProvider(st.session_state.google_token, calendar_ids, user_id=user_id)
+        with st.spinner("Checking your calendars and scheduling your sessions..."):
             try:
-                events = get_calendar_events(st.session_state.google_token, days_ahead)
-            except Exception as exc:
-                st.error(f"Failed to fetch calendar: {exc}")
-                return
-
-        with st.spinner("AI is scheduling your sessions..."):
-            try:
-                plan = generate_workout_plan(events, workout_days, workouts, split, preferred_time)
+                plan, rest_days = generate_workout_plan(
+                    [], workout_days, workouts, split, preferred_time, step_minutes,
+                    min_rest_days, weekday_costs, blackout_dates, busy_provider,
+                )
             except json.JSONDecodeError:
                 st.error("The AI returned an unexpected format. Please try again.")
                 return
@@ -430,6 +565,12 @@ def _plan_section(workouts: list):
 
         st.session_state.workout_plan = plan
         st.success(f"Scheduled {len(plan)} session(s)!")
+        if rest_days is not None and rest_days < min_rest_days:
+            st.warning(
+                f"Not enough free days for {min_rest_days} rest day(s) between every session — "
+                f"some are only {rest_days} apart. Schedule further ahead or free up more days "
+                "to get the full rest."
+            )
 
     _render_plan()
 
@@ -571,15 +712,18 @@ def _render_plan():
 
     st.markdown("---")
     if st.button("Add All to Google Calendar"):
-        success = 0
-        for session in plan:
-            try:
-                add_event_to_calendar(st.session_state.google_token, session)
-                success += 1
-            except Exception as exc:
-                st.error(f"Failed to add '{session['title']}': {exc}")
-        if success:
-            st.success(f"Added {success} workout session(s) to your Google Calendar!")
+        with st.spinner("Adding sessions to Google Calendar..."):
+            results = add_events_to_calendar(st.session_state.google_token, plan)
+        failed = [plan[r.index] for r in results if not r.ok]
+        for r in results:
+            if not r.ok:
+                st.error(f"Failed to add '{plan[r.index]['title']}': {r.error}")
+        if len(failed) < len(plan):
+            st.success(f"Added {len(plan) - len(failed)} workout session(s) to your Google Calendar!")
+        if failed:
+            # Keep only what didn't go in, so the button retries just those
+            st.session_state.workout_plan = failed
+        else:
             st.session_state.pop("workout_plan", None)
 
 
@@ -596,4 +740,4 @@ def scheduler_page(user_id: int, workouts: list):
         st.warning("No saved exercises yet. Add some in 'Add New Workout' first.")
         return
 
-    _plan_section(workouts)
\ No newline at end of file
+    _plan_section(user_id, workouts)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Shared fixtures. Every test gets a fresh in-memory SQLite database, built
+the way a first run builds it (create_all, migrations stamped), and
+passwords hash inline instead of in the worker pool. Google Calendar is
+an in-memory stand-in handed to the code as its HTTP session.
+"""
+
+import datetime
+import json
+import os
+from urllib.parse import unquote
+
+os.environ.setdefault("HASH_WORKERS", "0")
+
+import pytest
+import requests
+
+import database_service as ds
+
+
+@pytest.fixture
+def db():
+    ds.configure("sqlite://")
+    yield ds
+    ds.clear_read_cache()
+
+
+@pytest.fixture
+def user_id(db) -> int:
+    return db.create_user("lifter", "lifter@example.com", "correct horse battery").id
+
+
+# ─────────────────────────── Calendar API stand-in ───────────────────
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict | None = None, headers: dict | None = None):
+        self.status_code = status_code
+        self._body       = body if body is not None else {}
+        self.headers     = headers or {}
+        self.reason      = "fake"
+        self.text        = json.dumps(self._body)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> dict:
+        return self._body
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+
+def _moment(raw: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+
+
+class FakeCalendarAPI:
+    """
+    In-memory Google Calendar, passed to the code under test as its `http`
+    session: events.list with paging and sync tokens, freeBusy.query, and
+    events.insert answered from a script of responses.
+    """
+
+    def __init__(self, page_size: int = 2):
+        self.page_size   = page_size
+        self.calendars: dict[str, dict[str, dict]] = {}
+        self.changes:   list[tuple[str, str]] = []   # (calendar id, event id), in change order
+        self.expired:   set[str] = set()             # sync tokens answered with 410
+        self.free_busy_errors: set[str] = set()      # calendars freeBusy reports an error for
+        self.inserts:   list = []                    # scripted events.insert answers: status or exception
+        self.requests:  list[tuple[str, str, dict]] = []
+
+    def put(self, calendar_id: str, event_id: str, start: str, end: str, status: str = "confirmed") -> None:
+        key = "date" if len(start) == 10 else "dateTime"
+        self.calendars.setdefault(calendar_id, {})[event_id] = {
+            "id": event_id, "status": status, "summary": event_id,
+            "start": {key: start}, "end": {key: end},
+        }
+        self.changes.append((calendar_id, event_id))
+
+    def cancel(self, calendar_id: str, event_id: str) -> None:
+        self.calendars[calendar_id][event_id]["status"] = "cancelled"
+        self.changes.append((calendar_id, event_id))
+
+    def _timed(self, calendar_id: str, time_min: str, time_max: str | None) -> list[dict]:
+        lo, hi = _moment(time_min), _moment(time_max) if time_max else None
+        return [
+            e for e in self.calendars.get(calendar_id, {}).values()
+            if e["status"] != "cancelled" and "dateTime" in e["start"]
+            and _moment(e["end"]["dateTime"]) > lo and (hi is None or _moment(e["start"]["dateTime"]) < hi)
+        ]
+
+    def get(self, url: str, headers=None, params=None, timeout=None) -> FakeResponse:
+        params = dict(params or {})
+        self.requests.append(("GET", url, params))
+        calendar_id = unquote(url.split("/calendars/")[1].split("/")[0])
+        if "syncToken" in params:
+            if params["syncToken"] in self.expired:
+                return FakeResponse(410, {"error": {"code": 410, "message": "Sync token is no longer valid"}})
+            seen = int(params["syncToken"].removeprefix("tok"))
+            ids  = dict.fromkeys(e for c, e in self.changes[seen:] if c == calendar_id)
+            items = [self.calendars[calendar_id][e] for e in ids]
+        else:
+            items = [
+                e for e in self.calendars.get(calendar_id, {}).values()
+                if e["status"] != "cancelled"
+                and ("date" in e["start"] or e in self._timed(calendar_id, params["timeMin"], params.get("timeMax")))
+            ]
+        offset = int(params.get("pageToken", 0))
+        body   = {"items": items[offset:offset + self.page_size]}
+        if offset + self.page_size < len(items):
+            body["nextPageToken"] = str(offset + self.page_size)
+        else:
+            body["nextSyncToken"] = f"tok{len(self.changes)}"
+        return FakeResponse(200, body)
+
+    def post(self, url: str, headers=None, json=None, timeout=None) -> FakeResponse:
+        self.requests.append(("POST", url, json))
+        if url.endswith("/freeBusy"):
+            calendars = {}
+            for item in json["items"]:
+                if item["id"] in self.free_busy_errors:
+                    calendars[item["id"]] = {"errors": [{"domain": "global", "reason": "notFound"}]}
+                    continue
+                # freeBusy answers in UTC, unlike the events' own offsets
+                calendars[item["id"]] = {"busy": [
+                    {
+                        "start": _moment(e["start"]["dateTime"]).astimezone(datetime.timezone.utc).isoformat(),
+                        "end":   _moment(e["end"]["dateTime"]).astimezone(datetime.timezone.utc).isoformat(),
+                    }
+                    for e in self._timed(item["id"], json["timeMin"], json["timeMax"])
+                ]}
+            return FakeResponse(200, {"calendars": calendars})
+        answer = self.inserts.pop(0) if self.inserts else 200
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, FakeResponse):
+            return answer
+        return FakeResponse(answer, {**json, "status": "confirmed"} if answer < 400 else {"error": {"message": "fake"}})
+
+
+@pytest.fixture
+def calendar_api() -> FakeCalendarAPI:
+    return FakeCalendarAPI()
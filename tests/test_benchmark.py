@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+import benchmark
+import database_service as ds
+
+
+def _count(model) -> int:
+    with ds.get_engine().connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def _result(p95: float, statements: float = 2) -> dict:
+    return {"p50_ms": p95 / 2, "p95_ms": p95, "p99_ms": p95, "mean_ms": p95 / 2, "statements_per_call": statements}
+
+
+def test_seed_fills_every_table_consistently(db):
+    counts = benchmark.seed(users=6, years=0.5, rng_seed=3, progress=False)
+
+    assert counts["users"] == _count(ds.User) == 6
+    assert counts["sessions"] == _count(ds.WorkoutSession) > 0
+    assert counts["logs"] == _count(ds.WorkoutLog) > 0
+    assert counts["plan_rows"] == _count(ds.Workout)
+    assert ds.check_user_stats() == []
+    with ds.get_engine().connect() as conn:
+        assert conn.execute(select(func.count()).where(ds.WorkoutLog.exercise_id.is_(None))).scalar() == 0
+    assert _count(ds.PersonalRecord) > 0 and _count(ds.VolumeRollup) > 0
+
+
+def test_seed_is_deterministic(db):
+    first = benchmark.seed(users=4, years=0.5, rng_seed=9, progress=False)
+    ds.configure("sqlite://")
+
+    assert benchmark.seed(users=4, years=0.5, rng_seed=9, progress=False) == first
+
+
+def test_run_times_every_case(db):
+    benchmark.seed(users=3, years=0.3, progress=False)
+
+    results = benchmark.run(iterations=2, sample_users=3)
+
+    assert set(results) == {case.name for case in benchmark.CASES}
+    for stats in results.values():
+        assert stats["iterations"] == 2 and stats["statements_per_call"] >= 1
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert results["get_dashboard_stats"]["statements_max"] == 1
+
+
+def test_run_can_skip_writes_or_pick_functions(db):
+    benchmark.seed(users=2, years=0.3, progress=False)
+
+    assert not {c.name for c in benchmark.CASES if c.write} & set(benchmark.run(1, 2, skip_writes=True))
+    assert set(benchmark.run(1, 2, only=["get_sessions"])) == {"get_sessions"}
+
+
+def test_run_needs_a_seeded_database(db):
+    with pytest.raises(SystemExit, match="seed"):
+        benchmark.run(iterations=1, sample_users=1)
+
+
+def test_compare_flags_slowdowns_and_extra_statements():
+    baseline = {"results": {"a": _result(10), "b": _result(0.2), "c": _result(10), "d": _result(10)}}
+    current  = {"results": {"a": _result(13), "b": _result(0.6), "c": _result(10, 3), "d": _result(5), "e": _result(1)}}
+
+    lines = {line.split()[1]: line for line in benchmark.compare(baseline, current, threshold=0.2)}
+
+    assert lines["a"].startswith("REGRESSION")
+    assert lines["b"].startswith("ok")           # tripled, but under a millisecond
+    assert lines["c"].startswith("REGRESSION")   # one more statement per call
+    assert lines["d"].startswith("faster")
+    assert lines["e"].startswith("new")
+
+
+def test_compare_command_exit_code(tmp_path):
+    paths = {}
+    for name, p95 in (("base", 10), ("same", 10.5), ("slow", 20)):
+        paths[name] = tmp_path / f"{name}.json"
+        paths[name].write_text(json.dumps({"results": {"get_sessions": _result(p95)}}))
+
+    assert benchmark.main(["compare", str(paths["base"]), str(paths["same"])]) == 0
+    assert benchmark.main(["compare", str(paths["base"]), str(paths["slow"])]) == 1
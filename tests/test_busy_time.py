@@ -0,0 +1,89 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import calendar_sync
+from busy_time import BusyTimeProvider
+
+API     = "https://calendar.test/calendar/v3"
+UTC     = datetime.timezone.utc
+BERLIN  = ZoneInfo("Europe/Berlin")
+WALL    = ZoneInfo(calendar_sync.TIME_ZONE)
+DAY     = datetime.date.today() + datetime.timedelta(days=10)
+WINDOW  = (
+    datetime.datetime.combine(DAY - datetime.timedelta(days=1), datetime.time()),
+    datetime.datetime.combine(DAY + datetime.timedelta(days=2), datetime.time()),
+)
+
+
+def _utc(hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime.combine(DAY, datetime.time(hour, minute), tzinfo=UTC)
+
+
+def _wall(moment: datetime.datetime) -> datetime.datetime:
+    return moment.astimezone(WALL).replace(tzinfo=None)
+
+
+@pytest.fixture
+def busy_calendar(calendar_api):
+    # 03:30 UTC is the previous evening in New York: the UTC date and the
+    # wall-clock date differ, and each event comes in a different offset
+    calendar_api.put("primary", "late", _utc(3, 30).isoformat().replace("+00:00", "Z"), _utc(4, 30).isoformat())
+    calendar_api.put("primary", "berlin", _utc(11).astimezone(BERLIN).isoformat(), _utc(12).astimezone(BERLIN).isoformat())
+    calendar_api.put("primary", "local", _utc(22).astimezone(WALL).isoformat(), _utc(23, 15).astimezone(WALL).isoformat())
+    calendar_api.put("primary", "holiday", DAY.isoformat(), (DAY + datetime.timedelta(days=1)).isoformat())
+    return calendar_api
+
+
+EXPECTED = sorted([
+    (_wall(_utc(3, 30)), _wall(_utc(4, 30))),
+    (_wall(_utc(11)),    _wall(_utc(12))),
+    (_wall(_utc(22)),    _wall(_utc(23, 15))),
+])
+
+
+def test_free_busy_converts_to_wall_clock(db, busy_calendar):
+    provider = BusyTimeProvider("T", ["primary"], api_base=API, http=busy_calendar)
+
+    assert sorted(provider.busy_between(*WINDOW)) == EXPECTED
+    assert provider.sources == {"primary": "freeBusy"}
+
+
+def test_free_busy_window_carries_the_zone_offset(db, busy_calendar):
+    BusyTimeProvider("T", ["primary"], api_base=API, http=busy_calendar).busy_between(*WINDOW)
+
+    _, _, body = busy_calendar.requests[-1]
+    assert body["timeZone"] == calendar_sync.TIME_ZONE
+    assert body["timeMin"] == WINDOW[0].replace(tzinfo=WALL).isoformat()
+    assert not body["timeMax"].endswith("Z")
+
+
+def test_event_list_fallback_agrees_with_free_busy(db, busy_calendar):
+    busy_calendar.free_busy_errors.add("primary")
+    provider = BusyTimeProvider("T", ["primary"], api_base=API, http=busy_calendar)
+
+    assert sorted(provider.busy_between(*WINDOW)) == EXPECTED
+    assert provider.sources == {"primary": "events"}
+
+
+def test_cached_fallback_agrees_with_free_busy(db, user_id, busy_calendar):
+    busy_calendar.free_busy_errors.add("primary")
+    provider = BusyTimeProvider("T", ["primary"], user_id=user_id, api_base=API, http=busy_calendar)
+
+    assert sorted(provider.busy_between(*WINDOW)) == EXPECTED
+    assert provider.sources == {"primary": "events"}
+
+
+def test_other_time_zones_convert_both_paths(db, busy_calendar):
+    tokyo = ZoneInfo("Asia/Tokyo")
+    expected = sorted((a.replace(tzinfo=WALL).astimezone(tokyo).replace(tzinfo=None),
+                       b.replace(tzinfo=WALL).astimezone(tokyo).replace(tzinfo=None)) for a, b in EXPECTED)
+    window = tuple(
+        m.replace(tzinfo=WALL).astimezone(tokyo).replace(tzinfo=None) for m in WINDOW
+    )
+    provider = BusyTimeProvider("T", ["primary"], api_base=API, http=busy_calendar, time_zone="Asia/Tokyo")
+    assert sorted(provider.busy_between(*window)) == expected
+
+    busy_calendar.free_busy_errors.add("primary")
+    assert sorted(provider.busy_between(*window)) == expected
@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import calendar_client
+from calendar_client import CalendarAPIError, CalendarClient
+from conftest import FakeResponse
+
+API = "https://calendar.test/calendar/v3"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(calendar_client, "BACKOFF_BASE", 0)
+    monkeypatch.setattr(calendar_client, "BACKOFF_MAX", 0)
+
+
+def _client(api, **kwargs) -> CalendarClient:
+    return CalendarClient("T", api_base=API, http=api, max_attempts=3, **kwargs)
+
+
+def _body(summary: str = "Push") -> dict:
+    return {"summary": summary, "start": {"dateTime": "2030-01-07T07:00:00-05:00"}}
+
+
+def _inserts(api) -> list[dict]:
+    return [body for method, url, body in api.requests if method == "POST" and url.endswith("/events")]
+
+
+def test_insert_adds_an_id_and_returns_the_event(calendar_api):
+    result = _client(calendar_api).insert_event(_body())
+
+    assert result.ok and result.attempts == 1
+    assert result.event["summary"] == "Push"
+    assert len(result.event["id"]) >= 5
+
+
+def test_conflict_counts_as_success(calendar_api):
+    calendar_api.inserts = [503, 409]
+    body = _body()
+
+    result = _client(calendar_api).insert_event(body)
+
+    assert result.ok and result.attempts == 2
+    assert result.event == {**body, "status": "confirmed"}
+    assert {b["id"] for b in _inserts(calendar_api)} == {body["id"]}   # the retry reused the id
+
+
+def test_rate_limits_are_retried(calendar_api):
+    rate_limited = FakeResponse(403, {"error": {"message": "slow down", "errors": [{"reason": "rateLimitExceeded"}]}})
+    calendar_api.inserts = [429, rate_limited, 200]
+
+    result = _client(calendar_api).insert_event(_body())
+
+    assert result.ok and result.attempts == 3
+
+
+def test_server_errors_exhaust_the_attempts(calendar_api):
+    calendar_api.inserts = [500, 502, 503, 200]
+
+    result = _client(calendar_api).insert_event(_body())
+
+    assert not result.ok and result.attempts == 3
+    assert result.error.startswith("503")
+    assert len(_inserts(calendar_api)) == 3
+
+
+def test_client_errors_are_not_retried(calendar_api):
+    calendar_api.inserts = [400, 200]
+
+    result = _client(calendar_api).insert_event(_body())
+
+    assert not result.ok and result.attempts == 1
+    assert result.error.startswith("400")
+
+
+def test_permission_errors_are_not_retried(calendar_api):
+    calendar_api.inserts = [FakeResponse(403, {"error": {"message": "forbidden", "errors": [{"reason": "forbidden"}]}})]
+
+    result = _client(calendar_api).insert_event(_body())
+
+    assert not result.ok and result.attempts == 1
+
+
+def test_connection_errors_are_retried(calendar_api):
+    calendar_api.inserts = [requests.ConnectionError("reset"), requests.Timeout("slow"), 200]
+
+    result = _client(calendar_api).insert_event(_body())
+
+    assert result.ok and result.attempts == 3
+
+
+def test_insert_events_reports_each_event_in_order(calendar_api):
+    calendar_api.inserts = [200, 400, 200]
+    bodies = [_body(f"day {i}") for i in range(3)]
+
+    results = _client(calendar_api, max_workers=1).insert_events(bodies)
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.ok for r in results] == [True, False, True]
+    assert [r.event["summary"] for r in results if r.ok] == ["day 0", "day 2"]
+
+
+def test_insert_events_across_threads(calendar_api):
+    bodies = [_body(f"day {i}") for i in range(6)]
+
+    results = _client(calendar_api, max_workers=4).insert_events(bodies)
+
+    assert [r.event["summary"] for r in results] == [f"day {i}" for i in range(6)]
+    assert _client(calendar_api).insert_events([]) == []
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(calendar_client, "BACKOFF_MAX", 8.0)
+    state = SimpleNamespace(
+        attempt_number=1,
+        outcome=SimpleNamespace(exception=lambda: CalendarAPIError(429, "slow down", retry_after=3)),
+    )
+    assert calendar_client._backoff(state) == 3
+
+    response = FakeResponse(429, {"error": {"message": "slow down"}}, headers={"Retry-After": "120"})
+    state.outcome = SimpleNamespace(exception=lambda: calendar_client._error_from(response))
+    assert calendar_client._backoff(state) == 8.0   # capped at BACKOFF_MAX
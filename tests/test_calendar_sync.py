@@ -0,0 +1,129 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+import requests
+
+import calendar_sync
+import database_service as ds
+from conftest import FakeResponse
+
+API = "https://calendar.test/calendar/v3"
+DAY = datetime.date.today() + datetime.timedelta(days=2)
+
+
+def _at(hour: int) -> str:
+    """DAY at `hour`, wall clock in calendar_sync.TIME_ZONE, as RFC 3339."""
+    return calendar_sync.rfc3339(datetime.datetime.combine(DAY, datetime.time(hour)))
+
+
+def _put(api, event_id: str, hour: int) -> None:
+    api.put("primary", event_id, _at(hour), _at(hour + 1))
+
+
+def _sync(user_id: int, api) -> calendar_sync.SyncResult:
+    return calendar_sync.sync_calendar(user_id, "T", api_base=API, http=api)
+
+
+def _cached(user_id: int) -> dict[str, int]:
+    rows = ds.get_calendar_events_between(
+        user_id, "primary",
+        datetime.datetime.combine(DAY, datetime.time()),
+        datetime.datetime.combine(DAY + datetime.timedelta(days=1), datetime.time()),
+    )
+    return {r.event_id: r.start_at.hour for r in rows}
+
+
+def _list_params(api) -> list[dict]:
+    return [params for method, _, params in api.requests if method == "GET"]
+
+
+def test_full_sync_follows_every_page(db, user_id, calendar_api):
+    for hour in range(8, 13):
+        _put(calendar_api, f"e{hour}", hour)
+
+    result = _sync(user_id, calendar_api)
+
+    assert (result.full, result.pages, result.upserted, result.deleted) == (True, 3, 5, 0)
+    assert _cached(user_id) == {f"e{h}": h for h in range(8, 13)}
+    assert [p.get("pageToken") for p in _list_params(calendar_api)] == [None, "2", "4"]
+    assert ds.get_calendar_sync_token(user_id, "primary") == "tok5"
+
+
+def test_incremental_sync_sends_the_token_and_applies_changes(db, user_id, calendar_api):
+    _put(calendar_api, "stays", 8)
+    _put(calendar_api, "moves", 9)
+    _put(calendar_api, "goes", 10)
+    _sync(user_id, calendar_api)
+
+    _put(calendar_api, "moves", 14)
+    calendar_api.cancel("primary", "goes")
+    _put(calendar_api, "new", 16)
+    result = _sync(user_id, calendar_api)
+
+    params = _list_params(calendar_api)[-2]
+    assert params["syncToken"] == "tok3" and "timeMin" not in params
+    assert (result.full, result.upserted, result.deleted) == (False, 2, 1)
+    assert _cached(user_id) == {"stays": 8, "moves": 14, "new": 16}
+    assert ds.get_calendar_sync_token(user_id, "primary") == "tok6"
+
+
+def test_expired_token_rebuilds_the_cache(db, user_id, calendar_api):
+    _put(calendar_api, "old", 8)
+    _sync(user_id, calendar_api)
+    calendar_api.cancel("primary", "old")
+    _put(calendar_api, "new", 11)
+    calendar_api.expired.add("tok1")
+
+    result = _sync(user_id, calendar_api)
+
+    assert result.full
+    assert [p.get("syncToken") for p in _list_params(calendar_api)[-2:]] == ["tok1", None]
+    assert _cached(user_id) == {"new": 11}
+    assert ds.get_calendar_sync_token(user_id, "primary") == "tok3"
+
+
+def test_failed_page_stores_nothing(db, user_id, calendar_api):
+    _put(calendar_api, "a", 8)
+    _sync(user_id, calendar_api)
+    for hour in range(9, 13):
+        _put(calendar_api, f"e{hour}", hour)
+
+    fetch = calendar_api.get
+    def second_page_fails(url, headers=None, params=None, timeout=None):
+        if params and params.get("pageToken"):
+            return FakeResponse(503)
+        return fetch(url, headers, params, timeout)
+    calendar_api.get = second_page_fails
+
+    with pytest.raises(requests.HTTPError):
+        _sync(user_id, calendar_api)
+    assert _cached(user_id) == {"a": 8}
+    assert ds.get_calendar_sync_token(user_id, "primary") == "tok1"
+
+
+def test_event_times_are_stored_as_wall_clock(db, user_id, calendar_api):
+    # 15:00 UTC is 10:00 or 11:00 in New York, depending on DST
+    utc = datetime.datetime.combine(DAY, datetime.time(15), tzinfo=datetime.timezone.utc)
+    calendar_api.put("primary", "utc", utc.isoformat().replace("+00:00", "Z"),
+                     (utc + datetime.timedelta(hours=1)).isoformat())
+    _sync(user_id, calendar_api)
+
+    assert _cached(user_id) == {"utc": utc.astimezone(ZoneInfo(calendar_sync.TIME_ZONE)).hour}
+
+
+def test_get_events_answers_from_the_cache(db, user_id, calendar_api):
+    _put(calendar_api, "soon", 9)
+    calendar_api.put("primary", "holiday", DAY.isoformat(), (DAY + datetime.timedelta(days=1)).isoformat())
+    calendar_api.put(
+        "primary", "later",
+        calendar_sync.rfc3339(datetime.datetime.combine(DAY + datetime.timedelta(days=30), datetime.time(9))),
+        calendar_sync.rfc3339(datetime.datetime.combine(DAY + datetime.timedelta(days=30), datetime.time(10))),
+    )
+
+    events = calendar_sync.get_events(user_id, "T", days_ahead=7, api_base=API, http=calendar_api)
+
+    by_id = {e["id"]: e for e in events}
+    assert set(by_id) == {"soon", "holiday"}
+    assert by_id["soon"]["start"] == {"dateTime": _at(9), "timeZone": calendar_sync.TIME_ZONE}
+    assert by_id["holiday"]["start"] == {"date": DAY.isoformat()}
@@ -0,0 +1,82 @@
+import datetime
+import random
+
+import database_service as ds
+
+TODAY = datetime.date.today()
+
+
+def _on(user_id: int, days_ago: int, *exercises: str) -> ds.SessionRow:
+    return ds.log_full_session(
+        user_id, {"date": TODAY - datetime.timedelta(days=days_ago), "ppl_day": "Push"},
+        [{"exercise": name, "sets": 3, "reps": 5, "weight": 50} for name in exercises],
+    )
+
+
+def _this_week(days_ago: int) -> bool:
+    return ds._same_week(TODAY - datetime.timedelta(days=days_ago), TODAY)
+
+
+def test_new_user_has_empty_stats(db, user_id):
+    assert ds.get_dashboard_stats(user_id) == ds.DashboardStats(
+        total_sessions=0, sessions_this_week=0, current_streak=0, total_exercises=0, favourite_day=None,
+    )
+
+
+def test_streak_counts_consecutive_days_ending_today_or_yesterday(db, user_id):
+    for days_ago in (5, 3, 2, 1, 1):
+        _on(user_id, days_ago, "Dip")
+
+    assert ds.get_dashboard_stats(user_id).current_streak == 3   # two sessions one day count once
+
+
+def test_streak_lapses_after_a_missed_day(db, user_id):
+    _on(user_id, 3, "Dip")
+    _on(user_id, 2, "Dip")
+
+    assert ds.get_dashboard_stats(user_id).current_streak == 0
+
+
+def test_filling_a_gap_joins_two_runs(db, user_id):
+    for days_ago in (5, 4, 2, 1):
+        _on(user_id, days_ago, "Dip")
+    assert ds.get_dashboard_stats(user_id).current_streak == 2
+
+    _on(user_id, 3, "Dip")
+
+    assert ds.get_dashboard_stats(user_id).current_streak == 5
+
+
+def test_week_sessions_and_distinct_exercises(db, user_id):
+    days = (0, 1, 6, 8)
+    for days_ago in days:
+        _on(user_id, days_ago, "Dip", "Barbell Bench Press")
+    _on(user_id, 0, "dip")                       # same exercise, other case
+
+    stats = ds.get_dashboard_stats(user_id)
+    assert stats.total_sessions == 5
+    assert stats.sessions_this_week == 1 + sum(_this_week(d) for d in days)
+    assert stats.total_exercises == 2
+
+
+def test_deleting_today_shortens_the_streak(db, user_id):
+    _on(user_id, 1, "Dip")
+    today = _on(user_id, 0, "Dip")
+
+    ds.delete_session(user_id, today.id)
+
+    stats = ds.get_dashboard_stats(user_id)
+    assert (stats.total_sessions, stats.current_streak) == (1, 1)
+
+
+def test_counters_match_a_recount_after_random_writes(db, user_id):
+    rng = random.Random(11)
+    sessions = []
+    for _ in range(60):
+        if sessions and rng.random() < 0.3:
+            ds.delete_session(user_id, sessions.pop(rng.randrange(len(sessions))).id)
+        else:
+            sessions.append(_on(user_id, rng.randrange(0, 20), "Dip"))
+
+    assert ds.check_user_stats(user_id) == []
+    assert ds.get_dashboard_stats(user_id).total_sessions == len(sessions)
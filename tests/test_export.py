@@ -0,0 +1,79 @@
+import csv
+import datetime
+import io
+import json
+
+import pyarrow.parquet as pq
+import pytest
+
+import database_service as ds
+import export
+
+DAY = datetime.date.today() - datetime.timedelta(days=3)
+
+
+@pytest.fixture
+def history(db, user_id):
+    ds.log_full_session(user_id, {"date": DAY, "ppl_day": "Push", "notes": "felt strong"}, [
+        {"exercise": "Barbell Bench Press", "sets": 3, "reps": 5, "weight": 100, "weight_unit": "kg"},
+        {"exercise": "Dip", "sets": 3, "reps": 10, "weight": None, "weight_unit": None},
+    ])
+    ds.log_full_session(user_id, {"date": DAY + datetime.timedelta(days=1), "ppl_day": "Pull"}, [])
+    return user_id
+
+
+def _rows(user_id: int) -> list[dict]:
+    return [dict(zip(ds.EXPORT_COLUMNS, row)) for batch in ds.iter_history_rows(user_id) for row in batch]
+
+
+def test_csv_round_trip(history, tmp_path):
+    path = tmp_path / "h.csv"
+
+    written = export.export_to_file(history, "csv", str(path), batch_size=1)
+
+    assert written == path.stat().st_size
+    rows = list(csv.DictReader(io.StringIO(path.read_text())))
+    assert [r["exercise"] for r in rows] == ["Barbell Bench Press", "Dip", ""]
+    assert rows[0]["weight_kg"] == "100.0" and rows[0]["notes"] == "felt strong"
+    assert [r["date"] for r in rows] == [str(r["date"]) for r in _rows(history)]
+
+
+def test_jsonl_round_trip(history, tmp_path):
+    path = tmp_path / "h.jsonl"
+
+    export.export_to_file(history, "jsonl", str(path), batch_size=2)
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert rows == [{**r, "date": str(r["date"])} for r in _rows(history)]
+
+
+def test_parquet_round_trip(history, tmp_path):
+    path = tmp_path / "h.parquet"
+
+    export.export_to_file(history, "parquet", str(path), batch_size=2)
+
+    table = pq.read_table(path)
+    assert table.column_names == list(ds.EXPORT_COLUMNS)
+    assert table.num_rows == 3
+    assert pq.ParquetFile(path).num_row_groups == 2   # one per batch
+    assert table.to_pylist() == _rows(history)
+
+
+def test_empty_history_is_header_only(db, user_id):
+    assert b"".join(export.export_chunks(user_id, "csv")).decode().strip() == ",".join(ds.EXPORT_COLUMNS)
+    assert b"".join(export.export_chunks(user_id, "jsonl")) == b""
+    with pytest.raises(ValueError, match="Unknown export format"):
+        export.export_chunks(user_id, "xlsx")
+
+
+def test_history_rows_stream_in_batch_size_chunks(db, user_id):
+    for i in range(7):
+        ds.log_full_session(user_id, {"date": DAY - datetime.timedelta(days=i)},
+                            [{"exercise": "Deadlift", "sets": 1, "reps": 1, "weight": 100 + i, "weight_unit": "kg"}])
+
+    batches = ds.iter_history_rows(user_id, batch_size=3)
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert len(list(export.export_chunks(user_id, "jsonl", batch_size=3))) == 3   # a chunk per batch
+    dates = [row[1] for batch in ds.iter_history_rows(user_id, batch_size=3) for row in batch]
+    assert dates == sorted(dates)   # oldest first
@@ -0,0 +1,84 @@
+import datetime
+import io
+
+import pytest
+
+import importer
+
+DAY    = datetime.date.today() - datetime.timedelta(days=10)
+HEADER = "Date,Workout Name,Exercise Name,Set Order,Weight,Reps\n"
+
+
+def _csv(*rows: tuple[str, str, str, float, int]) -> io.StringIO:
+    """(time, workout name, exercise, weight, reps) rows, one per set, on DAY."""
+    return io.StringIO(HEADER + "".join(
+        f"{DAY} {time},{workout},{exercise},1,{weight},{reps}\n" for time, workout, exercise, weight, reps in rows
+    ))
+
+
+STRONG_ROWS = (
+    ("07:00:00", "Push A", "Bench Press (Barbell)", 80, 5),
+    ("07:00:00", "Push A", "Bench Press (Barbell)", 80, 5),
+    ("07:00:00", "Push A", "Bench Press (Barbell)", 70, 8),
+    ("18:30:00", "Leg Day", "Front Squat (Barbell)", 100, 5),
+)
+
+
+def _import(user_id: int, rows=STRONG_ROWS, **kwargs) -> importer.ImportReport:
+    return importer.import_csv(user_id, _csv(*rows), unit="kg", **kwargs)
+
+
+def test_rows_become_sessions_and_folded_sets(db, user_id):
+    report = _import(user_id)
+
+    assert (report.rows_read, report.rows_skipped) == (4, 0)
+    assert (report.result.sessions, report.result.logs, report.result.duplicates) == (2, 3, 0)
+    sessions = {s.ppl_day: logs for s, logs in db.get_recent_sessions_with_logs(user_id, 5)}
+    assert [(log.exercise, log.sets, log.reps) for log in sessions["Push"]] == [
+        ("Barbell Bench Press", 2, 5), ("Barbell Bench Press", 1, 8),
+    ]
+    assert [log.exercise for log in sessions["Legs"]] == ["Barbell Front Squat"]
+    assert db.check_user_stats() == []
+
+
+def test_reimport_skips_what_is_already_there(db, user_id):
+    _import(user_id)
+    again = _import(user_id)
+
+    assert (again.result.sessions, again.result.logs, again.result.duplicates) == (0, 0, 2)
+    assert len(db.get_sessions(user_id)) == 2
+
+
+def test_same_day_workouts_with_one_name_stay_apart(db, user_id):
+    rows = (
+        ("06:00:00", "Full Body", "Deadlift", 140, 3),
+        ("17:00:00", "Full Body", "Deadlift", 150, 2),
+    )
+    first = _import(user_id, rows)
+    again = _import(user_id, rows)
+
+    assert first.result.sessions == 2
+    assert again.result.duplicates == 2
+    assert len(db.get_sessions(user_id)) == 2
+
+
+def test_dry_run_reports_without_writing(db, user_id):
+    report = _import(user_id, dry_run=True)
+
+    assert report.dry_run
+    assert (report.result.sessions, report.result.logs) == (2, 3)
+    assert db.get_sessions(user_id) == []
+    assert db.get_personal_records(user_id) == []
+
+
+def test_bad_rows_are_reported_and_skipped(db, user_id):
+    report = _import(user_id, STRONG_ROWS + (("08:00:00", "Push A", "Treadmill", 0, 0),))
+
+    assert report.rows_skipped == 1
+    assert "no reps" in report.issues[0].message
+    assert report.result.logs == 3
+
+
+def test_missing_required_columns_fail_the_file(db, user_id):
+    with pytest.raises(importer.ImportFileError, match="exercise, reps"):
+        importer.import_csv(user_id, io.StringIO("Date,Weight\n2024-01-01,80\n"), unit="kg")
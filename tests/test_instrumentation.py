@@ -0,0 +1,118 @@
+import logging
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import instrumentation as instr
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    saved = (instr._config.sample_rate, instr._config.slow_query_ms)
+    instr.configure_instrumentation(sample_rate=1.0, slow_query_ms=None)
+    instr.reset_metrics()
+    yield
+    instr.configure_instrumentation(sample_rate=saved[0], slow_query_ms=saved[1])
+    instr.reset_metrics()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _sleep_function(dbapi_conn, _record):
+        dbapi_conn.create_function("sleep_ms", 1, lambda ms: time.sleep(ms / 1000) or ms)
+
+    instr.instrument_engine(engine)
+    instr.instrument_engine(engine)   # idempotent
+    yield engine
+    engine.dispose()
+
+
+def _bucket(ms: float) -> int:
+    h = instr._Histogram()
+    h.observe(ms)
+    return h.counts.index(1)
+
+
+def test_buckets_are_upper_bounds():
+    assert _bucket(0.2) == 0
+    assert _bucket(1) == 0                  # a bound belongs to its own bucket
+    assert _bucket(1.01) == 1
+    assert _bucket(30) == instr.BUCKETS_MS.index(50)
+    assert _bucket(60_000) == len(instr.BUCKETS_MS)   # +Inf
+
+
+def test_query_latency_lands_in_its_bucket(engine):
+    @instr.instrumented
+    def slow_read():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT sleep_ms(30)")).scalar()
+
+    slow_read()
+
+    (stats,) = [s for s in instr._metrics.statements.values() if "sleep_ms" in s.sql]
+    assert stats.latency.counts[instr.BUCKETS_MS.index(50)] == 1
+    assert stats.functions == {"slow_read"}
+    snapshot = instr.metrics_snapshot()["functions"]["slow_read"]
+    assert snapshot["count"] == 1 and snapshot["statements"] == 1
+    assert 30 <= snapshot["mean_ms"] and snapshot["p50_ms"] == 50
+
+
+def test_unsampled_calls_record_nothing(engine):
+    instr.configure_instrumentation(sample_rate=0)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert instr.metrics_snapshot()["statements"] == {}
+
+
+def test_slow_log_keeps_parameter_shapes_not_values(engine, caplog):
+    instr.configure_instrumentation(sample_rate=0, slow_query_ms=10)
+
+    with caplog.at_level(logging.WARNING, logger="instrumentation"), engine.connect() as conn:
+        conn.execute(text("SELECT sleep_ms(20), :password, :ids"), {"password": "hunter2", "ids": 31337})
+
+    (entry,) = instr.slow_queries()
+    assert entry.params == "(str, int)"
+    assert entry.duration_ms >= 20
+    for value in ("hunter2", "31337"):
+        assert value not in repr(entry) and value not in caplog.text
+    assert "slow query" in caplog.text
+    assert instr.metrics_snapshot()["slow_queries_total"] == 1
+
+
+def test_param_shape_and_statement_key():
+    assert instr.param_shape({"user_id": 1, "names": ["a", "b"]}, False) == "{user_id: int, names: list[str](2)}"
+    assert instr.param_shape([(1, "x"), (2, "y")], True) == "2 × (int, str)"
+    assert instr.statement_key("SELECT *\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (...)"
+    assert instr.statement_key("INSERT INTO t VALUES (?, ?), (?, ?)") == "INSERT INTO t VALUES (...), ..."
+
+
+def test_prometheus_text_renders_cumulative_histograms(engine):
+    @instr.instrumented
+    def two_reads():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT sleep_ms(30)"))
+            conn.execute(text('SELECT "quoted"'))
+
+    two_reads()
+    with instr.timed_checkout("primary"):
+        pass          # outside an instrumented call: not recorded
+
+    lines = instr.prometheus_text().splitlines()
+
+    function = [line for line in lines if line.startswith("skibfit_db_function_duration_seconds")]
+    buckets  = [int(line.rsplit(" ", 1)[1]) for line in function if "_bucket" in line]
+    assert buckets == sorted(buckets) and buckets[-1] == 1
+    assert 'skibfit_db_function_duration_seconds_bucket{function="two_reads",le="0.05"} 1' in lines
+    assert 'skibfit_db_function_duration_seconds_bucket{function="two_reads",le="0.025"} 0' in lines
+    assert 'skibfit_db_function_duration_seconds_count{function="two_reads"} 1' in lines
+    assert 'skibfit_db_function_statements_total{function="two_reads"} 2' in lines
+    assert any(line.startswith("skibfit_db_statement_info") and r'SELECT \"quoted\"' in line for line in lines)
+    assert not any(line.startswith("skibfit_db_pool_checkout_seconds_") for line in lines)
+    assert "skibfit_db_slow_queries_total 0" in lines
+    assert "skibfit_db_metrics_sample_rate 1.0" in lines
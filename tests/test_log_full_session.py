@@ -0,0 +1,39 @@
+import datetime
+
+import database_service as ds
+
+DAY     = datetime.date.today() - datetime.timedelta(days=1)
+ENTRIES = [
+    {"exercise": "Barbell Back Squat", "sets": 3, "reps": 5, "weight": 100, "weight_unit": "kg"},
+    {"exercise": "Leg Press",          "sets": 3, "reps": 10, "weight": 200, "weight_unit": "kg"},
+]
+
+
+def test_returns_the_new_session_row(db, user_id):
+    row = db.log_full_session(user_id, {"date": DAY, "ppl_day": "Legs", "notes": "heavy"}, ENTRIES)
+
+    assert isinstance(row, ds.SessionRow)
+    assert (row.date, row.ppl_day, row.notes) == (DAY, "Legs", "heavy")
+    assert db.get_sessions(user_id) == [row]
+    (session, logs), = db.get_recent_sessions_with_logs(user_id, 1)
+    assert session == row
+    assert [log.sets * log.reps for log in logs] == [15, 30]
+
+
+def test_repeated_key_returns_the_first_session_and_writes_nothing(db, user_id):
+    first  = db.log_full_session(user_id, {"date": DAY, "ppl_day": "Legs"}, ENTRIES, idempotency_key="k1")
+    second = db.log_full_session(user_id, {"date": DAY, "ppl_day": "Push"}, ENTRIES, idempotency_key="k1")
+
+    assert second == first
+    assert len(db.get_sessions(user_id)) == 1
+    assert len(db.get_recent_sessions_with_logs(user_id, 5)[0][1]) == 2
+    assert db.get_dashboard_stats(user_id).total_sessions == 1
+    assert db.check_user_stats() == []
+
+
+def test_keys_are_per_user(db, user_id):
+    other = db.create_user("spotter", "spotter@example.com", "correct horse battery").id
+    mine   = db.log_full_session(user_id, {"date": DAY}, ENTRIES, idempotency_key="k1")
+    theirs = db.log_full_session(other,   {"date": DAY}, ENTRIES, idempotency_key="k1")
+
+    assert mine.id != theirs.id
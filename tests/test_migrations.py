@@ -0,0 +1,145 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, delete, inspect, text
+from sqlalchemy.exc import OperationalError
+
+import database_service as ds
+import migrations
+from migrations import Migration
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # a file, so the online steps' second connection sees the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'fit.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _tables(engine) -> set[str]:
+    return set(inspect(engine).get_table_names())
+
+
+def test_fresh_database_is_stamped_not_migrated(engine, monkeypatch):
+    def explode(conn):
+        raise AssertionError("a fresh database must not run migration steps")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [*migrations.MIGRATIONS, Migration(99, "never runs", (explode,))])
+
+    ran = migrations.run_migrations(engine, ds.Base.metadata)
+
+    assert ran == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.current_version(engine) == 99
+    assert migrations.run_migrations(engine, ds.Base.metadata) == []
+
+
+def test_versions_are_unique_and_ascending():
+    versions = [m.version for m in migrations.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert all(m.description for m in migrations.MIGRATIONS)
+
+
+def test_existing_database_runs_pending_steps_in_order(engine, monkeypatch):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY)"))
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        Migration(2, "second", ("INSERT INTO log VALUES ('two')",)),
+        Migration(1, "first", ("CREATE TABLE log (step VARCHAR)", "INSERT INTO log VALUES ('one')")),
+    ])
+    assert migrations.current_version(engine) == 0
+
+    assert migrations.run_migrations(engine) == [1, 2]
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT step FROM log")).scalars().all() == ["one", "two"]
+        stamped = conn.execute(text("SELECT version, description FROM schema_version ORDER BY version")).all()
+    assert stamped == [(1, "first"), (2, "second")]
+    assert migrations.run_migrations(engine) == []
+
+
+def test_failed_step_rolls_back_the_run(engine, monkeypatch):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY)"))
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        Migration(1, "fine", ("INSERT INTO users VALUES (1)",)),
+        Migration(2, "broken", ("INSERT INTO no_such_table VALUES (1)",)),
+    ])
+
+    with pytest.raises(OperationalError):
+        migrations.run_migrations(engine)
+
+    assert migrations.current_version(engine) == 0
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM users")).scalar() == 0
+
+
+def test_index_probes_name_indexes_the_schema_defines():
+    defined = {index.name for table in ds.Base.metadata.tables.values() for index in table.indexes}
+    defined |= {f"{name}_pkey" for name in ds.Base.metadata.tables}
+    assert {probe.index for probe in migrations.INDEX_PROBES} <= defined
+
+
+def test_index_check_needs_postgres(engine):
+    with pytest.raises(RuntimeError, match="PostgreSQL"):
+        migrations.check_index_usage(engine)
+
+
+def test_online_steps_run_after_the_regular_steps_commit(engine, monkeypatch):
+    migrations.run_migrations(engine, ds.Base.metadata)
+    seen = []
+
+    def online_step(conn):
+        # a separate autocommit connection: it sees the row only once committed
+        seen.extend(conn.execute(text("SELECT x FROM staging")).scalars())
+        conn.execute(text("INSERT INTO staging VALUES (1)"))
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [*migrations.MIGRATIONS, Migration(
+        99, "staged",
+        ("CREATE TABLE IF NOT EXISTS staging (x INTEGER)", "INSERT INTO staging VALUES (0)"),
+        online=(online_step,),
+    )])
+
+    assert migrations.run_migrations(engine, ds.Base.metadata) == [99]
+    assert seen == [0]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT x FROM staging ORDER BY x")).scalars().all() == [0, 1]
+
+
+def test_failed_online_step_leaves_the_migration_pending(engine, monkeypatch):
+    migrations.run_migrations(engine, ds.Base.metadata)
+    attempts = []
+
+    def flaky(conn):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [*migrations.MIGRATIONS, Migration(
+        99, "retried", ("CREATE TABLE IF NOT EXISTS staging (x INTEGER)",), online=(flaky,),
+    )])
+
+    with pytest.raises(RuntimeError):
+        migrations.run_migrations(engine, ds.Base.metadata)
+    assert "staging" in _tables(engine)   # committed before the online steps
+    assert migrations.current_version(engine) == migrations.MIGRATIONS[-2].version
+
+    assert migrations.run_migrations(engine, ds.Base.metadata) == [99]
+    assert len(attempts) == 2
+
+
+def test_derived_tables_are_filled_from_existing_logs(db, user_id):
+    db.log_full_session(
+        user_id, {"date": datetime.date.today()},
+        [{"exercise": "Deadlift", "sets": 1, "reps": 3, "weight": 180, "weight_unit": "kg"}],
+    )
+    with db.get_engine().begin() as conn:
+        # what create_all() leaves on a database that predates the tables
+        conn.execute(delete(db.PersonalRecord))
+        conn.execute(delete(db.VolumeRollup))
+
+    with db.get_engine().begin() as conn:
+        migrations._build_derived_tables(conn)
+    db.clear_read_cache()
+
+    assert [(pr.exercise, pr.weight_kg) for pr in db.get_personal_records(user_id)] == [("Deadlift", 180)]
+    assert [p.volume_kg for p in db.get_volume_over_time(user_id, "Deadlift")] == [540]
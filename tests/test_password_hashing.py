@@ -0,0 +1,78 @@
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import select, update
+
+import database_service as ds
+import password_hashing as ph
+from password_hashing import Argon2Params, HashingUnavailable
+
+CHEAP = Argon2Params(time_cost=1, memory_cost=64, parallelism=1)
+
+
+@pytest.fixture
+def service():
+    """A fresh inline service with cheap parameters; the original is restored afterwards."""
+    saved = ph._service
+    ph._service = ph._HashingService(workers=0, max_pending=4, params=CHEAP)
+    yield ph._service
+    ph._service.shutdown()
+    ph._service = saved
+
+
+def test_verify_and_update_round_trip(service):
+    hashed = ph.hash_password("correct horse")
+
+    assert ph.verify_and_update("correct horse", hashed) == (True, None)
+    assert ph.verify_and_update("wrong", hashed) == (False, None)
+    assert ph.verify_password("correct horse", hashed)
+
+
+def test_hash_with_other_parameters_is_replaced(service):
+    old = ph._hash_job("correct horse", Argon2Params(time_cost=2, memory_cost=128, parallelism=1))
+
+    valid, new_hash = ph.verify_and_update("correct horse", old)
+
+    assert valid and new_hash is not None and "m=64,t=1,p=1" in new_hash
+    assert ph.verify_and_update("correct horse", new_hash) == (True, None)
+    assert ph.verify_and_update("wrong", old) == (False, None)
+
+
+def test_default_parameters_keep_existing_hashes():
+    existing = CryptContext(schemes=["argon2"]).hash("correct horse")   # how hashes were made before
+
+    assert ph._verify_job("correct horse", existing, Argon2Params()) == (True, None)
+
+
+def test_login_stores_the_upgraded_hash(db, user_id, service):
+    old = ph._hash_job("correct horse battery", Argon2Params(time_cost=2, memory_cost=128, parallelism=1))
+    with ds.get_engine().begin() as conn:
+        conn.execute(update(ds.User).values(hashed_password=old))
+
+    assert ds.authenticate_user("lifter", "correct horse battery").id == user_id
+
+    with ds.get_engine().connect() as conn:
+        stored = conn.execute(select(ds.User.hashed_password)).scalar()
+    assert stored != old and ph.verify_and_update("correct horse battery", stored) == (True, None)
+    assert ds.authenticate_user("lifter", "nope") is None
+
+
+def test_zero_workers_hash_inline(service, monkeypatch):
+    monkeypatch.setattr(service, "_get_pool", lambda: pytest.fail("inline hashing used the pool"))
+
+    ph.verify_password("x", ph.hash_password("x"))
+
+    metrics = ph.hashing_metrics()
+    assert metrics["workers"] == 0 and metrics["completed"] == 2
+    assert metrics["latency_ms"]["hash"]["count"] == metrics["latency_ms"]["verify"]["count"] == 1
+
+
+def test_full_queue_gives_up_after_submit_timeout(monkeypatch):
+    monkeypatch.setattr(ph, "SUBMIT_TIMEOUT", 0.01)
+    busy = ph._HashingService(workers=1, max_pending=1, params=CHEAP)
+    busy._slots.acquire()            # the only slot is taken by a job in flight
+    monkeypatch.setattr(busy, "_get_pool", lambda: pytest.fail("submitted past a full queue"))
+
+    with pytest.raises(HashingUnavailable, match="busy"):
+        busy.run("hash", ph._hash_job, "x", CHEAP)
+
+    assert busy.metrics()["rejected"] == 1 and busy.metrics()["queue_depth"] == 0
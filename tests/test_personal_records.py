@@ -0,0 +1,95 @@
+import datetime
+
+from sqlalchemy import update
+
+import database_service as ds
+
+TODAY = datetime.date.today()
+
+
+def _session(user_id: int, days_ago: int) -> int:
+    return ds.start_session(user_id, "Push", date=TODAY - datetime.timedelta(days=days_ago)).id
+
+
+def _log(user_id: int, session_id: int, exercise: str, weight: float, reps: int = 5, unit: str = "kg") -> int:
+    return ds.log_exercise(
+        session_id, user_id,
+        {"exercise": exercise, "sets": 3, "reps": reps, "weight": weight, "weight_unit": unit},
+    ).id
+
+
+def _records(user_id: int) -> dict[str, tuple[float, int, datetime.date]]:
+    return {pr.exercise: (pr.weight_kg, pr.reps, pr.date) for pr in ds.get_personal_records(user_id)}
+
+
+def _rebuilt(user_id: int) -> dict[str, tuple[float, int, datetime.date]]:
+    ds.backfill_personal_records(user_id)
+    return _records(user_id)
+
+
+def test_heaviest_log_per_exercise(db, user_id):
+    older, newer = _session(user_id, 3), _session(user_id, 1)
+    _log(user_id, older, "Bench Press", 80)
+    _log(user_id, newer, "Bench Press", 75)
+    _log(user_id, newer, "Squat", 225, unit="lb")
+
+    records = _records(user_id)
+    assert records["Bench Press"] == (80, 5, TODAY - datetime.timedelta(days=3))
+    assert round(records["Squat"][0], 1) == 102.1
+    assert records == _rebuilt(user_id)
+
+
+def test_tie_on_weight_goes_to_the_most_recent_log(db, user_id):
+    _log(user_id, _session(user_id, 5), "Deadlift", 140, reps=3)
+    _log(user_id, _session(user_id, 2), "Deadlift", 140, reps=2)
+
+    assert _records(user_id)["Deadlift"] == (140, 2, TODAY - datetime.timedelta(days=2))
+
+
+def test_update_below_the_record_promotes_the_runner_up(db, user_id):
+    session = _session(user_id, 1)
+    best    = _log(user_id, session, "Bench Press", 100)
+    _log(user_id, session, "Bench Press", 90)
+
+    ds.update_log(user_id, best, {"weight": 60})
+    assert _records(user_id)["Bench Press"][0] == 90
+    assert _records(user_id) == _rebuilt(user_id)
+
+
+def test_update_can_move_a_log_to_another_exercise(db, user_id):
+    session = _session(user_id, 1)
+    log_id  = _log(user_id, session, "Bench Press", 100)
+
+    ds.update_log(user_id, log_id, {"exercise": "Overhead Press"})
+    assert _records(user_id) == {"Overhead Press": (100, 5, TODAY - datetime.timedelta(days=1))}
+
+
+def test_deletes_fall_back_and_finally_drop_the_record(db, user_id):
+    session = _session(user_id, 1)
+    best    = _log(user_id, session, "Squat", 150)
+    other   = _log(user_id, session, "Squat", 120)
+
+    ds.delete_log(user_id, best)
+    assert _records(user_id)["Squat"][0] == 120
+    ds.delete_log(user_id, other)
+    assert _records(user_id) == {}
+    assert _records(user_id) == _rebuilt(user_id)
+
+
+def test_deleting_a_session_drops_its_records(db, user_id):
+    keep, drop = _session(user_id, 4), _session(user_id, 1)
+    _log(user_id, keep, "Row", 60)
+    _log(user_id, drop, "Row", 70)
+
+    ds.delete_session(user_id, drop)
+    assert _records(user_id) == {"Row": (60, 5, TODAY - datetime.timedelta(days=4))}
+
+
+def test_backfill_refreshes_cached_reads(db, user_id):
+    _log(user_id, _session(user_id, 1), "Bench Press", 80)
+    assert _records(user_id)["Bench Press"][0] == 80   # now cached
+
+    with db.get_engine().begin() as conn:
+        conn.execute(update(db.PersonalRecord).values(weight_kg=1))
+    db.backfill_personal_records(user_id)
+    assert _records(user_id)["Bench Press"][0] == 80
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+import database_service as ds
+
+DAY = datetime.date.today() - datetime.timedelta(days=30)
+
+
+@pytest.fixture
+def selects(db):
+    """SELECT statements run against the database, in order."""
+    seen: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            seen.append(statement)
+
+    event.listen(db.get_engine(), "before_cursor_execute", record)
+    yield seen
+    event.remove(db.get_engine(), "before_cursor_execute", record)
+
+
+def _history(user_id: int, days: int) -> list[int]:
+    ids = []
+    for i in range(days):
+        logs = [{"exercise": f"Move {i}.{j}", "sets": 1, "reps": 1, "weight": j} for j in range(i % 3)]
+        ids.append(ds.log_full_session(user_id, {"date": DAY + datetime.timedelta(days=i)}, logs).id)
+    return ids
+
+
+@pytest.mark.parametrize("limit", [1, 5, 100])
+def test_two_statements_whatever_the_limit(user_id, selects, limit):
+    _history(user_id, 12)
+    ds.clear_read_cache()
+    selects.clear()
+
+    ds.get_recent_sessions_with_logs(user_id, limit)
+
+    assert len(selects) == 2
+
+
+def test_newest_first_with_logs_in_entry_order(user_id):
+    ids = _history(user_id, 6)
+
+    recent = ds.get_recent_sessions_with_logs(user_id, 4)
+
+    assert [sess.id for sess, _ in recent] == ids[:-5:-1]
+    assert {sess.id: [log.exercise for log in logs] for sess, logs in recent} == {
+        ids[5]: ["Move 5.0", "Move 5.1"],
+        ids[4]: ["Move 4.0"],
+        ids[3]: [],                          # sessions without logs are still listed
+        ids[2]: ["Move 2.0", "Move 2.1"],
+    }
+
+
+def test_other_users_sessions_are_excluded(user_id):
+    other = ds.create_user("someone", "someone@example.com", "another password").id
+    _history(other, 3)
+    mine = _history(user_id, 2)
+
+    recent = ds.get_recent_sessions_with_logs(user_id, 10)
+
+    assert [sess.id for sess, _ in recent] == mine[::-1]
+    assert all(log.session_id in mine for _, logs in recent for log in logs)
+    assert ds.get_recent_sessions_with_logs(ds.create_user("new", "new@example.com", "pw pw pw").id) == []
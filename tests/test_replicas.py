@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+import database_service as ds
+import replicas
+from replicas import ReplicaSet
+
+MISSING = "sqlite:////nonexistent/dir/replica.db"
+
+
+@pytest.fixture
+def lags(monkeypatch):
+    """Replica index → the lag measure_lag reports for it (0 when absent)."""
+    readings: dict[int, float | None] = {}
+    monkeypatch.setattr(replicas, "measure_lag", lambda engine: readings.get(int(engine.url.query["n"]), 0.0))
+    return readings
+
+
+def _set(n: int = 2, **kwargs) -> ReplicaSet:
+    kwargs.setdefault("check_interval", 0)
+    rs = ReplicaSet([f"sqlite://?n={i}" for i in range(n)], refresh_in_background=False, **kwargs)
+    rs.refresh()
+    return rs
+
+
+def _picks(rs: ReplicaSet, n: int = 4) -> list[int | None]:
+    return [None if (r := rs.pick()) is None else rs.replicas.index(r) for _ in range(n)]
+
+
+def test_picks_round_robin(lags):
+    assert _picks(_set(3), 6) == [0, 1, 2, 0, 1, 2]
+
+
+def test_lagging_and_unmeasured_replicas_are_skipped(lags):
+    lags.update({0: 12.0, 2: None})
+
+    assert _picks(_set(3, max_lag=5)) == [1, 1, 1, 1]
+
+    lags[1] = 6.0
+    rs = _set(3, max_lag=5)
+    assert _picks(rs) == [None] * 4
+    assert [s["usable"] for s in rs.status()] == [False, False, False]
+
+
+def test_nothing_is_picked_before_the_first_measurement(lags):
+    rs = ReplicaSet(["sqlite://?n=0"], refresh_in_background=False)
+
+    assert rs.pick() is None
+
+
+def test_pick_never_measures(lags, monkeypatch):
+    rs = _set(2)
+    monkeypatch.setattr(replicas, "measure_lag", lambda engine: pytest.fail("measured inside pick()"))
+
+    assert _picks(rs) == [0, 1, 0, 1]
+    rs.status()
+
+
+def test_mark_down_cools_a_replica_off(lags):
+    rs = _set(2, cooldown=60)
+
+    rs.mark_down(rs.replicas[0])
+    rs.refresh()                              # not re-measured while cooling down
+    assert _picks(rs) == [1, 1, 1, 1]
+    assert rs.replicas[0].failures == 1
+
+    rs.replicas[0].down_until = 0             # cooldown over
+    assert _picks(rs) == [1, 1, 1, 1]         # lag unknown until the next refresh
+    rs.refresh()
+    assert sorted(_picks(rs)) == [0, 0, 1, 1]
+
+
+def test_failed_lag_check_marks_the_replica_down():
+    rs = ReplicaSet(["sqlite://", MISSING], refresh_in_background=False, check_interval=0, cooldown=60)
+
+    rs.refresh()
+
+    assert _picks(rs) == [0, 0, 0, 0]
+    assert rs.replicas[1].failures == 1 and rs.status()[1]["down_for"] > 0
+
+
+def _wait_for_first_measurement(rs: ReplicaSet) -> None:
+    deadline = time.monotonic() + 2
+    while any(r.lag is None for r in rs.replicas) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_background_refresh_measures_without_a_pick():
+    rs = ReplicaSet(["sqlite://"], check_interval=0.01)
+    try:
+        _wait_for_first_measurement(rs)
+        assert rs.pick() is rs.replicas[0]
+    finally:
+        rs.dispose()
+
+
+def test_reads_after_a_write_go_to_the_primary(monkeypatch):
+    ds.configure("sqlite://", ["sqlite://"])
+    try:
+        _wait_for_first_measurement(ds.get_replica_set())
+        assert ds._replica_for(1) is ds.get_replica_set().replicas[0]
+        assert ds._replica_for(None) is None     # reads outside a user's context
+
+        ds._note_write(1)
+        assert ds._replica_for(1) is None
+        assert ds._replica_for(2) is not None    # other users are unaffected
+
+        monkeypatch.setattr(ds, "READ_YOUR_WRITES_SECONDS", 0)
+        assert ds._replica_for(1) is not None
+    finally:
+        ds.configure("sqlite://")
@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import event
+
+import database_service as ds
+
+PLAN = [
+    {"exercise": "Barbell Bench Press", "sets": 4, "reps": 8, "plan_day": "Push", "sort_order": 0},
+    {"exercise": "Dip",                 "sets": 3, "reps": 10, "plan_day": "Push", "sort_order": 1},
+    {"exercise": "Barbell Back Squat",  "sets": 5, "reps": 5, "plan_day": "Legs", "sort_order": 2},
+]
+
+
+@pytest.fixture
+def writes(db):
+    """(verb, rows) for every statement that writes to workouts."""
+    seen: list[tuple[str, int]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.split(None, 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE") and " workouts" in statement:
+            seen.append((verb, len(parameters) if executemany else 1))
+
+    event.listen(db.get_engine(), "before_cursor_execute", record)
+    yield seen
+    event.remove(db.get_engine(), "before_cursor_execute", record)
+
+
+def _ids(user_id: int) -> dict[str, int]:
+    return {w.exercise: w.id for w in ds.get_all_workouts(user_id)}
+
+
+def _saved(user_id: int, plan: list[dict], writes: list) -> list[tuple[str, int]]:
+    writes.clear()
+    ds.save_plan(user_id, plan)
+    return list(writes)
+
+
+def test_first_save_is_one_insert(user_id, writes):
+    assert _saved(user_id, PLAN, writes) == [("INSERT", 3)]
+    assert sorted(_ids(user_id)) == sorted(p["exercise"] for p in PLAN)
+
+
+def test_saving_the_same_plan_writes_nothing(user_id, writes):
+    ds.save_plan(user_id, PLAN)
+    before = _ids(user_id)
+
+    assert _saved(user_id, [dict(p) for p in PLAN], writes) == []
+    assert _ids(user_id) == before
+
+
+def test_reorder_keeps_ids_and_updates_only_the_moved_rows(user_id, writes):
+    ds.save_plan(user_id, PLAN)
+    before = _ids(user_id)
+    swapped = [{**PLAN[1], "sort_order": 0}, {**PLAN[0], "sort_order": 1}, PLAN[2]]
+
+    assert _saved(user_id, swapped, writes) == [("UPDATE", 2)]
+    assert _ids(user_id) == before
+    assert [w.exercise for w in ds.get_plan_by_day(user_id)["Push"]] == ["Dip", "Barbell Bench Press"]
+
+
+def test_edit_updates_one_row_in_place(user_id, writes):
+    ds.save_plan(user_id, PLAN)
+    before = _ids(user_id)
+
+    assert _saved(user_id, [PLAN[0], {**PLAN[1], "reps": 12}, PLAN[2]], writes) == [("UPDATE", 1)]
+    assert _ids(user_id) == before
+    assert {w.exercise: w.reps for w in ds.get_all_workouts(user_id)}["Dip"] == 12
+
+
+def test_removal_is_one_delete(user_id, writes):
+    ds.save_plan(user_id, PLAN)
+    before = _ids(user_id)
+
+    assert _saved(user_id, [PLAN[0], PLAN[2]], writes) == [("DELETE", 1)]
+    assert _ids(user_id) == {k: v for k, v in before.items() if k != "Dip"}
+
+
+def test_swapping_an_exercise_replaces_only_that_row(user_id, writes):
+    ds.save_plan(user_id, PLAN)
+    before = _ids(user_id)
+
+    assert _saved(user_id, [PLAN[0], {**PLAN[1], "exercise": "Push-Up"}, PLAN[2]], writes) == [
+        ("DELETE", 1), ("INSERT", 1),
+    ]
+    after = _ids(user_id)
+    assert "Dip" not in after and after["Barbell Bench Press"] == before["Barbell Bench Press"]
+
+
+def test_diff_matches_duplicates_in_sort_order():
+    existing = [
+        {"id": 7, "exercise": "Dip", "exercise_id": 1, "sets": 3, "reps": 10, "weight": None,
+         "weight_unit": None, "plan_day": "Push", "sort_order": 0},
+        {"id": 9, "exercise": "Dip", "exercise_id": 1, "sets": 3, "reps": 10, "weight": None,
+         "weight_unit": None, "plan_day": "Push", "sort_order": 3},
+    ]
+    new = [{k: v for k, v in existing[1].items() if k != "id"}]
+
+    diff = ds._diff_plan(existing, new)
+
+    assert (diff.inserts, diff.updates, diff.deletes) == ([], [], [7])
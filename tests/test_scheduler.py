@@ -0,0 +1,187 @@
+import datetime
+import importlib
+import random
+import sys
+import types
+
+import pytest
+import streamlit as st
+
+MONDAY = datetime.date(2030, 1, 7)
+EVENING = (datetime.time(17), datetime.time(20))
+
+
+@pytest.fixture(scope="module")
+def scheduler():
+    # scheduler reads its secrets and builds the Groq client at import
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(sys.modules, "groq", types.SimpleNamespace(Groq=lambda api_key: None))
+        mp.setattr(st, "secrets", {"GOOGLE_CLIENT_ID": "id", "GOOGLE_CLIENT_SECRET": "secret", "GROQ_API_KEY": "key"})
+        mp.delitem(sys.modules, "scheduler", raising=False)
+        yield importlib.import_module("scheduler")
+        sys.modules.pop("scheduler", None)
+
+
+def _week(days: int = 7) -> list[datetime.date]:
+    return [MONDAY + datetime.timedelta(days=i) for i in range(days)]
+
+
+def _pick(scheduler, dates, n, busy=(), **kwargs):
+    return scheduler._pick_distributed_dates(dates, n, scheduler.BusyIndex(list(busy)), *EVENING, **kwargs)
+
+
+def test_spacing_spreads_picks_across_the_span(scheduler):
+    assert scheduler._solve_spacing(list(range(7)), 3, 2, [0.0] * 7) == [0, 3, 6]
+    assert scheduler._solve_spacing([0, 1, 2], 3, 2, [0.0] * 3) is None
+
+
+def test_weekday_costs_move_a_pick(scheduler):
+    costs = [0.0, 0.0, 0.0, 5.0, 0.0, 0.0, 0.0]
+    picks = scheduler._solve_spacing(list(range(7)), 3, 2, costs)
+    assert picks[0] == 0 and picks[-1] == 6 and picks[1] != 3
+
+
+def test_rest_days_reports_the_gap_kept(scheduler):
+    chosen, rest_days = _pick(scheduler, _week(), 3)
+
+    assert [d for d, _ in chosen] == [MONDAY, MONDAY + datetime.timedelta(3), MONDAY + datetime.timedelta(6)]
+    assert rest_days == 2
+
+
+def test_rest_days_shows_when_the_minimum_was_relaxed(scheduler):
+    chosen, rest_days = _pick(scheduler, _week(3), 3, min_rest_days=1)
+
+    assert len(chosen) == 3
+    assert rest_days == 0
+
+
+def test_rest_days_is_none_for_a_single_session(scheduler):
+    assert _pick(scheduler, _week(), 1)[1] is None
+    assert _pick(scheduler, _week(), 0) == ([], None)
+
+
+def test_busy_and_blackout_days_are_skipped(scheduler):
+    tuesday = MONDAY + datetime.timedelta(1)
+    all_day = (datetime.datetime.combine(MONDAY, datetime.time()), datetime.datetime.combine(tuesday, datetime.time()))
+
+    chosen, _ = _pick(scheduler, _week(3), 1, busy=[all_day], blackout_dates={tuesday})
+    assert chosen[0][0] == MONDAY + datetime.timedelta(2)
+
+    with pytest.raises(ValueError, match="Not enough free days"):
+        _pick(scheduler, _week(3), 2, busy=[all_day], blackout_dates={tuesday})
+
+
+def test_evening_slot_moves_past_a_busy_block(scheduler):
+    meeting = (datetime.datetime.combine(MONDAY, datetime.time(16, 30)),
+               datetime.datetime.combine(MONDAY, datetime.time(18)))
+
+    chosen, _ = _pick(scheduler, [MONDAY], 1, busy=[meeting])
+    assert chosen == [(MONDAY, datetime.time(18, 15))]   # block 18:00–19:30, after the pre-buffer
+
+
+def _at(hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime.combine(MONDAY, datetime.time(hour, minute))
+
+
+def _brute_first_free(intervals, first, last, length, step):
+    t = first
+    while t <= last:
+        if all(t + length <= s or e <= t for s, e in intervals):
+            return t
+        t += step
+    return None
+
+
+def test_busy_index_merges_overlapping_and_abutting_intervals(scheduler):
+    index = scheduler.BusyIndex([
+        (_at(9), _at(10)), (_at(9, 30), _at(11)),    # overlapping
+        (_at(11), _at(12)),                          # abutting
+        (_at(14), _at(15)),
+        (_at(16), _at(16)),                          # empty, ignored
+    ])
+
+    assert len(index) == 2
+    assert not index.is_free(_at(11, 30), _at(13))
+    assert index.is_free(_at(12), _at(14))           # intervals are half-open
+    assert not index.is_free(_at(8), _at(9, 1))
+    assert index.is_free(_at(16), _at(17))
+
+
+def test_first_free_jumps_to_the_next_grid_point(scheduler):
+    index  = scheduler.BusyIndex([(_at(17), _at(17, 40))])
+    length = datetime.timedelta(minutes=30)
+
+    assert index.first_free(_at(17), _at(20), length, datetime.timedelta(minutes=5)) == _at(17, 40)
+    assert index.first_free(_at(17), _at(20), length, datetime.timedelta(minutes=30)) == _at(18)
+    assert index.first_free(_at(17), _at(17, 30), length, datetime.timedelta(minutes=30)) is None
+
+
+def test_first_free_agrees_with_a_scan_of_every_candidate(scheduler):
+    rng = random.Random(7)
+    for _ in range(200):
+        intervals = []
+        for _ in range(rng.randint(0, 8)):
+            start = _at(6) + datetime.timedelta(minutes=rng.randrange(0, 16 * 60, 5))
+            intervals.append((start, start + datetime.timedelta(minutes=rng.randrange(5, 180, 5))))
+        step   = datetime.timedelta(minutes=rng.choice([5, 10, 15, 30]))
+        length = datetime.timedelta(minutes=rng.choice([30, 90]))
+        args   = (_at(7), _at(19, 30), length, step)
+
+        assert scheduler.BusyIndex(intervals).first_free(*args) == _brute_first_free(intervals, *args)
+
+
+def test_free_slot_on_a_five_minute_grid(scheduler):
+    busy = scheduler.BusyIndex([(_at(16), _at(17, 7))])
+
+    # the block (15-min pre-buffer included) starts at 17:10, the workout at 17:25
+    assert scheduler._find_free_slot(MONDAY, *EVENING, busy, step_minutes=5) == datetime.time(17, 25)
+    assert scheduler._find_free_slot(MONDAY, *EVENING, busy, step_minutes=15) == datetime.time(17, 30)
+    assert scheduler._slot_is_free(MONDAY, datetime.time(17, 25), busy)
+    assert not scheduler._slot_is_free(MONDAY, datetime.time(17, 20), busy)
+
+
+def test_free_slot_falls_back_to_the_whole_day(scheduler):
+    evening = scheduler.BusyIndex([(_at(16), _at(21))])
+    assert scheduler._find_free_slot(MONDAY, *EVENING, evening, step_minutes=5) == datetime.time(7, 15)
+
+    all_day = scheduler.BusyIndex([(_at(6), _at(22))])
+    assert scheduler._find_free_slot(MONDAY, *EVENING, all_day) is None
+
+
+def test_step_below_the_minimum_is_rejected(scheduler):
+    with pytest.raises(ValueError, match="at least 5"):
+        scheduler.generate_workout_plan([], 3, [], {"Push": []}, step_minutes=4)
+
+
+class _RecordingProvider:
+    def __init__(self):
+        self.windows = []
+
+    def busy_between(self, time_min, time_max):
+        self.windows.append((time_min, time_max))
+        return []
+
+
+def test_plan_asks_for_busy_time_over_the_candidate_days(scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler.st, "session_state", {"_scheduler_days_ahead": 7})
+    provider = _RecordingProvider()
+    split    = {"Push": [], "Pull": [], "Legs": []}
+
+    plan, rest_days = scheduler.generate_workout_plan(None, 3, [], split, busy_provider=provider)
+
+    today = datetime.date.today()
+    assert provider.windows == [(
+        datetime.datetime.combine(today + datetime.timedelta(1), datetime.time()),
+        datetime.datetime.combine(today + datetime.timedelta(8), datetime.time()),
+    )]
+    assert [p["title"] for p in plan] == ["SkibFit — Push", "SkibFit — Pull", "SkibFit — Legs"]
+    assert rest_days == 2
+
+
+def test_event_body_uses_the_sync_time_zone(scheduler):
+    session = {"date": "2030-01-07", "start_time": "18:15", "end_time": "19:15", "title": "Push", "description": ""}
+
+    body = scheduler._event_body(session)
+
+    assert body["start"] == {"dateTime": "2030-01-07T18:15:00", "timeZone": scheduler.calendar_sync.TIME_ZONE}
+    assert body["id"] == session["event_id"] == scheduler._event_body(session)["id"]
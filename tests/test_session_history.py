@@ -0,0 +1,73 @@
+import datetime
+
+from sqlalchemy import select, update
+
+import database_service as ds
+
+DAY  = datetime.date.today() - datetime.timedelta(days=10)
+NOON = datetime.datetime.combine(DAY, datetime.time(12))
+
+
+def _sessions(user_id: int, n: int, ppl_day: str = "Push", day: datetime.date = DAY) -> list[int]:
+    return [ds.start_session(user_id, ppl_day=ppl_day, date=day).id for _ in range(n)]
+
+
+def _all_pages(user_id: int, limit: int, **filters) -> list[int]:
+    seen, cursor = [], None
+    while True:
+        page = ds.get_session_history(user_id, cursor, limit, **filters)
+        seen += [sess.id for sess, _ in page.sessions]
+        if page.next_cursor is None:
+            return seen
+        cursor = page.next_cursor
+
+
+def test_cursor_pages_through_ties_without_skips_or_duplicates(db, user_id):
+    tied    = _sessions(user_id, 7)
+    earlier = _sessions(user_id, 2, day=DAY - datetime.timedelta(days=1))
+    with ds.get_engine().begin() as conn:
+        # same date and created_at: only the id separates them
+        conn.execute(update(ds.WorkoutSession).where(ds.WorkoutSession.id.in_(tied)).values(created_at=NOON))
+
+    for limit in (1, 2, 3, 7, 20):
+        assert _all_pages(user_id, limit) == sorted(tied, reverse=True) + sorted(earlier, reverse=True)
+
+
+def test_last_page_has_no_cursor(db, user_id):
+    _sessions(user_id, 4)
+
+    assert ds.get_session_history(user_id, limit=4).next_cursor is None
+    assert ds.get_session_history(user_id, limit=3).next_cursor is not None
+
+
+def test_filters_apply_on_every_page(db, user_id):
+    push = _sessions(user_id, 3)
+    _sessions(user_id, 3, ppl_day="Pull")
+    squat = ds.log_full_session(user_id, {"date": DAY, "ppl_day": "Legs"}, [
+        {"exercise": "Barbell Back Squat", "sets": 5, "reps": 5, "weight": 100, "weight_unit": "kg"},
+    ])
+
+    assert sorted(_all_pages(user_id, 2, ppl_day="Push")) == push
+    assert _all_pages(user_id, 2, exercise="barbell back squat") == [squat.id]
+    assert _all_pages(user_id, 2, date_from=DAY + datetime.timedelta(days=1)) == []
+
+
+def test_session_days_lists_the_labels_in_use(db, user_id):
+    _sessions(user_id, 2, ppl_day="Upper")
+    _sessions(user_id, 1, ppl_day="Full Body")
+    ds.start_session(user_id, date=DAY)
+
+    assert ds.get_session_days(user_id) == ["Full Body", "Upper"]
+
+
+def test_backfill_gives_missing_created_at_midnight_of_the_date(db, user_id):
+    ids = _sessions(user_id, 3) + _sessions(user_id, 2, day=DAY - datetime.timedelta(days=1))
+    with ds.get_engine().begin() as conn:
+        conn.execute(update(ds.WorkoutSession).where(ds.WorkoutSession.id != ids[0]).values(created_at=None))
+
+    assert ds.backfill_session_created_at(batch_size=2) == 4
+    assert ds.backfill_session_created_at(batch_size=2) == 0
+    with ds.get_engine().connect() as conn:
+        rows = conn.execute(select(ds.WorkoutSession.date, ds.WorkoutSession.created_at).order_by(ds.WorkoutSession.id)).all()
+    assert rows[0].created_at != datetime.datetime.combine(rows[0].date, datetime.time())
+    assert all(r.created_at == datetime.datetime.combine(r.date, datetime.time()) for r in rows[1:])
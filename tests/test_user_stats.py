@@ -0,0 +1,93 @@
+import datetime
+
+from sqlalchemy import delete, select, update
+
+import database_service as ds
+import migrations
+
+TODAY = datetime.date.today()
+
+
+def _log(user_id: int, days_ago: int, ppl_day: str | None) -> ds.SessionRow:
+    return ds.log_full_session(
+        user_id,
+        {"date": TODAY - datetime.timedelta(days=days_ago), "ppl_day": ppl_day},
+        [{"exercise": "Squat", "sets": 3, "reps": 5, "weight": 100}],
+    )
+
+
+def test_favourite_day_counts_labels_outside_push_pull_legs(db, user_id):
+    _log(user_id, 3, "Push")
+    _log(user_id, 2, "Upper")
+    _log(user_id, 1, "Upper")
+
+    assert db.get_dashboard_stats(user_id).favourite_day == "Upper"
+
+
+def test_favourite_day_follows_deletes(db, user_id):
+    _log(user_id, 3, "Push")
+    _log(user_id, 2, "Push")
+    upper = _log(user_id, 1, "Upper")
+    _log(user_id, 0, "Upper")
+
+    assert db.get_dashboard_stats(user_id).favourite_day == "Push"   # tie → alphabetical
+    db.delete_session(user_id, upper.id)
+    assert db.get_dashboard_stats(user_id).favourite_day == "Push"
+    assert db.check_user_stats(user_id) == []
+
+
+def test_day_count_rows_are_dropped_at_zero(db, user_id):
+    session = _log(user_id, 0, "Lower")
+    db.delete_session(user_id, session.id)
+
+    with db.get_engine().connect() as conn:
+        rows = conn.execute(select(db.UserDayCount)).all()
+    assert rows == []
+    assert db.get_dashboard_stats(user_id).favourite_day is None
+
+
+def test_sessions_without_a_day_are_not_counted(db, user_id):
+    _log(user_id, 1, None)
+
+    stats = db.get_dashboard_stats(user_id)
+    assert stats.total_sessions == 1
+    assert stats.favourite_day is None
+
+
+def test_dashboard_counters_track_writes(db, user_id):
+    for days_ago in (4, 2, 1, 0):
+        _log(user_id, days_ago, "Legs")
+    db.start_session(user_id, "Pull", date=TODAY)
+
+    stats = db.get_dashboard_stats(user_id)
+    assert stats.total_sessions == 5
+    assert stats.current_streak == 3
+    assert stats.total_exercises == 1
+    assert db.check_user_stats() == []
+
+
+def test_check_user_stats_finds_and_repairs_drift(db, user_id):
+    _log(user_id, 1, "Upper")
+    with db.get_engine().begin() as conn:
+        conn.execute(update(db.UserDayCount).values(sessions=7))
+
+    drift = db.check_user_stats(repair=True)
+    assert [d.fields["day_counts"] for d in drift] == [({"Upper": 7}, {"Upper": 1})]
+    assert db.check_user_stats() == []
+
+
+def test_migration_builds_counters_from_existing_sessions(db, user_id):
+    _log(user_id, 2, "Upper")
+    _log(user_id, 1, "Upper")
+    _log(user_id, 0, "Lower")
+    with db.get_engine().begin() as conn:
+        conn.execute(delete(db.UserStats))
+        conn.execute(delete(db.UserDayCount))
+
+    with db.get_engine().begin() as conn:
+        migrations._build_user_stats(conn)
+    db.clear_read_cache()
+
+    stats = db.get_dashboard_stats(user_id)
+    assert (stats.total_sessions, stats.favourite_day) == (3, "Upper")
+    assert db.check_user_stats() == []
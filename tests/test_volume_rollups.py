@@ -0,0 +1,118 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+import database_service as ds
+
+TODAY = datetime.date.today()
+
+
+def _day(days_ago: int) -> datetime.date:
+    return TODAY - datetime.timedelta(days=days_ago)
+
+
+def _session(user_id: int, days_ago: int, *entries: tuple[str, int, int, float]) -> ds.SessionRow:
+    return ds.log_full_session(
+        user_id,
+        {"date": _day(days_ago), "ppl_day": "Legs"},
+        [
+            {"exercise": name, "sets": sets, "reps": reps, "weight": weight, "weight_unit": "kg"}
+            for name, sets, reps, weight in entries
+        ],
+    )
+
+
+def _rollups() -> list[tuple]:
+    with ds.get_engine().connect() as conn:
+        rows = conn.execute(
+            select(
+                ds.VolumeRollup.user_id, ds.VolumeRollup.exercise_id, ds.VolumeRollup.grain,
+                ds.VolumeRollup.period_start, ds.VolumeRollup.volume_kg, ds.VolumeRollup.log_count,
+            ).order_by(
+                ds.VolumeRollup.user_id, ds.VolumeRollup.exercise_id,
+                ds.VolumeRollup.grain, ds.VolumeRollup.period_start,
+            )
+        ).all()
+    return [(*r[:4], round(r.volume_kg, 6), r.log_count) for r in rows]
+
+
+def _matches_backfill() -> bool:
+    before = _rollups()
+    ds.backfill_volume_rollups()
+    return _rollups() == before
+
+
+def test_volume_per_day_week_and_month(db, user_id):
+    _session(user_id, 8, ("Squat", 3, 5, 100))
+    _session(user_id, 1, ("Squat", 5, 5, 100), ("Squat", 1, 3, 120))
+    _session(user_id, 0, ("Squat", 2, 10, 60), ("Lunge", 3, 10, 20))
+
+    daily = {p.date: p.volume_kg for p in db.get_volume_over_time(user_id, "squat", days=30)}
+    assert daily == {_day(8): 1500, _day(1): 2860, _day(0): 1200}
+
+    for grain in ("week", "month"):
+        expected: dict[datetime.date, float] = {}
+        for date, volume in daily.items():
+            start = db._period_start(date, grain)
+            expected[start] = expected.get(start, 0) + volume
+        points = db.get_volume_over_time(user_id, "Squat", days=30, grain=grain)
+        assert {p.date: p.volume_kg for p in points} == expected
+    assert _matches_backfill()
+
+
+def test_logs_without_weight_add_no_volume(db, user_id):
+    _session(user_id, 0, ("Plank", 3, 1, None))
+
+    assert db.get_volume_over_time(user_id, "Plank") == []
+    assert _rollups() == []
+
+
+def test_update_and_delete_move_the_rollups(db, user_id):
+    session = _session(user_id, 2, ("Squat", 3, 5, 100), ("Squat", 3, 5, 80))
+    logs    = db.get_recent_sessions_with_logs(user_id, 1)[0][1]
+
+    db.update_log(user_id, logs[0].id, {"weight": 110})
+    assert _matches_backfill()
+    db.delete_log(user_id, logs[1].id)
+    assert [p.volume_kg for p in db.get_volume_over_time(user_id, "Squat")] == [1650]
+    assert _matches_backfill()
+
+    db.delete_session(user_id, session.id)
+    assert db.get_volume_over_time(user_id, "Squat") == []
+    assert _rollups() == []   # rows at zero logs are dropped, not left at 0 kg
+
+
+def test_category_volume_follows_the_same_rows(db, user_id):
+    _session(user_id, 1, ("Barbell Back Squat", 3, 5, 100), ("Barbell Bench Press", 3, 5, 80))
+
+    by_category = db.get_category_volume_over_time(user_id, days=30, grain="day")
+    assert by_category["legs"] == [ds.VolumePoint(_day(1), 1500)]
+    assert by_category["push"] == [ds.VolumePoint(_day(1), 1200)]
+
+
+def test_logging_into_a_missing_or_foreign_session_is_refused(db, user_id):
+    other   = ds.create_user("other", "other@example.com", "another password").id
+    theirs  = ds.start_session(other, date=_day(1))
+    entry   = {"exercise": "Deadlift", "sets": 1, "reps": 5, "weight": 200, "weight_unit": "kg"}
+
+    for session_id in (theirs.id, theirs.id + 1000):
+        with pytest.raises(ValueError, match=f"Session {session_id}"):
+            ds.log_exercise(session_id, user_id, entry)
+        with pytest.raises(ValueError, match=f"Session {session_id}"):
+            ds.log_exercises_bulk(session_id, user_id, [entry, entry])
+
+    with ds.get_engine().connect() as conn:
+        assert conn.execute(select(ds.WorkoutLog.id)).all() == []
+    assert _rollups() == []
+
+
+def test_logging_into_an_own_session_adds_volume(db, user_id):
+    session = ds.start_session(user_id, date=_day(2))
+    entry   = {"exercise": "Deadlift", "sets": 1, "reps": 5, "weight": 200, "weight_unit": "kg"}
+
+    ds.log_exercise(session.id, user_id, entry)
+    ds.log_exercises_bulk(session.id, user_id, [entry, entry])
+
+    assert [p.volume_kg for p in ds.get_volume_over_time(user_id, "Deadlift", grain="day")] == [3000]
+    assert _matches_backfill()
@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+import database_service as ds
+
+DAY = datetime.date.today() - datetime.timedelta(days=1)
+
+
+def _log(user_id: int, *entries: tuple[str, float | None, str | None]) -> ds.SessionRow:
+    return ds.log_full_session(
+        user_id, {"date": DAY},
+        [{"exercise": name, "sets": 1, "reps": 5, "weight": weight, "weight_unit": unit} for name, weight, unit in entries],
+    )
+
+
+def _weights_kg() -> list[float | None]:
+    with ds.get_engine().connect() as conn:
+        return list(conn.execute(select(ds.WorkoutLog.weight_kg).order_by(ds.WorkoutLog.id)).scalars())
+
+
+def test_to_kg_and_back():
+    assert ds.to_kg(100, "kg") == 100
+    assert ds.to_kg(225, "lbs") == pytest.approx(102.058, abs=1e-3)
+    assert ds.to_kg(225, None) == ds.to_kg(225, "lbs")   # unlabelled weights are pounds
+    assert ds.to_kg(None, "kg") is None
+    assert ds.from_kg(ds.to_kg(185, "lbs"), "lbs") == pytest.approx(185)
+    assert ds.from_kg(60, "kg") == 60
+
+
+def test_every_write_path_stores_weight_kg(db, user_id):
+    session = _log(user_id, ("Barbell Back Squat", 100, "kg"), ("Barbell Back Squat", 220, "lbs"))
+    ds.log_exercise(session.id, user_id, {"exercise": "Dip", "sets": 3, "reps": 8, "weight": None, "weight_unit": None})
+    log_id = ds.get_recent_sessions_with_logs(user_id, 1)[0][1][1].id
+    ds.update_log(user_id, log_id, {"weight": 110, "weight_unit": "kg"})
+
+    assert _weights_kg() == [100, 110, None]
+
+
+def test_backfill_fills_missing_weight_kg_in_batches(db, user_id):
+    _log(user_id, *[("Barbell Bench Press", 50 + i, "kg" if i % 2 else "lbs") for i in range(5)], ("Dip", None, None))
+    expected = _weights_kg()
+    assert expected[-1] is None
+    with ds.get_engine().begin() as conn:
+        conn.execute(update(ds.WorkoutLog).values(weight_kg=None))
+
+    assert ds.backfill_weight_kg(batch_size=2) == 5
+    assert _weights_kg() == expected
+    assert ds.backfill_weight_kg(batch_size=2) == 0
+
+
+def test_personal_record_compares_across_units(db, user_id):
+    _log(user_id, ("Barbell Bench Press", 100, "kg"), ("Barbell Bench Press", 185, "lbs"))
+
+    (pr,) = ds.get_personal_records(user_id)
+    assert pr.weight_kg == 100   # 185 lbs is about 83.9 kg
+    assert pr.weight_in("lbs") == pytest.approx(220.462, abs=1e-3)
+
+
+def test_volume_sums_in_kg_across_units(db, user_id):
+    _log(user_id, ("Barbell Back Squat", 100, "kg"), ("Barbell Back Squat", 220.462262, "lbs"))
+
+    (point,) = ds.get_volume_over_time(user_id, "Barbell Back Squat")
+    assert point.volume_kg == pytest.approx(1000)